@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from seed_data import DATABASE_URL
+
+# Before/after EXPLAIN ANALYZE report for the migration in database/migrations/.
+# The analytics GETs are answered from the in-memory rollups, so the SQL behind each
+# endpoint is the rollup build (startup / full refresh), the delta refresh after an
+# ingest, the forecast lookup and ingest.py's duplicate check.
+#
+#   python database/explain_report.py --out before.json
+#   psql ... -f database/migrations/001_indexes_partitions_matviews.sql
+#   python database/explain_report.py --out after.json --compare before.json --markdown report.md
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'ml_engine'))
+import rollups  # noqa: E402
+import predict  # noqa: E402
+
+ANALYTICS_ROUTES = (
+    "GET analytics routes + /api/dashboard "
+    "(rollup build: startup, POST /api/refresh-rollups)"
+)
+
+# Recent rows of a table re-checked against itself, the same anti-join ingest.py runs
+# against its staging table
+DEDUP_QUERY = """
+SELECT COUNT(*)
+FROM sales s
+WHERE s.salesdate > CAST(:since AS DATE)
+  AND NOT EXISTS (
+      SELECT 1 FROM sales t
+      WHERE t.inventoryid = s.inventoryid AND t.salesdate = s.salesdate AND t.salesprice = s.salesprice
+  )
+"""
+
+
+def has_views(conn):
+    return conn.execute(text("SELECT to_regclass('mv_sales_brand_day') IS NOT NULL")).scalar()
+
+
+def sample_params(conn, days=7, brands=50):
+    """A typical daily delta: the busiest brands over the last week of sales."""
+    last_day = conn.execute(text("SELECT MAX(salesdate)::date FROM sales")).scalar()
+    since = last_day - pd.Timedelta(days=days)
+    top = conn.execute(text(
+        "SELECT brand FROM sales WHERE salesdate > :since GROUP BY brand ORDER BY COUNT(*) DESC LIMIT :n"
+    ), {'since': since, 'n': brands}).scalars().all()
+    return {
+        'brands': [int(b) for b in top],
+        'start_date': since,
+        'end_date': last_day,
+        'since': since,
+        'brand': int(top[0]) if top else 0,
+        'watermark': None,
+    }
+
+
+def workload(conn):
+    """(endpoint, query name, sql) for everything the API and ingest run against Postgres."""
+    if has_views(conn):
+        build = [
+            ('rollup_sales', "SELECT * FROM mv_sales_brand_day"),
+            ('rollup_received', "SELECT * FROM mv_received_brand_day"),
+            ('rollup_ordered', "SELECT * FROM mv_ordered_brand_day"),
+            ('rollup_brand_purchases', "SELECT * FROM mv_brand_purchases"),
+        ]
+    else:
+        build = [
+            ('rollup_sales', rollups.SALES_ROLLUP_QUERY),
+            ('rollup_received', rollups.RECEIVED_ROLLUP_QUERY),
+            ('rollup_ordered', rollups.ORDERED_ROLLUP_QUERY),
+            ('rollup_brand_purchases', rollups.BRAND_PURCHASES_QUERY),
+        ]
+    build += [('rollup_prices', rollups.PRICES_QUERY), ('rollup_inventory', rollups.INVENTORY_QUERY)]
+
+    items = [(ANALYTICS_ROUTES, name, sql) for name, sql in build]
+    items += [
+        ("POST /api/refresh-rollups?mode=delta", 'sales_delta', rollups.SALES_DELTA_QUERY),
+        ("POST /api/refresh-rollups?mode=delta", 'received_delta', rollups.RECEIVED_DELTA_QUERY),
+        ("POST /api/refresh-rollups?mode=delta", 'ordered_delta', rollups.ORDERED_DELTA_QUERY),
+        ("POST /api/refresh-rollups?mode=delta", 'brand_purchases_delta', rollups.BRAND_PURCHASES_DELTA_QUERY),
+        ("database/ingest.py", 'sales_duplicate_check', DEDUP_QUERY),
+    ]
+    if conn.execute(text(predict.FORECAST_EXISTS_QUERY)).scalar():
+        items.append(("GET /api/demand-forecast", 'forecast_lookup', predict.FORECAST_LOOKUP_QUERY))
+    return items
+
+
+def explain(conn, sql, params):
+    plan = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params).scalar()
+    plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+    root = plan['Plan']
+    return {
+        'execution_ms': round(plan['Execution Time'], 3),
+        'planning_ms': round(plan['Planning Time'], 3),
+        'root_node': root['Node Type'],
+        'shared_hit': root.get('Shared Hit Blocks', 0),
+        'shared_read': root.get('Shared Read Blocks', 0),
+        'plan': plan,
+    }
+
+
+def run(bind, repeat=3):
+    results = []
+    with bind.connect() as conn:
+        params = sample_params(conn)
+        for endpoint, name, sql in workload(conn):
+            # Best of `repeat`: the first run mostly measures a cold cache
+            runs = [explain(conn, sql, params) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r['execution_ms'])
+            results.append({'endpoint': endpoint, 'query': name, **best})
+    return results
+
+
+def compare(before, after):
+    before = {r['query']: r for r in before}
+    rows = []
+    for r in after:
+        b = before.get(r['query'])
+        rows.append({
+            'endpoint': r['endpoint'],
+            'query': r['query'],
+            'before_ms': b['execution_ms'] if b else None,
+            'after_ms': r['execution_ms'],
+            'speedup': round(b['execution_ms'] / r['execution_ms'], 1) if b and r['execution_ms'] else None,
+            'before_plan': b['root_node'] if b else None,
+            'after_plan': r['root_node'],
+            'after_blocks': r['shared_hit'] + r['shared_read'],
+        })
+    return pd.DataFrame(rows)
+
+
+def to_markdown(df):
+    lines = ['| ' + ' | '.join(df.columns) + ' |', '|' + '---|' * len(df.columns)]
+    lines += ['| ' + ' | '.join('' if pd.isna(v) else str(v) for v in row) + ' |' for row in df.itertuples(index=False)]
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE every query behind the API endpoints")
+    parser.add_argument('--out', required=True, help="write the plans to this JSON file")
+    parser.add_argument('--compare', default=None, help="JSON from an earlier run (e.g. before the migration)")
+    parser.add_argument('--markdown', default=None, help="also write the comparison as a markdown table")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per query, best one is kept")
+    args = parser.parse_args()
+
+    results = run(create_engine(DATABASE_URL), repeat=args.repeat)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report = compare(json.load(f), results)
+    else:
+        report = pd.DataFrame(results)[['endpoint', 'query', 'execution_ms', 'planning_ms', 'root_node']]
+
+    print(report.to_string(index=False))
+    if args.markdown:
+        with open(args.markdown, 'w') as f:
+            f.write(to_markdown(report))
@@ -0,0 +1,120 @@
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+
+from seed_data import DATABASE_URL, files_to_load
+
+# Parquet exports of the loaded tables, for QUERY_ENGINE=duckdb (src/backend/query_engine.py):
+# one <table>.parquet per table, same column names and types as in Postgres
+# (NUMERIC(p, s) stays an exact decimal), so the API's SQL gives the same numbers
+# on the files as on the database. Run after seed_data.py / ingest.py.
+#
+#   python export_parquet.py                       # the six seed_data.py tables
+#   python export_parquet.py --tables leadtimemoments brandforecasts
+
+OUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'parquet')
+
+COLUMNS_QUERY = """
+SELECT column_name, data_type, numeric_precision, numeric_scale
+FROM information_schema.columns
+WHERE table_name = :table
+ORDER BY ordinal_position
+"""
+
+ARROW_TYPES = {
+    'smallint': pa.int16(),
+    'integer': pa.int32(),
+    'bigint': pa.int64(),
+    'real': pa.float32(),
+    'double precision': pa.float64(),
+    'character varying': pa.string(),
+    'character': pa.string(),
+    'text': pa.string(),
+    'date': pa.date32(),
+    'boolean': pa.bool_(),
+    'timestamp without time zone': pa.timestamp('us'),
+}
+
+
+def arrow_schema(bind, table_name):
+    with bind.connect() as conn:
+        columns = conn.execute(text(COLUMNS_QUERY), {'table': table_name}).all()
+    if not columns:
+        raise ValueError(f"No table {table_name}")
+    fields = []
+    for name, data_type, precision, scale in columns:
+        if data_type == 'numeric':
+            # Unconstrained NUMERIC has no fixed scale to keep, it goes out as a double
+            arrow_type = pa.decimal128(precision, scale) if precision else pa.float64()
+        else:
+            # Anything unlisted (arrays...) is left to pyarrow to infer
+            arrow_type = ARROW_TYPES.get(data_type)
+        fields.append((name, arrow_type))
+    return fields
+
+
+def column(values, arrow_type):
+    if arrow_type == pa.float64():
+        values = [None if v is None else float(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def export_table(table_name, out_dir, chunk_size=200_000, url=DATABASE_URL):
+    """Stream one table into <out_dir>/<table>.parquet through a server-side cursor,
+    one row group per `chunk_size` rows. Written next to the target and renamed into
+    place, so a running API never reads half a file."""
+    engine = create_engine(url)
+    fields = arrow_schema(engine, table_name)
+    path = os.path.join(out_dir, f'{table_name}.parquet')
+    tmp_path = f'{path}.tmp'
+
+    raw = engine.raw_connection()
+    start = time.perf_counter()
+    rows = 0
+    writer = None
+    try:
+        with raw.driver_connection.cursor(name=f'export_{table_name}') as cur:
+            cur.execute(f"SELECT {', '.join(name for name, _ in fields)} FROM {table_name}")
+            while records := cur.fetchmany(chunk_size):
+                batch = pa.table({
+                    name: column([r[i] for r in records], arrow_type)
+                    for i, (name, arrow_type) in enumerate(fields)
+                })
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, batch.schema, compression='zstd')
+                writer.write_table(batch)
+                rows += len(records)
+        if writer is None:
+            # Empty table: still write the file, so the view (and its columns) exists
+            empty = pa.table({name: pa.array([], type=arrow_type or pa.null()) for name, arrow_type in fields})
+            writer = pq.ParquetWriter(tmp_path, empty.schema, compression='zstd')
+            writer.write_table(empty)
+        writer.close()
+        os.replace(tmp_path, path)
+    finally:
+        raw.close()
+        engine.dispose()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return rows, time.perf_counter() - start, os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export tables to Parquet for the embedded DuckDB query engine")
+    parser.add_argument('--tables', nargs='*', default=list(files_to_load),
+                        help="tables to export (default: the six seed_data.py tables)")
+    parser.add_argument('--out', default=OUT_DIR, help="output directory (the API's PARQUET_DIR)")
+    parser.add_argument('--chunk-size', type=int, default=200_000, help="rows per fetch / row group")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    t0 = time.perf_counter()
+    for table_name in args.tables:
+        rows, seconds, size = export_table(table_name, args.out, args.chunk_size)
+        print(f"{table_name}: {rows:,} rows in {seconds:.1f}s -> {size / 2**20:,.1f} MB", flush=True)
+    print(f"Exported {len(args.tables)} tables to {os.path.abspath(args.out)} in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,226 @@
+import argparse
+import json
+import time
+import urllib.request
+
+from sqlalchemy import create_engine, text
+
+from seed_data import (
+    DATABASE_URL, LEAD_TIME_MOMENTS_SELECT, copy_csv, int_columns, partition_key,
+    rebuild_lead_time_moments, refresh_analytics_views,
+)
+
+# Incremental ingest of new transaction batches.
+# seed_data.py is the full (re)load; this appends one batch of new Sales /
+# Purchases / InvoicePurchases rows on top of what's already there:
+#   * rows are COPYed into a temp staging table, then inserted only if their
+#     natural key isn't already in the target (and only once per batch)
+#   * every table keeps a high-water mark of its business date, which is part of
+#     its key. Rows past it can't collide with anything already loaded, so only
+#     late rows pay for the duplicate check
+#   * each insert is logged with the brands and date range it touched, which is
+#     what the API's delta refresh (POST /api/refresh-rollups?mode=delta) reads
+#     to re-aggregate just those brand x day cells
+#   * new purchases are merged into LeadTimeMoments (count / mean / M2 per brand x
+#     vendor x PO date) in the same statement that inserts them
+#
+#   python database/ingest.py --sales sales_0101.csv --purchases purchases_0101.csv
+#
+# Load order matters: purchases go in before invoicepurchases so freight on new
+# POs can be traced back to their brands in the same batch.
+
+# A PO line can arrive in several shipments (or invoices), one row each: the watermark
+# date tells them apart, as well as making the past-the-watermark shortcut sound.
+TABLES = {
+    'sales': {
+        'key': ['inventoryid', 'salesdate', 'salesprice'],
+        'watermark': 'salesdate',
+        'dates': ['salesdate'],
+    },
+    'purchases': {
+        'key': ['inventoryid', 'ponumber', 'receivingdate'],
+        'watermark': 'receivingdate',
+        'dates': ['podate', 'receivingdate'],
+    },
+    'invoicepurchases': {
+        'key': ['vendornumber', 'ponumber', 'invoicedate'],
+        'watermark': 'invoicedate',
+        'dates': ['invoicedate'],
+    },
+}
+
+# Also in schema.sql. Repeated here so databases created before these existed pick them up.
+ENSURE_TABLES = """
+CREATE TABLE IF NOT EXISTS IngestWatermarks (
+    TableName VARCHAR(50) PRIMARY KEY,
+    Watermark DATE,
+    UpdatedAt TIMESTAMP DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS IngestLog (
+    BatchId SERIAL PRIMARY KEY,
+    TableName VARCHAR(50),
+    RowsInserted INT,
+    Brands INT[],
+    MinDate DATE,
+    MaxDate DATE,
+    LoadedAt TIMESTAMP DEFAULT now()
+);
+"""
+
+
+# Chan et al.'s pairwise update: folds the batch's moments of a cell into the stored ones.
+# On the right of SET, leadtimemoments.* are still the old values.
+MERGE_LEAD_TIME_MOMENTS = """
+    INSERT INTO leadtimemoments AS t (brand, vendornumber, podate, n, mean, m2)
+    {moments}
+    ON CONFLICT (brand, vendornumber, podate) DO UPDATE SET
+        n = t.n + EXCLUDED.n,
+        mean = t.mean + (EXCLUDED.mean - t.mean) * EXCLUDED.n / (t.n + EXCLUDED.n),
+        m2 = t.m2 + EXCLUDED.m2 + (EXCLUDED.mean - t.mean) ^ 2 * t.n * EXCLUDED.n / (t.n + EXCLUDED.n)
+"""
+
+
+def ensure_lead_time_moments(conn):
+    """Create and backfill LeadTimeMoments the first time a database sees it."""
+    if conn.execute(text("SELECT to_regclass('leadtimemoments') IS NULL")).scalar():
+        rebuild_lead_time_moments(conn)
+
+
+def watermark(conn, table_name):
+    """High-water mark for a table, seeded from the data itself the first time."""
+    mark = conn.execute(
+        text("SELECT watermark FROM ingestwatermarks WHERE tablename = :table"), {'table': table_name}
+    ).scalar()
+    if mark is None:
+        mark = conn.execute(text(f"SELECT MAX({TABLES[table_name]['watermark']}) FROM {table_name}")).scalar()
+    return mark
+
+
+def insert_new_rows(conn, table_name, stage_name, mark):
+    """Move the staged rows that aren't in `table_name` yet. Returns (rows, brands, min date, max date, new watermark)."""
+    spec = TABLES[table_name]
+    key = spec['key']
+    mark_col = spec['watermark']
+
+    same_key = ' AND '.join(f"t.{col} = s.{col}" for col in key)
+    # Rows past the watermark are new by construction, skip the anti-join for them. Only
+    # when the watermark is in the key: otherwise a past-the-mark row can repeat a key
+    late_only = "" if mark is None or mark_col not in key else f"(s.{mark_col} > :mark) OR "
+    dates = ', '.join(spec['dates'])
+    least = f"LEAST({dates})" if len(spec['dates']) > 1 else dates
+    greatest = f"GREATEST({dates})" if len(spec['dates']) > 1 else dates
+
+    merged = ""
+    if table_name == 'invoicepurchases':
+        # Invoices carry no brand. Freight lands on whichever brands were bought on the PO.
+        brands = "(SELECT array_agg(DISTINCT p.brand) FROM purchases p WHERE p.ponumber IN (SELECT ponumber FROM inserted))"
+        returning = ['ponumber']
+    else:
+        brands = "array_agg(DISTINCT brand)"
+        returning = ['brand']
+    if table_name == 'purchases':
+        returning.append('vendornumber')
+        moments = LEAD_TIME_MOMENTS_SELECT.format(rows='inserted').strip()
+        merged = f",\n    merged AS ({MERGE_LEAD_TIME_MOMENTS.format(moments=moments)})"
+    returning = list(dict.fromkeys(returning + spec['dates'] + [mark_col]))
+
+    sql = f"""
+    WITH inserted AS (
+        INSERT INTO {table_name}
+        SELECT DISTINCT ON ({', '.join('s.' + c for c in key)}) s.*
+        FROM {stage_name} s
+        WHERE {late_only}NOT EXISTS (SELECT 1 FROM {table_name} t WHERE {same_key})
+        ORDER BY {', '.join('s.' + c for c in key)}
+        RETURNING {', '.join(returning)}
+    ){merged}
+    SELECT COUNT(*), {brands}, MIN({least}), MAX({greatest}), MAX({mark_col})
+    FROM inserted
+    """
+    return conn.execute(text(sql), {'mark': mark}).one()
+
+
+def ingest(bind, files, chunk_size=200_000):
+    """Load one batch ({table: csv path}) in a single transaction. Returns per-table summaries."""
+    summaries = []
+    with bind.begin() as conn:
+        conn.execute(text(ENSURE_TABLES))
+        if 'purchases' in files:
+            ensure_lead_time_moments(conn)
+        dbapi = conn.connection.driver_connection
+        for table_name in TABLES:
+            if table_name not in files:
+                continue
+            start = time.perf_counter()
+            stage_name = f"stage_{table_name}"
+            conn.execute(text(f"CREATE TEMP TABLE {stage_name} (LIKE {table_name}) ON COMMIT DROP"))
+            with dbapi.cursor() as cur:
+                staged = copy_csv(cur, stage_name, files[table_name], int_columns(bind, table_name), chunk_size)
+
+            date_col = partition_key(bind, table_name)
+            if date_col:
+                # Give new months their own partition before rows would land in DEFAULT
+                conn.execute(text(f"""
+                    SELECT create_monthly_partitions(CAST(:table AS regclass), MIN({date_col})::date, MAX({date_col})::date)
+                    FROM {stage_name} HAVING MIN({date_col}) IS NOT NULL
+                """), {'table': table_name})
+
+            mark = watermark(conn, table_name)
+            rows, brands, min_date, max_date, new_mark = insert_new_rows(conn, table_name, stage_name, mark)
+
+            if rows:
+                conn.execute(text("""
+                    INSERT INTO ingestlog (tablename, rowsinserted, brands, mindate, maxdate)
+                    VALUES (:table, :rows, :brands, :min_date, :max_date)
+                """), {'table': table_name, 'rows': rows, 'brands': brands or [], 'min_date': min_date, 'max_date': max_date})
+                marks = [m for m in (mark, new_mark) if m is not None]
+                conn.execute(text("""
+                    INSERT INTO ingestwatermarks (tablename, watermark) VALUES (:table, :mark)
+                    ON CONFLICT (tablename) DO UPDATE
+                    SET watermark = GREATEST(ingestwatermarks.watermark, EXCLUDED.watermark), updatedat = now()
+                """), {'table': table_name, 'mark': max(marks) if marks else None})
+
+            summaries.append({
+                'table': table_name,
+                'staged': staged,
+                'inserted': rows,
+                'duplicates': staged - rows,
+                'brands': len(brands or []),
+                'dates': f"{min_date} .. {max_date}" if rows else None,
+                'seconds': round(time.perf_counter() - start, 2),
+            })
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append a batch of new transactions and log it for delta refresh")
+    parser.add_argument('--sales', help="CSV of new Sales rows")
+    parser.add_argument('--purchases', help="CSV of new Purchases rows")
+    parser.add_argument('--invoice-purchases', help="CSV of new InvoicePurchases rows")
+    parser.add_argument('--chunk-size', type=int, default=200_000, help="CSV rows per COPY chunk")
+    parser.add_argument('--refresh-views', action='store_true',
+                        help="also fold the batch into the migration's materialized views (slower, full re-aggregation)")
+    parser.add_argument('--refresh-url', default=None,
+                        help="POST here when done, e.g. http://localhost:8000/api/refresh-rollups?mode=delta")
+    args = parser.parse_args()
+
+    files = {
+        table_name: path for table_name, path in (
+            ('sales', args.sales), ('purchases', args.purchases), ('invoicepurchases', args.invoice_purchases),
+        ) if path
+    }
+    if not files:
+        parser.error("nothing to ingest, pass at least one of --sales / --purchases / --invoice-purchases")
+
+    t0 = time.perf_counter()
+    engine = create_engine(DATABASE_URL)
+    for summary in ingest(engine, files, args.chunk_size):
+        print(summary)
+    print(f"Batch committed in {time.perf_counter() - t0:.1f}s")
+
+    if args.refresh_views and refresh_analytics_views(engine):
+        print(f"Refreshed the analytics materialized views ({time.perf_counter() - t0:.1f}s total)")
+
+    if args.refresh_url:
+        request = urllib.request.Request(args.refresh_url, method='POST')
+        with urllib.request.urlopen(request) as response:
+            print(json.loads(response.read()))
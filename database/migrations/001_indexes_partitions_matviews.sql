@@ -0,0 +1,192 @@
+-- Migration 001: indexes, monthly partitioning and materialized views for the analytics workload.
+-- Apply once after schema.sql (before or after seeding):
+--   psql -h localhost -U postgres -d inventory_db -f database/migrations/001_indexes_partitions_matviews.sql
+-- Safe to re-run: every step checks whether it has already been applied.
+
+BEGIN;
+
+-- 1. Monthly range partitioning of the two big fact tables
+-- Sales on SalesDate, Purchases on ReceivingDate (the day column of their rollups),
+-- so date-bounded scans (delta refresh, ingest duplicate checks) only touch the
+-- months they need. Rows with no date land in the DEFAULT partition.
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent regclass, first_day date, last_day date)
+RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    month date := date_trunc('month', first_day)::date;
+    partition_name text;
+BEGIN
+    WHILE month <= last_day LOOP
+        partition_name := format('%s_%s', parent::text, to_char(month, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month, (month + interval '1 month')::date
+            );
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END $$;
+
+CREATE OR REPLACE FUNCTION partition_by_month(table_name text, date_column text)
+RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    first_day date;
+    last_day date;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(table_name)) THEN
+        RETURN;
+    END IF;
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', table_name, table_name || '_unpartitioned');
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (%I)',
+        table_name, table_name || '_unpartitioned', date_column
+    );
+    EXECUTE format(
+        'SELECT MIN(%I)::date, MAX(%I)::date FROM %I',
+        date_column, date_column, table_name || '_unpartitioned'
+    ) INTO first_day, last_day;
+    IF first_day IS NOT NULL THEN
+        PERFORM create_monthly_partitions(table_name::regclass, first_day, last_day);
+    END IF;
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', table_name || '_default', table_name);
+
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', table_name, table_name || '_unpartitioned');
+    EXECUTE format('DROP TABLE %I', table_name || '_unpartitioned');
+END $$;
+
+SELECT partition_by_month('sales', 'salesdate');
+SELECT partition_by_month('purchases', 'receivingdate');
+
+
+-- 2. Indexes matched to the queries the API and ingest actually run
+-- (declared on the partitioned parents, so every partition gets them)
+
+-- Rollup build / delta refresh: GROUP BY brand, day and brand = ANY(...) AND day BETWEEN ...
+-- INCLUDE the summed columns so the delta queries can be answered from the index alone
+CREATE INDEX IF NOT EXISTS sales_brand_salesdate_idx
+    ON sales (brand, salesdate) INCLUDE (salesquantity, salesdollars, excisetax, salesprice);
+CREATE INDEX IF NOT EXISTS purchases_brand_receivingdate_idx
+    ON purchases (brand, receivingdate) INCLUDE (purchaseprice, quantity);
+CREATE INDEX IF NOT EXISTS purchases_brand_podate_idx
+    ON purchases (brand, podate) INCLUDE (receivingdate);
+
+-- Freight per PO: the po_freight join and the PO -> brand lookup for new invoices
+CREATE INDEX IF NOT EXISTS purchases_ponumber_idx ON purchases (ponumber) INCLUDE (brand);
+CREATE INDEX IF NOT EXISTS invoicepurchases_ponumber_idx
+    ON invoicepurchases (ponumber) INCLUDE (freight, quantity);
+
+-- ingest.py duplicate check on each table's natural key
+CREATE INDEX IF NOT EXISTS sales_natural_key_idx ON sales (inventoryid, salesdate, salesprice);
+CREATE INDEX IF NOT EXISTS purchases_natural_key_idx ON purchases (inventoryid, ponumber, receivingdate);
+CREATE INDEX IF NOT EXISTS invoicepurchases_natural_key_idx ON invoicepurchases (vendornumber, ponumber, invoicedate);
+
+-- Brand level on-hand for the inventory dims
+CREATE INDEX IF NOT EXISTS endinginventory_brand_idx ON endinginventory (brand) INCLUDE (onhand);
+
+
+-- 3. Materialized views of the recurring brand level aggregates
+-- Same SELECTs as the rollup queries in src/backend/rollups.py. When these exist the
+-- API builds its rollups from them instead of re-aggregating the fact tables, then
+-- replays any IngestLog batches newer than the last refresh.
+-- Each view has a unique index so it can be refreshed CONCURRENTLY (readers never block).
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_sales_brand_day AS
+SELECT
+    brand,
+    salesdate::date AS day,
+    MAX(description) AS description,
+    SUM(salesquantity) AS sales_quantity,
+    SUM(salesdollars) AS sales_dollars,
+    SUM(excisetax) AS excise_tax,
+    COUNT(excisetax) AS excise_tax_count,
+    SUM(salesprice) AS sales_price_sum,
+    COUNT(salesprice) AS sales_price_count,
+    COUNT(*) AS row_count
+FROM sales
+WHERE salesdate IS NOT NULL
+GROUP BY brand, salesdate::date;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_sales_brand_day_key ON mv_sales_brand_day (brand, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_received_brand_day AS
+SELECT
+    brand,
+    receivingdate AS day,
+    SUM(purchaseprice * quantity) AS capital_outlay,
+    COUNT(purchaseprice * quantity) AS capital_count,
+    COUNT(*) AS row_count
+FROM purchases
+WHERE receivingdate IS NOT NULL
+GROUP BY brand, receivingdate;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_received_brand_day_key ON mv_received_brand_day (brand, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_ordered_brand_day AS
+SELECT
+    brand,
+    podate AS day,
+    COUNT(*) AS lead_time_count,
+    SUM(receivingdate - podate) AS lead_time_sum,
+    SUM((receivingdate - podate) * (receivingdate - podate)) AS lead_time_sq
+FROM purchases
+WHERE podate IS NOT NULL
+  AND receivingdate IS NOT NULL
+  AND receivingdate >= podate
+GROUP BY brand, podate;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_ordered_brand_day_key ON mv_ordered_brand_day (brand, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_brand_purchases AS
+WITH po_freight AS (
+    SELECT
+        PONumber,
+        SUM(Freight) / NULLIF(SUM(Quantity), 0) as freight_per_unit_po
+    FROM InvoicePurchases
+    GROUP BY PONumber
+)
+SELECT
+    p.brand,
+    COUNT(*) AS purchase_count,
+    MAX(p.description) AS purchase_description,
+    AVG(p.purchaseprice) AS avg_purchase_price,
+    AVG(pf.freight_per_unit_po) AS avg_freight_per_unit
+FROM purchases p
+LEFT JOIN po_freight pf ON p.PONumber = pf.PONumber
+GROUP BY p.brand;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_brand_purchases_key ON mv_brand_purchases (brand);
+
+-- Which IngestLog batch the views are current up to
+CREATE TABLE IF NOT EXISTS AnalyticsViewsState (
+    Id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (Id),
+    BatchId INT NOT NULL DEFAULT 0,
+    RefreshedAt TIMESTAMP
+);
+
+-- Called by seed_data.py after a load and by `ingest.py --refresh-views`
+CREATE OR REPLACE FUNCTION refresh_analytics_views()
+RETURNS int LANGUAGE plpgsql AS $$
+DECLARE
+    batch int := 0;
+BEGIN
+    -- Read the log head first. A batch committed while the views refresh is simply
+    -- replayed by the API's delta path, which replaces cells rather than adding to them.
+    IF to_regclass('ingestlog') IS NOT NULL THEN
+        EXECUTE 'SELECT COALESCE(MAX(batchid), 0) FROM ingestlog' INTO batch;
+    END IF;
+
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_sales_brand_day;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_received_brand_day;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_ordered_brand_day;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_brand_purchases;
+
+    INSERT INTO AnalyticsViewsState (Id, BatchId, RefreshedAt) VALUES (TRUE, batch, now())
+    ON CONFLICT (Id) DO UPDATE SET BatchId = EXCLUDED.BatchId, RefreshedAt = EXCLUDED.RefreshedAt;
+    RETURN batch;
+END $$;
+
+SELECT refresh_analytics_views();
+
+ANALYZE sales;
+ANALYZE purchases;
+ANALYZE invoicepurchases;
+
+COMMIT;
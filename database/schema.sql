@@ -88,3 +88,47 @@ CREATE TABLE Sales (
     VendorNo INT,
     VendorName VARCHAR(255)
 );
+
+
+-- 7. Brand Forecasts (written by src/ml_engine/batch_forecast.py)
+CREATE TABLE BrandForecasts (
+    Brand INT,
+    ds DATE,
+    yhat DOUBLE PRECISION,
+    yhat_lower DOUBLE PRECISION,
+    yhat_upper DOUBLE PRECISION,
+    watermark DATE,
+    PRIMARY KEY (Brand, ds)
+);
+
+-- 8. Incremental ingest bookkeeping (written by database/ingest.py)
+-- Per-table high-water mark of the business date
+CREATE TABLE IngestWatermarks (
+    TableName VARCHAR(50) PRIMARY KEY,
+    Watermark DATE,
+    UpdatedAt TIMESTAMP DEFAULT now()
+);
+
+-- One row per table per ingested batch: which brands/dates the API has to re-aggregate
+CREATE TABLE IngestLog (
+    BatchId SERIAL PRIMARY KEY,
+    TableName VARCHAR(50),
+    RowsInserted INT,
+    Brands INT[],
+    MinDate DATE,
+    MaxDate DATE,
+    LoadedAt TIMESTAMP DEFAULT now()
+);
+
+-- 9. Lead time moments per brand x vendor x PO date (rebuilt by seed_data.py, merged by ingest.py)
+-- Count, mean and sum of squared deviations (M2) of ReceivingDate - PODate: any set of
+-- cells combines into the exact mean / variance of their rows. VendorNumber 0 = unknown.
+CREATE TABLE LeadTimeMoments (
+    Brand INT NOT NULL,
+    VendorNumber INT NOT NULL,
+    PODate DATE NOT NULL,
+    N BIGINT NOT NULL,
+    Mean DOUBLE PRECISION NOT NULL,
+    M2 DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (Brand, VendorNumber, PODate)
+);
\ No newline at end of file
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import time
+
+import anyio
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import ASYNC_DATABASE_URL, DATABASE_URL
+
+# Concurrency benchmark: sync psycopg2 + threadpool vs asyncpg + event loop.
+# Starlette runs sync `def` handlers on anyio's worker threads (40 by default),
+# so the sync path is measured the same way. Each "request" is one slow query.
+#
+#   python bench_async.py --requests 200 --sleep 0.25
+
+SLOW_QUERY = "SELECT pg_sleep(:sleep), COUNT(*) AS n FROM purchaseprices"
+
+
+def run_sync(n_requests, sleep, pool_size):
+    engine = create_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+
+    def one_request():
+        return pd.read_sql(text(SLOW_QUERY), engine, params={"sleep": sleep})
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for _ in range(n_requests):
+                tg.start_soon(anyio.to_thread.run_sync, one_request)
+
+    start = time.perf_counter()
+    anyio.run(main)
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def run_async(n_requests, sleep, pool_size):
+    async def main():
+        engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=pool_size, max_overflow=0)
+
+        async def one_request():
+            async with engine.connect() as conn:
+                result = await conn.execute(text(SLOW_QUERY), {"sleep": sleep})
+                return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one_request() for _ in range(n_requests)])
+        elapsed = time.perf_counter() - start
+        await engine.dispose()
+        return elapsed
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sync vs async DB access under concurrency")
+    parser.add_argument('--requests', type=int, default=200, help="concurrent requests to fire")
+    parser.add_argument('--sleep', type=float, default=0.25, help="server-side pg_sleep per query (seconds)")
+    parser.add_argument('--pool-size', type=int, default=90, help="connections per engine (keep under max_connections)")
+    args = parser.parse_args()
+
+    rows = []
+    for name, runner in (("sync + threadpool", run_sync), ("async (asyncpg)", run_async)):
+        elapsed = runner(args.requests, args.sleep, args.pool_size)
+        rows.append({
+            "path": name,
+            "requests": args.requests,
+            "wall_seconds": round(elapsed, 3),
+            "req_per_sec": round(args.requests / elapsed, 1),
+        })
+
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+# Peak RSS of pulling the brand x day rollups: one plain fetch of every row
+# (statements.execute, what the rollup build did before) vs the chunked, compact
+# extraction in extract.py. Every measurement runs in a fresh interpreter, so the
+# peaks don't mask each other. `store` builds the whole RollupStore (the work the
+# first dashboard request of a cold worker waits on) and includes the prefix arrays.
+#
+#   DATABASE_URL=postgresql+psycopg2://.../big_db python bench_extract.py --chunk-rows 50000
+
+MODES = ['plain', 'chunked']
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(mode, index, chunk_rows):
+    import extract
+    import rollups
+    import statements
+    from settings import settings
+
+    # No sampled EXPLAIN ANALYZE re-runs (querylog.py) next to the measured pull
+    settings.slow_query_explain_rate = 0.0
+
+    name = rollups.ROLLUP_STATEMENTS[index]
+    dtypes, reduce = rollups.ROLLUP_EXTRACTS[index]
+    before = rss_mb()
+    start = time.perf_counter()
+    if mode == 'store':
+        result = await rollups.RollupStore.from_async_engine()
+        rows, frame_mb = len(result.brands), None
+    else:
+        if mode == 'plain':
+            frame = await statements.execute(name)
+        else:
+            frame, _ = await extract.read_frame(name, dtypes=dtypes, reduce=reduce, chunk_size=chunk_rows)
+        rows, frame_mb = len(frame), frame.memory_usage(deep=True).sum() / 2 ** 20
+    return {
+        'query': name, 'mode': mode, 'rows': rows,
+        'seconds': round(time.perf_counter() - start, 2),
+        'frame_mb': None if frame_mb is None else round(frame_mb, 1),
+        'peak_rss_added_mb': round(rss_mb() - before, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak RSS: plain vs chunked compact extraction")
+    parser.add_argument('--chunk-rows', type=int, default=50_000)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, index = args.child
+        print(json.dumps(asyncio.run(measure(mode, int(index), args.chunk_rows))))
+        sys.exit()
+
+    import rollups
+    runs = [(mode, i) for i, spec in enumerate(rollups.ROLLUP_EXTRACTS) if spec for mode in MODES]
+    runs.append(('store', 0))
+    rows = []
+    for mode, index in runs:
+        out = subprocess.run(
+            [sys.executable, __file__, '--chunk-rows', str(args.chunk_rows), '--child', mode, str(index)],
+            capture_output=True, text=True, check=True,
+        )
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from lead_times import LeadTimeMoments
+
+# Lead time lookups from the moment cells (lead_times.py) vs aggregating the raw
+# purchases rows, as the purchases history grows. The cells are what ingest.py keeps
+# in LeadTimeMoments: one (n, mean, M2) per brand x vendor x PO date, so their number
+# stops growing with the rows once every brand/vendor buys most days.
+#
+#   python bench_lead_times.py --rows 100000 1000000 5000000
+
+
+def synthetic(rows, brands=2000, vendors=100, days=730, seed=0):
+    rng = np.random.default_rng(seed)
+    brand = rng.integers(0, brands, rows)
+    return pd.DataFrame({
+        'brand': brand,
+        'vendor': brand % vendors,
+        'day': np.datetime64('2015-01-01') + rng.integers(0, days, rows).astype('timedelta64[D]'),
+        'lead_time': rng.integers(2, 30, rows).astype(np.float64),
+    })
+
+
+def to_cells(raw):
+    cells = raw.groupby(['brand', 'vendor', 'day'])['lead_time'].agg(['count', 'mean', 'var'])
+    cells['m2'] = cells['var'].fillna(0) * (cells['count'] - 1)
+    return cells.reset_index().rename(columns={'count': 'n'})
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lead time stats: moment cells vs raw rows")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement, best one is kept")
+    args = parser.parse_args()
+
+    windows = {'all': (None, None), '90 days': ('2016-10-01', '2016-12-29')}
+    rows = []
+    for n in args.rows:
+        raw = synthetic(n)
+        moments = LeadTimeMoments(to_cells(raw))
+        for by, cols in (('brand', ['brand']), ('vendor', ['vendor'])):
+            for window, (start, end) in windows.items():
+                subset = raw if start is None else raw[(raw['day'] >= start) & (raw['day'] <= end)]
+                raw_ms, expected = timed(lambda: subset.groupby(cols)['lead_time'].agg(['count', 'mean', 'std']), args.repeat)
+                cell_ms, got = timed(lambda: moments.stats(by, start, end), args.repeat)
+                rows.append({
+                    'rows': n, 'cells': len(moments.n), 'group_by': by, 'window': window,
+                    'raw_rows_ms': round(raw_ms, 2), 'moments_ms': round(cell_ms, 2),
+                    'max_std_diff': float(np.nanmax(np.abs(got['std_dev_lead_time'].to_numpy() - expected['std'].to_numpy()))),
+                })
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg
+from sqlalchemy import text
+
+import pushdown
+from database import DATABASE_URL, engine
+from rollups import AnalyticsContext, RollupStore, views_current
+from routes import inventory
+
+# mode=sql vs pulling every brand into pandas, for /api/reorder-alerts and
+# /api/inventory-optimization.
+#   pull_all   the per-brand inputs for every brand, formulas + filter + top N in pandas
+#   sql        pushdown.py: formulas, predicate and ORDER BY ... LIMIT in Postgres
+#   memory     the default mode, from the in-memory rollups (no query at all)
+# Bytes are the result as Postgres sends it (COPY ... TO STDOUT, text format).
+#
+#   python bench_pushdown.py --repeat 10
+
+
+def pull_all_query(template, source):
+    # Same CTEs up to `calc`, i.e. one row of inputs per brand, no formulas and no LIMIT
+    head = template.split("\nscored AS (")[0].rstrip().rstrip(',')
+    return head.format(**pushdown.SOURCES[source]) + "\nSELECT * FROM calc"
+
+
+def pull_all_reorder(df, p):
+    df['safety_stock_units'] = df['avg_daily_sales'] * p['safety_stock_days']
+    df['lead_time_demand'] = df['avg_daily_sales'] * df['avg_lead_time_days']
+    df['rop'] = np.floor(df['lead_time_demand'] + df['safety_stock_units'] + 0.9999).astype(int)
+    df = df[df['current_on_hand'] < df['rop']]
+    return df.sort_values(['avg_daily_sales', 'brand'], ascending=[False, True]).head(p['limit'])
+
+
+def pull_all_optimization(df, p):
+    df['eoq'] = np.ceil(np.sqrt(2 * df['annual_demand'] * p['setup_cost'] / (df['purchase_price'] * p['holding_rate']))).astype(int)
+    df['rop'] = np.ceil(df['avg_daily_sales'] * df['avg_lead_time_days'] + df['avg_daily_sales'] * p['safety_stock_days']).astype(int)
+    df = df[df['current_on_hand'] < df['rop']]
+    return df.sort_values(['annual_demand', 'brand'], ascending=[False, True]).head(p['limit'])
+
+
+def copy_bytes(sql, params):
+    # psycopg binds COPY parameters client side
+    url = DATABASE_URL.replace('+psycopg2', '').replace('+psycopg', '')
+    pg_sql = text(sql).compile(dialect=engine.dialect).string
+    with psycopg.connect(url) as conn, conn.cursor() as cur:
+        size = 0
+        with cur.copy(f"COPY ({pg_sql}) TO STDOUT", params) as copy:
+            for block in copy:
+                size += len(block)
+        return size
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes and latency: EOQ/ROP in Postgres vs in pandas")
+    parser.add_argument('--repeat', type=int, default=10, help="runs per measurement, best one is kept")
+    args = parser.parse_args()
+
+    source = 'views' if asyncio.run(views_current()) else 'tables'
+    store = RollupStore.from_engine(engine)
+    base = {**pushdown.window_params(None, None), 'safety_stock_days': inventory.SAFETY_STOCK_DAYS}
+    cases = [
+        ('/api/reorder-alerts', pushdown.REORDER_ALERTS_TEMPLATE, pull_all_reorder,
+         {**base, 'limit': 50},
+         lambda: inventory.reorder_alerts(AnalyticsContext(store))),
+        ('/api/inventory-optimization', pushdown.INVENTORY_OPTIMIZATION_TEMPLATE, pull_all_optimization,
+         {**base, 'setup_cost': inventory.SETUP_COST, 'holding_rate': inventory.HOLDING_RATE, 'limit': 10},
+         lambda: inventory.inventory_optimization(AnalyticsContext(store))),
+    ]
+
+    rows = []
+    for route, template, finish, params, in_memory in cases:
+        pull_sql = pull_all_query(template, source)
+        push_sql = template.format(**pushdown.SOURCES[source])
+
+        def pull_all():
+            with engine.connect() as conn:
+                return finish(pd.read_sql(text(pull_sql), conn, params=params), params)
+
+        def push():
+            with engine.connect() as conn:
+                return pd.read_sql(text(push_sql), conn, params=params)
+
+        for mode, fn, sql in (('pull_all', pull_all, pull_sql), ('sql', push, push_sql), ('memory', in_memory, None)):
+            ms, result = timed(fn, args.repeat)
+            wire = copy_bytes(sql, params) if sql else 0
+            rows.append({
+                'route': route, 'mode': mode, 'source': source if sql else 'rollups',
+                'rows_returned': len(result), 'wire_kb': round(wire / 1024, 1), 'latency_ms': round(ms, 2),
+            })
+
+    print(pd.DataFrame(rows).to_string(index=False))
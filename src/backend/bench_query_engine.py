@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+import lead_times
+import pushdown
+import rollups
+import statements
+from query_engine import DuckDBEngine, PostgresEngine
+from settings import settings
+
+# The same registered statements on both query engines: Postgres at DATABASE_URL vs
+# embedded DuckDB over the Parquet export of that database (database/export_parquet.py).
+# Cases are the full-history scans the API runs: the six rollup pulls of a full
+# refresh, the lead-time moments from Purchases and the mode=sql pushdown queries.
+# Results are compared after sorting, to 1e-9 relative.
+#
+#   python bench_query_engine.py --parquet-dir ../../data/parquet --repeat 3
+
+
+def cases():
+    window = pushdown.window_params(None, None)
+    return [
+        *[(name, {}) for name in rollups.ROLLUP_STATEMENTS],
+        (lead_times.MOMENTS_FROM_PURCHASES, {}),
+        (pushdown.REORDER_ALERTS['tables'], {**window, 'safety_stock_days': 14, 'limit': 50}),
+        (pushdown.INVENTORY_OPTIMIZATION['tables'],
+         {**window, 'setup_cost': 45.0, 'holding_rate': 0.20, 'safety_stock_days': 14, 'limit': 10}),
+    ]
+
+
+def same(a, b):
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    a = a.sort_values(list(a.columns), ignore_index=True)
+    b = b.sort_values(list(b.columns), ignore_index=True)
+    for column in a.columns:
+        x, y = a[column], b[column]
+        if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
+            if not np.allclose(x.to_numpy(dtype=np.float64), y.to_numpy(dtype=np.float64), rtol=1e-9, atol=0, equal_nan=True):
+                return False
+        elif not x.astype(object).equals(y.astype(object)):
+            return False
+    return True
+
+
+async def timed(engine, name, params, repeat):
+    statement = statements.STATEMENTS[name]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await engine.fetch(statement, statement.args(params))
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+async def main(args):
+    # No sampled EXPLAIN ANALYZE re-runs (querylog.py) in the background of the timings
+    settings.slow_query_explain_rate = 0.0
+    engines = [PostgresEngine(), DuckDBEngine(args.parquet_dir, args.threads)]
+    rows = []
+    for name, params in cases():
+        (pg_ms, pg), (duck_ms, duck) = [await timed(engine, name, params, args.repeat) for engine in engines]
+        rows.append({
+            'statement': name,
+            'rows': len(pg),
+            'postgres_ms': round(pg_ms, 1),
+            'duckdb_ms': round(duck_ms, 1),
+            'speedup': round(pg_ms / duck_ms, 1),
+            'same': same(pg, duck),
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Postgres vs embedded DuckDB/Parquet on the API's full-history queries")
+    parser.add_argument('--parquet-dir', default=None, help="export of the DATABASE_URL database (default: data/parquet)")
+    parser.add_argument('--threads', type=int, default=None, help="DuckDB threads (default: one per core)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement, best one is kept")
+    asyncio.run(main(parser.parse_args()))
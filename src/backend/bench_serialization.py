@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import inspect
+import json
+import time
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+import serialization
+from database import engine
+from rollups import AnalyticsContext, RollupStore
+from routes.dashboard import PANELS
+
+# Encode time and payload size per analytics route:
+#   records   to_dict(orient="records") + jsonable_encoder + json.dumps, what FastAPI did
+#   json      serialization.encode_json (orjson, frames read out by column)
+#   arrow     Arrow IPC stream
+#   parquet   Parquet
+# The routes stop at head(10..50); --scale tiles each result to see bigger pages.
+#
+#   python bench_serialization.py --scale 1 100
+
+
+def to_records(payload):
+    if isinstance(payload, pd.DataFrame):
+        return payload.to_dict(orient="records")
+    if isinstance(payload, dict):
+        return {k: to_records(v) for k, v in payload.items()}
+    return payload
+
+
+def encode_records(payload):
+    content = jsonable_encoder(to_records(payload))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def scaled(payload, k):
+    if k == 1:
+        return payload
+    if isinstance(payload, pd.DataFrame):
+        return pd.concat([payload] * k, ignore_index=True)
+    if isinstance(payload, dict):
+        return {key: scaled(v, k) for key, v in payload.items()}
+    return payload
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(body)
+
+
+def results_by_route(store):
+    ctx = AnalyticsContext(store, None, None)
+    loop = asyncio.new_event_loop()
+    results = {}
+    for name, panel in PANELS.items():
+        result = panel(ctx)
+        results[f"/api/{name}"] = loop.run_until_complete(result) if inspect.isawaitable(result) else result
+    loop.close()
+    results["/api/dashboard"] = dict(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encode time / payload size per route and format")
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 100], help="tile each result this many times")
+    parser.add_argument('--repeat', type=int, default=20, help="encodes per measurement, best one is kept")
+    args = parser.parse_args()
+
+    results = results_by_route(RollupStore.from_engine(engine))
+    encoders = {
+        'records': encode_records,
+        'json': serialization.encode_json,
+        'arrow': lambda p: serialization.encode(p, 'arrow')[0],
+        'parquet': lambda p: serialization.encode(p, 'parquet')[0],
+    }
+
+    rows = []
+    for k in args.scale:
+        for route, payload in results.items():
+            payload = scaled(payload, k)
+            row = {'route': route, 'scale': k}
+            for fmt, encode in encoders.items():
+                if fmt in ('arrow', 'parquet') and serialization.to_table(payload) is None:
+                    continue
+                ms, size = timed(lambda: encode(payload), args.repeat)
+                row[f'{fmt}_ms'] = round(ms, 3)
+                row[f'{fmt}_kb'] = round(size / 1024, 1)
+            row['json_speedup'] = round(row['records_ms'] / row['json_ms'], 1)
+            rows.append(row)
+
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,56 @@
+import argparse
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+import simulation
+
+# Monte Carlo safety stock (simulation.py) on synthetic catalogues: wall time per
+# brands x scenarios, with one thread and with one per core, and peak RSS. The
+# results must not depend on the number of workers (one seeded stream per chunk).
+#
+#   python bench_simulation.py --brands 1000 10000 --scenarios 10000 20000
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    demand = rng.lognormal(0, 1.5, n)
+    return pd.DataFrame({
+        'avg_daily_demand': demand,
+        'std_dev_demand': demand * rng.uniform(0.2, 1.5, n),
+        'avg_lead_time': rng.uniform(3, 30, n),
+        'std_dev_lead_time': rng.uniform(0.5, 6, n),
+        'safety_stock': np.ceil(demand * 10),
+    })
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo safety stock throughput")
+    parser.add_argument('--brands', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[10000])
+    parser.add_argument('--max-cells', type=int, default=None, help="cells per chunk (default: settings)")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    rows = []
+    for n in args.brands:
+        df = synthetic(n)
+        for scenarios in args.scenarios:
+            row = {'brands': n, 'scenarios': scenarios, 'draws_m': round(2 * n * scenarios / 1e6)}
+            results = {}
+            for workers in sorted({1, cores}):
+                start = time.perf_counter()
+                results[workers] = simulation.simulate(df, scenarios=scenarios, workers=workers, max_cells=args.max_cells)
+                row[f'{workers}_threads_s'] = round(time.perf_counter() - start, 2)
+            row['same_results'] = results[1].equals(results[cores])
+            row['mean_service_level'] = round(results[1]['achieved_service_level'].mean(), 4)
+            row['peak_rss_mb'] = round(peak_rss_mb())
+            rows.append(row)
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Cold start of one API worker, each case in a fresh interpreter:
+#
+#   eager  prophet and scipy.stats imported up front, as main.py used to pull them in
+#   lazy   plain `import main`: heavy libraries wait for the request that needs them
+#   warm   `import main` plus the WARM_START phase (main.warm_up) before "ready"
+#
+# For each: seconds to import the app, seconds of startup (the lifespan, up to where
+# uvicorn would start accepting), RSS once ready, the first /api/dashboard request and
+# RSS after it. The heavy modules column lists which of HEAVY_MODULES are loaded once
+# ready; `lazy` having any of them is a regression and fails the run.
+#
+#   python bench_startup.py --repeat 3
+
+HEAVY_MODULES = ['prophet', 'cmdstanpy', 'matplotlib', 'scipy.stats', 'scipy.special']
+
+CASES = ['eager', 'lazy', 'warm']
+
+
+def _rss_mb():
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def child(case):
+    """Runs in the fresh interpreter; prints one JSON line."""
+    import asyncio
+
+    start = time.perf_counter()
+    if case == 'eager':
+        import scipy.stats  # noqa: F401
+        import prophet.serialize  # noqa: F401
+    import main
+    from response_cache import asgi_get
+    from settings import settings
+    import_s = time.perf_counter() - start
+
+    settings.warm_start = case == 'warm'
+
+    async def run():
+        started = time.perf_counter()
+        # The app's own lifespan, what uvicorn runs before it starts listening
+        async with main.app.router.lifespan_context(main.app):
+            startup_s = time.perf_counter() - started
+            rss_ready, loaded = _rss_mb(), _loaded()
+            requested = time.perf_counter()
+            status = await asgi_get(main.app, '/api/dashboard', {})
+            first_ms = (time.perf_counter() - requested) * 1000
+            return startup_s, rss_ready, loaded, status, first_ms
+
+    startup_s, rss_ready, loaded, status, first_ms = asyncio.run(run())
+    print(json.dumps({
+        'import_s': import_s,
+        'startup_s': startup_s,
+        'rss_ready_mb': rss_ready,
+        'heavy_modules': loaded,
+        'first_request_ms': first_ms,
+        'first_status': status,
+        'rss_after_mb': _rss_mb(),
+    }))
+
+
+def measure(case, repeat):
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', case],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        # Time to ready is what a deploy waits for, keep the fastest of those
+        if best is None or result['import_s'] + result['startup_s'] < best['import_s'] + best['startup_s']:
+            best = result
+    return best
+
+
+def main(args):
+    # Not at the top: the children import this file too, before their clock starts
+    import pandas as pd
+
+    rows = []
+    for case in args.cases:
+        r = measure(case, args.repeat)
+        rows.append({
+            'case': case,
+            'import_s': round(r['import_s'], 2),
+            'startup_s': round(r['startup_s'], 2),
+            'ready_s': round(r['import_s'] + r['startup_s'], 2),
+            'rss_ready_mb': round(r['rss_ready_mb']),
+            'first_request_ms': round(r['first_request_ms'], 1),
+            'status': r['first_status'],
+            'rss_after_mb': round(r['rss_after_mb']),
+            'heavy_modules': ','.join(r['heavy_modules']) or '-',
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
+
+    lazy = next((row for row in rows if row['case'] == 'lazy'), None)
+    if lazy is not None and lazy['heavy_modules'] != '-':
+        print(f"FAIL: `import main` loads {lazy['heavy_modules']} before any request needs it")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API worker startup time and RSS, eager vs lazy imports vs warm start")
+    parser.add_argument('--cases', nargs='*', default=CASES, choices=CASES)
+    parser.add_argument('--repeat', type=int, default=3, help="fresh processes per case, the fastest to ready is kept")
+    parser.add_argument('--child', choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+    else:
+        main(args)
@@ -0,0 +1,58 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import whatif
+
+# What-if grid evaluation (whatif.py) on synthetic catalogues: the one-off cost of
+# preparing the moments vs each re-evaluation, for a single point and for grids.
+#
+#   python bench_whatif.py --brands 1000 10000 --repeat 20
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    demand = rng.lognormal(0, 1.5, n)
+    lead_time = rng.uniform(3, 30, n)
+    return pd.DataFrame({
+        'brand': np.arange(n),
+        'description': 'Wine',
+        'total_volume': np.round(demand * 365),
+        'avg_daily_demand': demand,
+        'variance_demand_term': lead_time * (demand * rng.uniform(0.2, 1.5, n)) ** 2,
+        'std_dev_lead_time': rng.uniform(0.5, 6, n),
+    })
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+GRIDS = {
+    '1 point': ([0.95], [1.5], [2.5]),
+    '20x10x3': (np.linspace(0.80, 0.99, 20), np.linspace(1.0, 3.0, 10), [1.0, 2.5, 5.0]),
+    '100x10x1': (np.linspace(0.50, 0.999, 100), np.linspace(1.0, 3.0, 10), [2.5]),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if re-evaluation latency")
+    parser.add_argument('--brands', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20, help="runs per measurement, best one is kept")
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.brands:
+        inputs = synthetic(n)
+        prepare_ms, moments = timed(lambda: whatif.Moments(inputs), args.repeat)
+        for name, grid in GRIDS.items():
+            ms, result = timed(lambda: whatif.evaluate(moments, *grid), args.repeat)
+            rows.append({'brands': n, 'grid': name, 'rows': len(result), 'prepare_ms': round(prepare_ms, 2), 'evaluate_ms': round(ms, 2)})
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,104 @@
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+from database import engine
+from rollups import RollupStore
+
+# Memory per uvicorn worker: private rollup copies vs one shared mmap snapshot.
+# Each simulated worker loads the rollups, touches every prefix array (like serving
+# requests would) and then reports its RSS and PSS while all workers are alive.
+# PSS splits shared pages between the processes mapping them, so the sum of PSS
+# is the real footprint of the whole pool; rss_mb_rollups is what loading the rollups
+# added to each worker on its own.
+#
+#   python bench_workers.py --workers 1 2 4 8
+
+
+def _memory_kb():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Rss', 0), fields.get('Pss', 0)
+
+
+def _touch(store):
+    total = 0.0
+    for rollup in (store.sales, store.received, store.ordered):
+        for prefix in rollup.prefix.values():
+            total += float(np.asarray(prefix[-1]).sum())
+    return total
+
+
+def _worker(mode, path, start_barrier, done_barrier, results):
+    base_rss, _ = _memory_kb()
+    arrays, meta = snapshot.load(path)
+    if mode == 'private':
+        # What every worker building its own rollups ends up holding
+        arrays = {key: np.array(value) for key, value in arrays.items()}
+    store = RollupStore.from_arrays(arrays, meta)
+    start_barrier.wait()
+    _touch(store)
+    done_barrier.wait()
+    rss, pss = _memory_kb()
+    results.put((rss - base_rss, pss))
+    # Stay alive until everyone has measured, PSS depends on who else maps the pages
+    done_barrier.wait()
+
+
+def run(mode, path, workers):
+    ctx = mp.get_context('fork')
+    start_barrier = ctx.Barrier(workers)
+    done_barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, path, start_barrier, done_barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    measured = [results.get() for _ in range(workers)]
+    for p in procs:
+        p.join()
+    return {
+        'mode': mode,
+        'workers': workers,
+        'rss_mb_rollups': round(np.mean([m[0] for m in measured]) / 1024, 1),
+        'pss_mb_total': round(sum(m[1] for m in measured) / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker memory: private rollups vs shared snapshot")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    store = RollupStore.from_engine(engine)
+    build_seconds = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory() as root:
+        path = snapshot.publish(root, *store.to_arrays())
+        size_mb = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+        t0 = time.perf_counter()
+        RollupStore.from_arrays(*snapshot.load(path))
+        map_seconds = time.perf_counter() - t0
+        del store
+
+        print(f"rollup build from DB: {build_seconds:.2f}s, map snapshot: {map_seconds * 1000:.1f}ms, "
+              f"snapshot size: {size_mb:.1f} MB")
+        rows = [run(mode, path, n) for n in args.workers for mode in ('private', 'mapped')]
+    df = pd.DataFrame(rows)
+    # Growth of the pool's footprint per extra worker, relative to a single worker
+    base = df[df['workers'] == df['workers'].min()].set_index('mode')['pss_mb_total']
+    df['pss_mb_per_extra_worker'] = [
+        round((r.pss_mb_total - base[r.mode]) / (r.workers - df['workers'].min()), 1) if r.workers > df['workers'].min() else None
+        for r in df.itertuples()
+    ]
+    print(df.to_string(index=False))
@@ -0,0 +1,96 @@
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+from settings import settings
+
+# Brand credit scoring for /api/credit-risk.
+# A score starts at `base_score` and earns points for margin, speed of sale and scale,
+# each capped, plus a small deterministic per-brand jitter, then lands in
+# [min_score, max_score]. The score sets the risk band and the APR; the loan size
+# follows capital outlay. Every rule is a whole-column NumPy expression, so scoring
+# the full brand universe costs about the same as scoring the top 50.
+
+
+class CreditPolicy(BaseModel):
+    """Weights and thresholds of the scoring rules. Override any of them with the
+    CREDIT_POLICY setting, a JSON object, e.g. CREDIT_POLICY='{"margin_cap": 0.25}'."""
+
+    model_config = ConfigDict(frozen=True)
+
+    base_score: float = 300
+    min_score: int = 300
+    max_score: int = 850
+
+    # Margin points: full marks at `margin_cap` profit margin
+    margin_cap: float = 0.30
+    margin_points: float = 200
+
+    # Days-to-sell points: full marks at `days_best` or faster, none at `days_worst` or slower
+    days_best: float = 10
+    days_worst: float = 90
+    days_points: float = 150
+    # Brands with no (or a non-positive) days-to-sell get this instead
+    default_days_to_sell: float = 180
+
+    # Revenue points: full marks at `revenue_cap` revenue
+    revenue_cap: float = 10000
+    revenue_points: float = 200
+
+    # brand % modulus - offset, to spread brands with identical numbers
+    jitter_modulus: int = 100
+    jitter_offset: int = 50
+
+    # (lowest score, label), best band first. Below all of them: `default_risk`
+    risk_bands: list[tuple[int, str]] = [(700, "Low Risk"), (600, "Moderate Risk")]
+    default_risk: str = "High Risk"
+
+    # APR falls linearly from `apr_at_min_score` to `apr_at_max_score`
+    apr_at_min_score: float = 24.0
+    apr_at_max_score: float = 5.0
+    apr_decimals: int = 1
+
+    # Suggested loan: a share of capital outlay, clipped
+    loan_share: float = 0.20
+    loan_min: float = 500
+    loan_max: float = 500000
+
+
+POLICY = CreditPolicy(**settings.credit_policy)
+
+
+def score(df, policy=POLICY):
+    """Score every row of `df` (brand, total_revenue, gross_profit, total_capital_outlay,
+    avg_days_to_sell). Returns a copy with avg_days_to_sell cleaned and profit_margin,
+    credit_score, risk_level, suggested_loan_amount, proposed_apr added."""
+    df = df.copy()
+    revenue = df['total_revenue'].to_numpy(dtype=np.float64)
+    profit = df['gross_profit'].to_numpy(dtype=np.float64)
+    outlay = df['total_capital_outlay'].to_numpy(dtype=np.float64)
+    brand = df['brand'].to_numpy(dtype=np.int64)
+
+    days = df['avg_days_to_sell'].to_numpy(dtype=np.float64)
+    days = np.where(np.isnan(days) | (days <= 0), policy.default_days_to_sell, days)
+
+    margin = profit / np.where(revenue == 0, 1, revenue)
+    score_margin = np.minimum(margin / policy.margin_cap, 1) * policy.margin_points
+    score_days = np.clip((policy.days_worst - days) / (policy.days_worst - policy.days_best), 0, 1) * policy.days_points
+    score_revenue = np.minimum(revenue / policy.revenue_cap, 1) * policy.revenue_points
+
+    raw = policy.base_score + score_margin + score_days + score_revenue
+    credit = np.where(np.isnan(raw), policy.base_score, raw).astype(np.int64)
+    credit = credit + brand % policy.jitter_modulus - policy.jitter_offset
+    credit = np.clip(credit, policy.min_score, policy.max_score)
+
+    bands = sorted(policy.risk_bands, reverse=True)
+    risk = np.select([credit >= low for low, _ in bands], [label for _, label in bands], default=policy.default_risk)
+
+    span = policy.max_score - policy.min_score
+    apr = policy.apr_at_min_score - ((credit - policy.min_score) / span) * (policy.apr_at_min_score - policy.apr_at_max_score)
+
+    df['avg_days_to_sell'] = days
+    df['profit_margin'] = margin
+    df['credit_score'] = credit
+    df['risk_level'] = risk
+    df['suggested_loan_amount'] = np.clip(outlay * policy.loan_share, policy.loan_min, policy.loan_max)
+    df['proposed_apr'] = np.round(apr, policy.apr_decimals)
+    return df
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import statements
+from settings import settings
+
+# Chunked, memory-compact extraction of big query results (the brand x day rollup
+# pulls). Rows come through a server-side cursor `extract_chunk_rows` at a time; each
+# chunk is cast to compact dtypes straight away and the raw records are dropped, so
+# the peak is one chunk of Python objects plus the compact columns, instead of every
+# row as a tuple and an object column.
+#
+# dtypes: {column: dtype} of the columns to keep. 'int32' / 'int64' (nullable),
+# 'float32' / 'float64', 'date' (datetime64) or 'category'. Columns not listed are
+# dropped once the reductions below have seen them.
+#
+# reduce: {name: (by, column, how)}, aggregated chunk by chunk into one Series per
+# name, indexed by `by`. how is 'max', 'min' or 'sum' (anything that merges with itself).
+
+_NUMPY = {
+    'int32': np.int32,
+    'int64': np.int64,
+    'float32': np.float32,
+    'float64': np.float64,
+}
+
+
+class _Categories:
+    """Category dictionary grown across chunks, so every chunk shares one set of codes."""
+
+    def __init__(self):
+        self.values = pd.Index([], dtype=object)
+
+    def codes(self, column):
+        new = pd.Index(column.dropna().unique()).difference(self.values)
+        if len(new):
+            self.values = self.values.append(new)
+        return self.values.get_indexer(column).astype(np.int32)
+
+    def categorical(self, codes):
+        # Sorted categories (ordered), so min / max work like they do on the strings
+        order = np.argsort(self.values.to_numpy(dtype=object), kind='stable')
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        codes = np.where(codes >= 0, rank[np.maximum(codes, 0)], -1) if len(rank) else codes
+        return pd.Categorical.from_codes(codes, self.values[order], ordered=True)
+
+
+def _aggregate(frame, by, column, how):
+    if how in ('max', 'min'):
+        # Sort + first/last per key: vectorized for strings too, where groupby max
+        # falls back to one reduction per group. NULLs sort to the side never kept.
+        frame = frame.sort_values(column, kind='stable', na_position='first' if how == 'max' else 'last')
+        frame = frame.drop_duplicates(by, keep='last' if how == 'max' else 'first')
+        return frame.set_index(by)[column].sort_index()
+    return frame.groupby(by)[column].agg(how)
+
+
+class FrameBuilder:
+    """Collects query chunks into one compact DataFrame plus the running reductions.
+    Chunks are kept as plain NumPy buffers (ints with a separate null mask) and joined
+    one column at a time at the end, each column's chunks freed as soon as it's built."""
+
+    def __init__(self, dtypes=None, reduce=None):
+        self.dtypes = dtypes
+        self.reduce = reduce or {}
+        self.parts = {}
+        self.masks = {}
+        self.reduced = {}
+        self.categories = {}
+
+    def add(self, chunk):
+        for name, (by, column, how) in self.reduce.items():
+            part = chunk[[by, column]].dropna(subset=[by])
+            if name in self.reduced:
+                part = pd.concat([self.reduced[name].reset_index(), part], ignore_index=True)
+            self.reduced[name] = _aggregate(part, by, column, how)
+
+        for column, dtype in (self.dtypes or dict.fromkeys(chunk.columns)).items():
+            values = chunk[column]
+            if dtype == 'category':
+                values = self.categories.setdefault(column, _Categories()).codes(values)
+            elif dtype == 'date':
+                values = pd.to_datetime(values).to_numpy()
+            elif dtype in ('int32', 'int64'):
+                mask = values.isna().to_numpy()
+                self.masks.setdefault(column, []).append(mask)
+                values = values.fillna(0).to_numpy().astype(_NUMPY[dtype])
+            elif dtype is not None:
+                values = values.to_numpy(dtype=_NUMPY[dtype])
+            self.parts.setdefault(column, []).append(values)
+
+    def _column(self, column, dtype):
+        parts = self.parts.pop(column, [])
+        if dtype == 'category':
+            codes = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+            return self.categories.setdefault(column, _Categories()).categorical(codes)
+        if dtype in ('int32', 'int64'):
+            masks = self.masks.pop(column, [])
+            values = np.concatenate(parts) if parts else np.empty(0, dtype=_NUMPY[dtype])
+            mask = np.concatenate(masks) if masks else np.empty(0, dtype=bool)
+            return pd.arrays.IntegerArray(values, mask)
+        if dtype == 'date':
+            return np.concatenate(parts) if parts else np.empty(0, dtype='datetime64[s]')
+        if dtype is not None:
+            return np.concatenate(parts) if parts else np.empty(0, dtype=_NUMPY[dtype])
+        return pd.concat([pd.Series(p) for p in parts], ignore_index=True) if parts else pd.Series([], dtype=object)
+
+    def result(self):
+        columns = {c: self._column(c, dtype) for c, dtype in (self.dtypes or dict.fromkeys(self.parts)).items()}
+        for name in self.reduce:
+            part = self.reduced.setdefault(name, pd.Series([], dtype=object))
+            part.index = part.index.astype(np.int64)
+        return pd.DataFrame(columns, copy=False), self.reduced
+
+
+async def read_frame(name, params=None, dtypes=None, reduce=None, chunk_size=None):
+    """Registered statement -> (compact DataFrame, {reduce name: Series}), chunk by chunk."""
+    builder = FrameBuilder(dtypes, reduce)
+    async for chunk in statements.execute_chunks(name, params, chunk_size or settings.extract_chunk_rows):
+        builder.add(chunk)
+    return builder.result()
+
+
+def read_frame_sync(bind, query, params=None, dtypes=None, reduce=None, chunk_size=None):
+    """Same on a sync engine: pd.read_sql over a streaming (server-side) cursor."""
+    builder = FrameBuilder(dtypes, reduce)
+    with bind.connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunk_size or settings.extract_chunk_rows):
+            builder.add(chunk)
+    return builder.result()
@@ -0,0 +1,118 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+import statements
+from rollups import data_version
+
+# Lead time statistics for any PO-date window and any brand / vendor grouping
+# (/api/lead-times), from the LeadTimeMoments table that database/ingest.py keeps up
+# to date: one (count, mean, M2) row per brand x vendor x PO date. Any set of those
+# cells combines into the exact mean and variance of their purchases, so a lookup
+# costs one pass over the cells in the window, however long the purchases history is.
+# Databases without the table get the same cells aggregated from Purchases.
+
+MOMENTS = statements.register('lead_time_moments', """
+SELECT brand, vendornumber AS vendor, podate AS day, n, mean, m2
+FROM leadtimemoments
+""")
+MOMENTS_FROM_PURCHASES = statements.register('lead_time_moments_from_purchases', """
+SELECT
+    brand,
+    COALESCE(vendornumber, 0) AS vendor,
+    podate AS day,
+    COUNT(*) AS n,
+    AVG(receivingdate - podate)::float8 AS mean,
+    (VAR_POP(receivingdate - podate) * COUNT(*))::float8 AS m2
+FROM purchases
+WHERE brand IS NOT NULL
+  AND podate IS NOT NULL
+  AND receivingdate IS NOT NULL
+  AND receivingdate >= podate
+GROUP BY brand, COALESCE(vendornumber, 0), podate
+""")
+MOMENTS_EXIST = statements.register(
+    'lead_time_moments_exist', "SELECT to_regclass('leadtimemoments') IS NOT NULL AS present"
+)
+
+GROUPINGS = {
+    'brand': ['brand'],
+    'vendor': ['vendor'],
+    'brand_vendor': ['brand', 'vendor'],
+}
+
+
+def combine(codes, groups, n, mean, m2):
+    """Merge per-cell (n, mean, M2) into `groups` totals; `codes` maps cells to groups.
+    The parallel-variance merge of Chan et al. done for all groups at once: M2 of a
+    group is its cells' M2 plus their spread around the group mean."""
+    count = np.bincount(codes, n, minlength=groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group_mean = np.bincount(codes, n * mean, minlength=groups) / count
+    group_m2 = np.bincount(codes, m2 + n * (mean - group_mean[codes]) ** 2, minlength=groups)
+    return count, group_mean, group_m2
+
+
+class LeadTimeMoments:
+    """The moment cells, sorted by PO date so a window is one contiguous slice. Every
+    grouping's group codes are worked out once here, so a lookup is a slice and a few
+    bincounts."""
+
+    def __init__(self, frame):
+        frame = frame.sort_values('day', kind='stable')
+        self.day = pd.to_datetime(frame['day']).values.astype('datetime64[D]')
+        self.n = frame['n'].to_numpy(dtype=np.float64)
+        self.mean = frame['mean'].to_numpy(dtype=np.float64)
+        self.m2 = frame['m2'].to_numpy(dtype=np.float64)
+
+        keys = {c: frame[c].to_numpy(dtype=np.int64) for c in ('brand', 'vendor')}
+        self.groups = {}
+        for by, columns in GROUPINGS.items():
+            index = pd.MultiIndex.from_arrays([keys[c] for c in columns], names=columns)
+            codes, groups = pd.factorize(index, sort=True)
+            # factorize drops the level names
+            self.groups[by] = (codes, groups.set_names(columns))
+
+    def _window(self, start_date=None, end_date=None):
+        if not (start_date and end_date):
+            return slice(0, len(self.day))
+        lo = np.searchsorted(self.day, np.datetime64(start_date, 'D'), side='left')
+        hi = np.searchsorted(self.day, np.datetime64(end_date, 'D'), side='right')
+        return slice(lo, max(lo, hi))
+
+    def stats(self, by='brand', start_date=None, end_date=None):
+        """Count, AVG and STDDEV (sample) of lead time per group, for POs dated in the range."""
+        codes, groups = self.groups[by]
+        window = self._window(start_date, end_date)
+        count, mean, m2 = combine(codes[window], len(groups), self.n[window], self.mean[window], self.m2[window])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.where(count > 1, m2 / (count - 1), np.nan))
+        df = groups.to_frame(index=False)
+        df['lead_time_count'] = count.astype(np.int64)
+        df['avg_lead_time'] = mean
+        df['std_dev_lead_time'] = std
+        return df[df['lead_time_count'] > 0].reset_index(drop=True)
+
+
+_moments = None
+_moments_version = None
+_moments_lock = asyncio.Lock()
+
+
+async def load():
+    present = (await statements.execute(MOMENTS_EXIST))['present'].iloc[0]
+    return LeadTimeMoments(await statements.execute(MOMENTS if present else MOMENTS_FROM_PURCHASES))
+
+
+async def current():
+    """The moments as of the served rollups: reloaded when a refresh bumps the data
+    version (ingest.py merges new purchases before the API's delta refresh)."""
+    global _moments, _moments_version
+    version = data_version()
+    if _moments is None or _moments_version != version:
+        async with _moments_lock:
+            if _moments is None or _moments_version != version:
+                _moments = await load()
+                _moments_version = version
+    return _moments
@@ -1,8 +1,76 @@
-from fastapi import FastAPI
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routes import inventory, sales, financials, forecasting, credit
+from starlette.responses import PlainTextResponse
+import metrics
+from routes import inventory, sales, financials, forecasting, credit, dashboard, listings, admin
+from rollups import data_version, get_rollups, refresh_rollups
+from response_cache import CachedResponse, cache_key, prewarm, read_body, respond, response_cache
+from serialization import negotiate
+from settings import settings
 
-app = FastAPI(title="VinoLytics API", description="Backend for the VinoLytics dashboard")
+logger = logging.getLogger(__name__)
+
+async def warm_up():
+    # Everything a cold worker would load on its first dashboard requests: the rollups,
+    # the lazily imported libraries and forecast models behind the panels, and the
+    # response cache for the standard date presets
+    start = time.perf_counter()
+    store = await get_rollups()
+    warmed = await prewarm(app, ["/api/dashboard"], store.sales.days)
+    logger.info("Warm-up done in %.1fs, %d responses cached", time.perf_counter() - start, warmed)
+    return warmed
+
+@asynccontextmanager
+async def lifespan(app):
+    # uvicorn only starts accepting connections once this has run up to the yield
+    if settings.warm_start:
+        try:
+            await warm_up()
+        except Exception:
+            # Serve anyway, the first requests load what they need like without warm-up
+            logger.exception("Warm-up failed")
+    yield
+
+app = FastAPI(title="VinoLytics API", description="Backend for the VinoLytics dashboard", lifespan=lifespan)
+
+# Every analytics GET is a pure function of the rollups + its query string.
+# Registered before CORS so CORS stays the outer layer and cache hits / 304s get its headers too.
+# Exports stream and are left out.
+CACHED_PATHS = {"/api/dashboard"} | {f"/api/{name}" for name in dashboard.PANELS} | {f"/api/{name}/page" for name in listings.LISTINGS} | {"/api/safety-stock-simulation/what-if", "/api/lead-times"}
+
+@app.middleware("http")
+async def cache_analytics_responses(request: Request, call_next):
+    if request.method != "GET" or request.url.path not in CACHED_PATHS:
+        return await call_next(request)
+
+    # Make sure the rollups exist first, the data version is only meaningful after that
+    await get_rollups()
+    # Same query in JSON and in Arrow/Parquet are different bodies
+    fmt = negotiate(request.headers.get("accept"))
+    key = cache_key(request.url.path, request.query_params, data_version(), fmt)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return respond(request, entry, "HIT")
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    entry = response_cache.put(key, CachedResponse(await read_body(response), response.headers.get("content-type")))
+    return respond(request, entry, "MISS")
+
+def route_label(scope, status):
+    # The path of a route that answered (cache hits never reach the router, but only
+    # cached paths hit). The only path param, listings' {name}, 404s outside a fixed
+    # set, so the label count stays bounded.
+    if status == 404 or (scope.get("route") is None and scope["path"] not in CACHED_PATHS):
+        return "unmatched"
+    return scope["path"]
+
+# Added after the cache so it wraps it: hits and 304s are timed and counted too
+app.add_middleware(metrics.TimingMiddleware, label=route_label, server_timing=settings.server_timing)
 
 # Set up CORS so our future React frontend doesn't complain
 # TODO: Tighten this up before we deploy anywhere public
@@ -17,6 +85,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # The browser cache revalidates with If-None-Match by itself, this also lets scripts read the ETag
+    expose_headers=["ETag", "Server-Timing"],
 )
 
 @app.get("/")
@@ -24,9 +94,43 @@ def health_check():
     # Just a simple ping to see if the lights are on
     return {"status": "ok", "message": "VinoLytics API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus scrape target: per-route phase histograms, rows fetched, response bytes
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/refresh-rollups")
+async def rebuild_rollups(mode: str = Query("full")):
+    # Hit this after seed_data.py (mode=full) or ingest.py (mode=delta) so the in-memory
+    # brand x day rollups pick up the new rows. Without ROLLUP_SNAPSHOT_DIR this only
+    # refreshes the worker that handles the request, the others keep serving their own
+    # copy; with it, they switch to the new snapshot on their next request.
+    if mode not in ("full", "delta"):
+        raise HTTPException(status_code=400, detail="mode must be 'full' or 'delta'")
+    version = data_version()
+    store = await refresh_rollups(mode)
+    warmed = 0
+    if data_version() != version:
+        # Older entries can't be hit any more, free them now instead of waiting for LRU
+        response_cache.clear()
+        if settings.response_cache_prewarm:
+            warmed = await prewarm(app, ["/api/dashboard"], store.sales.days)
+    return {
+        "status": "ok",
+        "mode": mode,
+        "brands": int(len(store.brands)),
+        "sales_days": int(len(store.sales.days)),
+        "last_batch_id": int(store.last_batch_id),
+        "data_version": data_version(),
+        "prewarmed": warmed,
+    }
+
 # Hook up the analytics routers
 app.include_router(inventory.router, prefix="/api", tags=["Inventory"])
 app.include_router(sales.router, prefix="/api", tags=["Sales"])
 app.include_router(financials.router, prefix="/api", tags=["Financials"])
 app.include_router(forecasting.router, prefix="/api", tags=["Forecasting"])
 app.include_router(credit.router, prefix="/api", tags=["Credit Risk"])
+app.include_router(dashboard.router, prefix="/api", tags=["Dashboard"])
+app.include_router(listings.router, prefix="/api", tags=["Listings"])
+app.include_router(admin.router, prefix="/api", tags=["Admin"])
@@ -0,0 +1,233 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.datastructures import MutableHeaders
+
+# Per-request timing hooks plus the process-wide histograms behind /metrics.
+#
+# The middleware in main.py opens a RequestTimings for every request and keeps it in a
+# context variable, which follows the request into its tasks and threadpool calls. The
+# hooks add to whichever request is current (and do nothing outside of one):
+#
+#   pool       waiting for a pooled connection (query_engine.py)
+#   db         executing statements and fetching their rows
+#   decode     turning fetched rows into DataFrames
+#   serialize  encoding the response body (serialization.py, paging.py)
+#   compute    the rest of the handler: pandas transforms over the rollups
+#   total      the whole request, as the middleware sees it
+#
+# Statements a request runs concurrently (the six rollup pulls of a refresh) each add
+# their own time, so pool / db / decode are summed work, not wall time, and compute is
+# whatever wall time is left (never below zero).
+#
+# Each worker process keeps its own numbers; scrape every worker.
+#
+# TimingMiddleware is plain ASGI rather than @app.middleware("http"): that one runs the
+# app in an extra task and re-streams every body, which costs about as much as a
+# cache hit itself.
+
+PHASES = ['pool', 'db', 'decode', 'compute', 'serialize', 'total']
+
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+ROWS_BUCKETS = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+BYTES_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+
+class RequestTimings:
+    """Phase seconds and fetched rows of one request."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.start = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds, rows=0):
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.rows += rows
+
+    def finish(self, seconds=None):
+        """Fill in total (wall time so far unless given) and compute."""
+        total = time.perf_counter() - self.start if seconds is None else seconds
+        with self._lock:
+            self.seconds['total'] = total
+            measured = sum(self.seconds[p] for p in PHASES if p not in ('compute', 'total'))
+            self.seconds['compute'] = max(0.0, total - measured)
+        return self
+
+    def server_timing(self, cache=None):
+        """Server-Timing header value, phases in ms; shows up per request in devtools."""
+        parts = [f'{phase};dur={self.seconds[phase] * 1000:.2f}' for phase in PHASES if self.seconds[phase] or phase == 'total']
+        if self.rows:
+            parts.append(f'rows;desc="{self.rows}"')
+        if cache:
+            parts.append(f'cache;desc="{cache}"')
+        return ', '.join(parts)
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request(path=None):
+    """Begin timing a request; returns (timings, token for end_request)."""
+    timings = RequestTimings(path)
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current():
+    """The RequestTimings of the request being served, None outside of one."""
+    return _current.get()
+
+
+def record(phase, seconds, rows=0):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds, rows)
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class Histogram:
+    """Prometheus histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets + ['+Inf'], counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {_number(total)}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+REQUESTS = Counter('vinolytics_requests_total', 'HTTP requests by route, method, status and response cache outcome.',
+                   ['route', 'method', 'status', 'cache'])
+PHASE_SECONDS = Histogram('vinolytics_request_phase_seconds', 'Time per request spent in each phase (pool = DB pool wait).',
+                          ['route', 'phase'], SECONDS_BUCKETS)
+ROWS_FETCHED = Histogram('vinolytics_request_rows_fetched', 'Rows fetched from the query engine per request.',
+                         ['route'], ROWS_BUCKETS)
+RESPONSE_BYTES = Histogram('vinolytics_response_bytes', 'Response body size per request.',
+                           ['route'], BYTES_BUCKETS)
+STATEMENT_SECONDS = Histogram('vinolytics_statement_seconds', 'Query engine time per execution of each named statement.',
+                              ['statement'], SECONDS_BUCKETS)
+
+REGISTRY = [REQUESTS, PHASE_SECONDS, ROWS_FETCHED, RESPONSE_BYTES, STATEMENT_SECONDS]
+
+
+def observe(route, method, status, cache, timings, body_bytes):
+    REQUESTS.inc((route, method, str(status), cache or ''))
+    for name in PHASES:
+        PHASE_SECONDS.observe((route, name), timings.seconds[name])
+    ROWS_FETCHED.observe((route,), timings.rows)
+    RESPONSE_BYTES.observe((route,), body_bytes)
+
+
+class TimingMiddleware:
+    """Times every HTTP request: Server-Timing on the response head, histograms once the
+    last body chunk is sent (exports stream long after the headers). `label(scope,
+    status)` names the route."""
+
+    def __init__(self, app, label, server_timing=True):
+        self.app = app
+        self.label = label
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        timings, token = start_request(scope['path'])
+        state = {'status': 500, 'cache': None, 'bytes': 0}
+
+        async def send_timed(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                headers = MutableHeaders(scope=message)
+                state['cache'] = headers.get('x-cache')
+                if self.server_timing:
+                    headers.append('Server-Timing', timings.finish().server_timing(state['cache']))
+            elif message['type'] == 'http.response.body':
+                state['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            end_request(token)
+            observe(self.label(scope, state['status']), scope['method'], state['status'], state['cache'], timings.finish(), state['bytes'])
+
+
+def render():
+    """Everything in the Prometheus text exposition format (version 0.0.4)."""
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
@@ -0,0 +1,102 @@
+import base64
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import HTTPException
+from starlette.responses import StreamingResponse
+
+import metrics
+from serialization import dumps, records
+
+# Keyset pagination and streaming export for the ranked analytics lists.
+# A list is ordered by its sort key(s) with brand as the tiebreaker, so every row has
+# a unique position. The cursor is the (sort values..., brand) of the last row a
+# client saw, and the next page is simply "rows after that tuple" -- no OFFSET, and
+# pages stay consistent while paging even if earlier rows are skipped.
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)).decode().rstrip('=')
+
+
+def _matches(value, column):
+    """A cursor value can only be compared with a column of its own kind."""
+    if pd.api.types.is_numeric_dtype(column):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, str)
+
+
+def decode_cursor(cursor, df, keys):
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if (not isinstance(values, list) or len(values) != len(keys)
+            or not all(_matches(value, df[col]) for (col, _), value in zip(keys, values))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keys_of(order):
+    """`order` is [(column, ascending), ...]; brand always breaks ties, ascending."""
+    return list(order) + [('brand', True)]
+
+
+def after(df, keys, values):
+    """Mask of the rows strictly after `values` in `keys` order."""
+    mask = np.zeros(len(df), dtype=bool)
+    equal = np.ones(len(df), dtype=bool)
+    for (col, ascending), value in zip(keys, values):
+        column = df[col].to_numpy()
+        mask |= equal & ((column > value) if ascending else (column < value))
+        equal &= column == value
+    return mask
+
+
+def keyset_page(df, order, cursor=None, limit=100):
+    """One page of `df` (already sorted by keys_of(order)) after `cursor`. Returns (page, next cursor)."""
+    keys = keys_of(order)
+    if cursor:
+        df = df[after(df, keys, decode_cursor(cursor, df, keys))]
+    page = df.head(limit)
+    next_cursor = None
+    if len(df) > limit:
+        next_cursor = encode_cursor([page[col].iloc[-1] for col, _ in keys])
+    return page, next_cursor
+
+
+def sort_by_keys(df, order):
+    keys = keys_of(order)
+    return df.sort_values(by=[col for col, _ in keys], ascending=[asc for _, asc in keys], kind='stable')
+
+
+def encode_chunk(chunk, fmt, first):
+    if fmt == 'csv':
+        return chunk.to_csv(index=False, header=first).encode()
+    return b''.join(dumps(row) + b'\n' for row in records(chunk))
+
+
+def iter_export(df, columns, fmt, chunk_size):
+    # Only one chunk is ever encoded at a time
+    if df.empty and fmt == 'csv':
+        yield (','.join(columns) + '\n').encode()
+    for start in range(0, len(df), chunk_size):
+        with metrics.phase('serialize'):
+            chunk = encode_chunk(df.iloc[start:start + chunk_size][columns], fmt, start == 0)
+        yield chunk
+
+
+def export_response(df, columns, fmt, filename, chunk_size=1000):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return StreamingResponse(
+        iter_export(df, columns, fmt, chunk_size),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,147 @@
+import pandas as pd
+
+import statements
+from rollups import (
+    ORDERED_ROLLUP_QUERY, PRICES_QUERY, INVENTORY_QUERY, SALES_ROLLUP_QUERY, views_current,
+)
+
+# mode=sql for /api/reorder-alerts and /api/inventory-optimization.
+# The in-memory path gets every brand's aggregates and applies the reorder formulas
+# in pandas. Here the whole thing -- per-brand demand and lead time, EOQ / ROP, the
+# current_on_hand < rop predicate and ORDER BY ... LIMIT -- runs in Postgres and only
+# the rows the route returns come back.
+#
+# The per-brand numbers are read from the same brand x day aggregates the rollups are
+# built from: the migration's materialized views when they include every ingested
+# batch, otherwise the rollup queries over the fact tables as subqueries. Sums are
+# cast to float8 so the formulas round exactly like the pandas version.
+
+# Both dates or neither, like AnalyticsContext
+_WINDOW = """(CAST(:start_date AS date) IS NULL OR CAST(:end_date AS date) IS NULL
+           OR day BETWEEN CAST(:start_date AS date) AND CAST(:end_date AS date))"""
+
+REORDER_ALERTS_TEMPLATE = f"""
+WITH demand AS (
+    SELECT
+        brand,
+        MAX(description) AS description,
+        SUM(sales_quantity) FILTER (WHERE {_WINDOW})::float8 AS sales_quantity
+    FROM {{sales}}
+    GROUP BY brand
+    HAVING COUNT(*) FILTER (WHERE {_WINDOW}) > 0
+),
+lead_times AS (
+    SELECT brand, SUM(lead_time_sum)::float8 / SUM(lead_time_count) AS avg_lead_time
+    FROM {{ordered}}
+    GROUP BY brand
+    HAVING SUM(lead_time_count) > 0
+),
+inventory AS ({INVENTORY_QUERY}),
+calc AS (
+    SELECT
+        d.brand,
+        d.description,
+        d.sales_quantity / 365.0 AS avg_daily_sales,
+        COALESCE(l.avg_lead_time, 14) AS avg_lead_time_days,
+        COALESCE(i.current_on_hand, 0)::float8 AS current_on_hand
+    FROM demand d
+    LEFT JOIN lead_times l ON l.brand = d.brand
+    LEFT JOIN inventory i ON i.brand = d.brand
+),
+scored AS (
+    SELECT
+        *,
+        avg_daily_sales * CAST(:safety_stock_days AS float8) AS safety_stock_units,
+        avg_daily_sales * avg_lead_time_days AS lead_time_demand
+    FROM calc
+)
+SELECT *, FLOOR(lead_time_demand + safety_stock_units + 0.9999)::int AS rop
+FROM scored
+WHERE current_on_hand < FLOOR(lead_time_demand + safety_stock_units + 0.9999)
+ORDER BY avg_daily_sales DESC, brand
+LIMIT :limit
+"""
+
+INVENTORY_OPTIMIZATION_TEMPLATE = f"""
+WITH demand AS (
+    SELECT brand, MAX(description) AS description, SUM(sales_quantity)::float8 AS annual_demand
+    FROM {{sales}}
+    GROUP BY brand
+),
+lead_times AS (
+    SELECT brand, SUM(lead_time_sum)::float8 / SUM(lead_time_count) AS avg_lead_time
+    FROM {{ordered}}
+    WHERE {_WINDOW}
+    GROUP BY brand
+    HAVING SUM(lead_time_count) > 0
+),
+prices AS ({PRICES_QUERY}),
+inventory AS ({INVENTORY_QUERY}),
+calc AS (
+    SELECT
+        d.brand,
+        d.description,
+        d.annual_demand,
+        d.annual_demand / 365.0 AS avg_daily_sales,
+        p.purchase_price::float8 AS purchase_price,
+        COALESCE(l.avg_lead_time, 14) AS avg_lead_time_days,
+        COALESCE(i.current_on_hand, 0)::float8 AS current_on_hand
+    FROM demand d
+    JOIN prices p ON p.brand = d.brand
+    LEFT JOIN lead_times l ON l.brand = d.brand
+    LEFT JOIN inventory i ON i.brand = d.brand
+    WHERE d.annual_demand > 0 AND p.purchase_price > 0
+),
+scored AS (
+    SELECT
+        *,
+        CEIL(SQRT(2 * annual_demand * CAST(:setup_cost AS float8) / (purchase_price * CAST(:holding_rate AS float8))))::int AS eoq,
+        CEIL(avg_daily_sales * avg_lead_time_days + avg_daily_sales * CAST(:safety_stock_days AS float8))::int AS rop
+    FROM calc
+)
+SELECT brand, description, current_on_hand, rop, eoq, 'Reorder Now' AS action_required
+FROM scored
+WHERE current_on_hand < rop
+ORDER BY annual_demand DESC, brand
+LIMIT :limit
+"""
+
+SOURCES = {
+    'views': {'sales': 'mv_sales_brand_day', 'ordered': 'mv_ordered_brand_day'},
+    'tables': {'sales': f'({SALES_ROLLUP_QUERY}) sales_days', 'ordered': f'({ORDERED_ROLLUP_QUERY}) ordered_days'},
+}
+
+REORDER_ALERTS = {
+    source: statements.register(f'reorder_alerts_{source}', REORDER_ALERTS_TEMPLATE.format(**relations))
+    for source, relations in SOURCES.items()
+}
+INVENTORY_OPTIMIZATION = {
+    source: statements.register(f'inventory_optimization_{source}', INVENTORY_OPTIMIZATION_TEMPLATE.format(**relations))
+    for source, relations in SOURCES.items()
+}
+
+
+def window_params(start_date, end_date):
+    if not (start_date and end_date):
+        return {'start_date': None, 'end_date': None}
+    return {'start_date': pd.Timestamp(start_date).date(), 'end_date': pd.Timestamp(end_date).date()}
+
+
+async def source():
+    return 'views' if await views_current() else 'tables'
+
+
+async def reorder_alerts(start_date=None, end_date=None, safety_stock_days=14, limit=50):
+    params = {**window_params(start_date, end_date), 'safety_stock_days': safety_stock_days, 'limit': limit}
+    return await statements.execute(REORDER_ALERTS[await source()], params)
+
+
+async def inventory_optimization(start_date=None, end_date=None, setup_cost=45.0, holding_rate=0.20, safety_stock_days=14, limit=10):
+    params = {
+        **window_params(start_date, end_date),
+        'setup_cost': setup_cost,
+        'holding_rate': holding_rate,
+        'safety_stock_days': safety_stock_days,
+        'limit': limit,
+    }
+    return await statements.execute(INVENTORY_OPTIMIZATION[await source()], params)
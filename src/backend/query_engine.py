@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+from asyncpg.exceptions import InvalidCachedStatementError
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+import querylog
+from database import async_engine
+from settings import settings
+
+# Where the registered statements (statements.py) run, picked per deployment with
+# QUERY_ENGINE:
+#
+#   postgres  the async pool of database.py; every statement is PREPAREd once per
+#             pooled connection (the default).
+#   duckdb    an embedded, in-process DuckDB over Parquet exports of the tables
+#             (database/export_parquet.py), one view per <table>.parquet in
+#             PARQUET_DIR. No database server at all; the brand-level scans become
+#             columnar aggregations over the files.
+#
+# The route SQL is the same text on both. It sticks to what the two dialects share
+# (:: casts, FILTER, date - date, = ANY(list), $n binds), plus a to_regclass() macro
+# on the DuckDB side so the "does this optional table exist" checks keep working:
+# anything not exported (ingest log, materialized views, forecasts) reads as absent.
+#
+# Both return the same frames: NUMERIC / DECIMAL become float64 (whole-number sums
+# int64, like Postgres' bigint sums), dates stay datetime.date objects.
+
+DEFAULT_PARQUET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'parquet')
+
+
+class PostgresEngine:
+    name = 'postgres'
+
+    def __init__(self, bind=None):
+        # An AsyncEngine on asyncpg; the API's pool unless given another
+        self.bind = bind or async_engine
+
+    async def fetch(self, statement, args):
+        waited = time.perf_counter()
+        async with self.bind.connect() as conn:
+            raw = await conn.get_raw_connection()
+            metrics.record('pool', time.perf_counter() - waited)
+            driver = raw.driver_connection
+            # conn.info lives as long as the DBAPI connection, so a recycled/invalidated
+            # connection starts with an empty cache and simply re-prepares
+            prepared = conn.info.setdefault("prepared_statements", {})
+
+            start = time.perf_counter()
+            is_new = statement.name not in prepared
+            if is_new:
+                prepared[statement.name] = await driver.prepare(statement.pg_sql)
+            handle = prepared[statement.name]
+            try:
+                records = await handle.fetch(*args)
+            except InvalidCachedStatementError:
+                # Schema changed underneath the prepared plan (e.g. a migration); prepare again
+                is_new = True
+                handle = prepared[statement.name] = await driver.prepare(statement.pg_sql)
+                records = await handle.fetch(*args)
+            elapsed = time.perf_counter() - start
+            statement.record(elapsed, is_new)
+            metrics.record('db', elapsed, len(records))
+            querylog.observe(self, statement, args, elapsed)
+
+            columns = [attr.name for attr in handle.get_attributes()]
+
+        with metrics.phase('decode'):
+            # coerce_float turns NUMERIC's Decimals into floats, same as pd.read_sql does
+            return pd.DataFrame.from_records([tuple(r) for r in records], columns=columns, coerce_float=True)
+
+    async def fetch_chunks(self, statement, args, chunk_size):
+        waited = time.perf_counter()
+        async with self.bind.connect() as conn:
+            raw = await conn.get_raw_connection()
+            metrics.record('pool', time.perf_counter() - waited)
+            driver = raw.driver_connection
+            prepared = conn.info.setdefault("prepared_statements", {})
+
+            start = time.perf_counter()
+            is_new = statement.name not in prepared
+            if is_new:
+                prepared[statement.name] = await driver.prepare(statement.pg_sql)
+            handle = prepared[statement.name]
+            columns = [attr.name for attr in handle.get_attributes()]
+
+            # Cursors only live inside a transaction
+            transaction = driver.transaction()
+            await transaction.start()
+            try:
+                # Every row gets fetched: plan for the whole result, not the first 10% (cursor default)
+                await driver.execute("SET LOCAL cursor_tuple_fraction = 1.0")
+                try:
+                    cursor = await handle.cursor(*args)
+                except InvalidCachedStatementError:
+                    # Stale plan, as in fetch(). The failed call aborted the transaction: start over
+                    await transaction.rollback()
+                    transaction = driver.transaction()
+                    await transaction.start()
+                    await driver.execute("SET LOCAL cursor_tuple_fraction = 1.0")
+                    is_new = True
+                    handle = prepared[statement.name] = await driver.prepare(statement.pg_sql)
+                    cursor = await handle.cursor(*args)
+                # Time in the database only, not what the consumer does between chunks
+                elapsed = time.perf_counter() - start
+                metrics.record('db', elapsed)
+                while True:
+                    fetched = time.perf_counter()
+                    records = await cursor.fetch(chunk_size)
+                    seconds = time.perf_counter() - fetched
+                    elapsed += seconds
+                    metrics.record('db', seconds, len(records))
+                    if not records:
+                        break
+                    with metrics.phase('decode'):
+                        chunk = pd.DataFrame.from_records([tuple(r) for r in records], columns=columns, coerce_float=True)
+                    yield chunk
+            finally:
+                await transaction.rollback()
+            statement.record(elapsed, is_new)
+            querylog.observe(self, statement, args, elapsed)
+
+    async def explain(self, statement, args):
+        """Run `statement` again under EXPLAIN (ANALYZE, BUFFERS), the JSON plan back."""
+        async with self.bind.connect() as conn:
+            raw = await conn.get_raw_connection()
+            plan = await raw.driver_connection.fetchval(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement.pg_sql, *args
+            )
+        # SQLAlchemy's asyncpg dialect decodes json itself; a bare connection gives text
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def stats(self):
+        return {"engine": self.name}
+
+
+# Postgres' regclass lookup, for the existence checks: the name back if such a view is loaded
+_TO_REGCLASS_MACRO = """
+CREATE OR REPLACE MACRO to_regclass(name) AS (
+    SELECT any_value(view_name) FROM duckdb_views() WHERE view_name = lower(name)
+)
+"""
+
+
+def _to_frame(table):
+    """Arrow result -> the frame the Postgres engine would have returned."""
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_decimal(field.type):
+            column = column.cast(pa.int64() if field.type.scale == 0 else pa.float64())
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pandas()
+
+
+def _next_batch(reader):
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+
+class DuckDBEngine:
+    name = 'duckdb'
+
+    def __init__(self, parquet_dir=None, threads=None):
+        import duckdb
+
+        self.parquet_dir = os.path.abspath(parquet_dir or DEFAULT_PARQUET_DIR)
+        if not os.path.isdir(self.parquet_dir):
+            raise FileNotFoundError(f"No Parquet export at {self.parquet_dir}, run database/export_parquet.py first")
+        config = {'threads': threads} if threads else {}
+        self.conn = duckdb.connect(':memory:', config=config)
+        self.conn.execute(_TO_REGCLASS_MACRO)
+        self.tables = []
+        for file_name in sorted(os.listdir(self.parquet_dir)):
+            table, ext = os.path.splitext(file_name)
+            if ext != '.parquet':
+                continue
+            # A view, not a copy: every query reads the current file, so replacing an
+            # export and refreshing the rollups picks it up
+            path = os.path.join(self.parquet_dir, file_name).replace("'", "''")
+            self.conn.execute(f"CREATE VIEW {table.lower()} AS SELECT * FROM read_parquet('{path}')")
+            self.tables.append(table.lower())
+        self._local = threading.local()
+
+    def _cursor(self):
+        # One DuckDB connection must not be shared between threads; a cursor is a
+        # lightweight connection to the same in-memory database, one per pool thread
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self.conn.cursor()
+        return cursor
+
+    def _run(self, statement, args):
+        start = time.perf_counter()
+        table = self._cursor().execute(statement.pg_sql, args).to_arrow_table()
+        elapsed = time.perf_counter() - start
+        # DuckDB has no statement handles to keep, so every execution counts as a prepare
+        statement.record(elapsed, True)
+        metrics.record('db', elapsed, table.num_rows)
+        with metrics.phase('decode'):
+            return _to_frame(table), elapsed
+
+    async def fetch(self, statement, args):
+        # DuckDB drops the GIL while it runs, so a pool thread keeps the event loop free
+        frame, elapsed = await run_in_threadpool(self._run, statement, args)
+        querylog.observe(self, statement, args, elapsed)
+        return frame
+
+    async def fetch_chunks(self, statement, args, chunk_size):
+        start = time.perf_counter()
+        # A cursor of its own: the reader stays open across awaits and pool threads
+        cursor = self.conn.cursor()
+        try:
+            reader = await run_in_threadpool(
+                lambda: cursor.execute(statement.pg_sql, args).to_arrow_reader(chunk_size)
+            )
+            elapsed = time.perf_counter() - start
+            metrics.record('db', elapsed)
+            while True:
+                fetched = time.perf_counter()
+                batch = await run_in_threadpool(_next_batch, reader)
+                seconds = time.perf_counter() - fetched
+                elapsed += seconds
+                metrics.record('db', seconds, batch.num_rows if batch is not None else 0)
+                if batch is None:
+                    break
+                if batch.num_rows:
+                    with metrics.phase('decode'):
+                        chunk = _to_frame(pa.Table.from_batches([batch]))
+                    yield chunk
+        finally:
+            cursor.close()
+        statement.record(elapsed, True)
+        querylog.observe(self, statement, args, elapsed)
+
+    def _explain(self, statement, args):
+        cursor = self.conn.cursor()
+        try:
+            return json.loads(cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement.pg_sql, args).fetchall()[0][1])
+        finally:
+            cursor.close()
+
+    async def explain(self, statement, args):
+        """Run `statement` again under EXPLAIN ANALYZE (DuckDB has no BUFFERS), the JSON profile back."""
+        return await run_in_threadpool(self._explain, statement, args)
+
+    def stats(self):
+        return {"engine": self.name, "parquet_dir": self.parquet_dir, "tables": self.tables}
+
+
+ENGINES = {
+    'postgres': lambda: PostgresEngine(),
+    'duckdb': lambda: DuckDBEngine(settings.parquet_dir, settings.duckdb_threads),
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get():
+    """The deployment's engine (settings.query_engine), created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ENGINES[settings.query_engine]()
+    return _engine
@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import metrics
+from settings import settings
+
+# Statement log for the query engines (query_engine.py calls observe() after every
+# execution, with the time the engine spent on it).
+#
+#   recent  the last query_log_size executions: statement, params, time, endpoint
+#   slow    the last slow_query_log_size executions over slow_query_ms, browsable at
+#           /api/admin/slow-queries
+#
+# A slow execution may also get its plan captured: the same statement and params are
+# run again under EXPLAIN (ANALYZE, BUFFERS) in the background, off the request. That
+# is a second full execution, so it's sampled: a slow_query_explain_rate share of slow
+# executions, at most one per statement per slow_query_explain_interval seconds and
+# never two at once, so a statement that turns slow doesn't double the load it puts on
+# the database. The summary next to each plan points at the usual suspects: sequential
+# scans, the worst row estimate (bad join orders start there) and the buffer reads.
+
+logger = logging.getLogger(__name__)
+
+# Longer lists in params (the brand lists of a delta refresh) are cut to this in the log
+MAX_PARAM_ITEMS = 20
+
+_recent = deque(maxlen=settings.query_log_size)
+_slow = deque(maxlen=settings.slow_query_log_size)
+_ids = itertools.count(1)
+_last_capture = {}
+_capturing = set()
+_tasks = set()
+_lock = threading.Lock()
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        items = [_jsonable(v) for v in value[:MAX_PARAM_ITEMS]]
+        if len(value) > MAX_PARAM_ITEMS:
+            items.append(f'... {len(value) - MAX_PARAM_ITEMS} more')
+        return items
+    return value
+
+
+def _params(statement, args):
+    return {name: _jsonable(value) for name, value in zip(statement.param_names, args)}
+
+
+def observe(engine, statement, args, seconds):
+    """Log one execution of `statement`; slow ones may get their plan captured."""
+    timings = metrics.current()
+    endpoint = timings.path if timings is not None else None
+    at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds')
+    metrics.STATEMENT_SECONDS.observe((statement.name,), seconds)
+    # Params are made JSON friendly when the log is read, not on every execution
+    _recent.append((at, statement, args, seconds, endpoint))
+    if seconds * 1000 < settings.slow_query_ms:
+        return
+
+    entry = {
+        'id': next(_ids),
+        'at': at,
+        'statement': statement.name,
+        'endpoint': endpoint,
+        'engine': engine.name,
+        'duration_ms': round(seconds * 1000, 3),
+        'params': _params(statement, args),
+        'sql': statement.normalized,
+        'plan_status': 'not sampled',
+        'plan_summary': None,
+        'plan': None,
+    }
+    _slow.append(entry)
+    logger.warning("Slow statement %s: %.1f ms on %s", statement.name, seconds * 1000, endpoint)
+
+    now = time.monotonic()
+    with _lock:
+        if (
+            statement.name in _capturing
+            or now - _last_capture.get(statement.name, float('-inf')) < settings.slow_query_explain_interval
+            or random.random() >= settings.slow_query_explain_rate
+        ):
+            return
+        _capturing.add(statement.name)
+        _last_capture[statement.name] = now
+    entry['plan_status'] = 'pending'
+    task = asyncio.get_running_loop().create_task(_capture(engine, statement, args, entry))
+    # The loop only keeps weak references to tasks
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _capture(engine, statement, args, entry):
+    try:
+        plan = await engine.explain(statement, args)
+        entry['plan_summary'] = SUMMARIES[engine.name](plan)
+        entry['plan'] = plan
+        entry['plan_status'] = 'captured'
+    except Exception as e:
+        entry['plan_status'] = f'failed: {e}'
+    finally:
+        with _lock:
+            _capturing.discard(statement.name)
+
+
+def _walk(node, key):
+    yield node
+    for child in node.get(key) or []:
+        yield from _walk(child, key)
+
+
+def summarize_postgres(plan):
+    """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) -> what to look at first."""
+    top = plan[0]
+    nodes = list(_walk(top['Plan'], 'Plans'))
+    worst = None
+    for node in nodes:
+        if 'Actual Rows' not in node:
+            continue
+        # Actual rows are per loop, like the estimate
+        actual, estimate = max(node['Actual Rows'], 1), max(node['Plan Rows'], 1)
+        ratio = max(actual / estimate, estimate / actual)
+        if worst is None or ratio > worst['off_by']:
+            worst = {
+                'node': node['Node Type'],
+                'relation': node.get('Relation Name'),
+                'plan_rows': node['Plan Rows'],
+                'actual_rows': node['Actual Rows'],
+                'off_by': round(ratio, 1),
+            }
+    return {
+        'execution_ms': top.get('Execution Time'),
+        'planning_ms': top.get('Planning Time'),
+        'seq_scans': [
+            {'relation': n.get('Relation Name'), 'rows': n.get('Actual Rows', 0) * n.get('Actual Loops', 1)}
+            for n in nodes if n['Node Type'] == 'Seq Scan'
+        ],
+        'joins': [n['Node Type'] for n in nodes if n['Node Type'] in ('Nested Loop', 'Hash Join', 'Merge Join')],
+        'worst_estimate': worst,
+        'shared_hit_blocks': top['Plan'].get('Shared Hit Blocks'),
+        'shared_read_blocks': top['Plan'].get('Shared Read Blocks'),
+        'temp_written_blocks': top['Plan'].get('Temp Written Blocks'),
+    }
+
+
+def summarize_duckdb(plan):
+    """EXPLAIN (ANALYZE, FORMAT JSON) profile -> the same idea. Every Parquet read is a
+    full scan of its columns here, so the scans list is about how many rows they touch."""
+    nodes = list(_walk(plan, 'children'))
+    return {
+        'execution_ms': round(plan.get('latency', 0) * 1000, 3),
+        'seq_scans': [
+            {'operator': n.get('operator_name'), 'rows': n.get('operator_rows_scanned', 0)}
+            for n in nodes if n.get('operator_rows_scanned')
+        ],
+        'joins': [n.get('operator_name') for n in nodes if 'JOIN' in (n.get('operator_type') or '')],
+        'peak_buffer_memory': plan.get('system_peak_buffer_memory'),
+    }
+
+
+SUMMARIES = {'postgres': summarize_postgres, 'duckdb': summarize_duckdb}
+
+
+def recent(limit=100, statement=None, endpoint=None):
+    """Newest first."""
+    rows = []
+    for at, stmt, args, seconds, path in reversed(list(_recent)):
+        if (statement and stmt.name != statement) or (endpoint and path != endpoint):
+            continue
+        rows.append({
+            'at': at,
+            'statement': stmt.name,
+            'endpoint': path,
+            'duration_ms': round(seconds * 1000, 3),
+            'params': _params(stmt, args),
+        })
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def slow(limit=20, statement=None, endpoint=None, plans=True):
+    """Newest first; plans=False leaves out the (large) raw plans, summaries stay."""
+    rows = []
+    for entry in reversed(list(_slow)):
+        if (statement and entry['statement'] != statement) or (endpoint and entry['endpoint'] != endpoint):
+            continue
+        rows.append(entry if plans else {k: v for k, v in entry.items() if k != 'plan'})
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def clear():
+    _recent.clear()
+    _slow.clear()
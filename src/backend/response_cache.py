@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import numpy as np
+from starlette.responses import Response
+
+from settings import settings
+
+# In-process response cache for the analytics GETs.
+# The data only changes when the rollups are refreshed (seed_data.py / ingest.py),
+# yet every dashboard load recomputes the same few date presets. Responses are kept
+# in a size-bounded LRU keyed on path + normalized query params + response format +
+# the rollup data version, so a refresh makes every older entry unreachable. Each entry carries an
+# ETag of its body so the frontend can revalidate and get a 304.
+
+
+class CachedResponse:
+    __slots__ = ('body', 'media_type', 'etag')
+
+    def __init__(self, body, media_type):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    """LRU of CachedResponse bounded by entry count and total body bytes."""
+
+    def __init__(self, max_entries=512, max_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if len(entry.body) > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'not_modified': self.not_modified,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=int(settings.response_cache_max_mb * 2**20),
+)
+
+
+def cache_key(path, query_params, version, fmt='json'):
+    """Blank params dropped and the rest sorted, so ?a=1&b= and ?b=&a=1 share an entry."""
+    params = sorted((k, v) for k, v in query_params.multi_items() if v != '')
+    return (path, urlencode(params), fmt, version)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def respond(request, entry, status):
+    headers = {
+        'ETag': entry.etag,
+        'Cache-Control': settings.response_cache_control,
+        'X-Cache': status,
+        'Vary': 'Accept',
+    }
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
+async def read_body(response):
+    return b''.join([chunk async for chunk in response.body_iterator])
+
+
+def date_presets(days):
+    """The dashboard's standard ranges for the latest year with sales: all time,
+    the full year and each quarter. `days` is the rollup's sorted datetime64[D] axis."""
+    presets = [{}]
+    if len(days) == 0:
+        return presets
+    year = int(str(np.datetime64(days[-1], 'Y')))
+    presets.append({'start_date': f'{year}-01-01', 'end_date': f'{year}-12-31'})
+    for start, end in (('01-01', '03-31'), ('04-01', '06-30'), ('07-01', '09-30'), ('10-01', '12-31')):
+        presets.append({'start_date': f'{year}-{start}', 'end_date': f'{year}-{end}'})
+    return presets
+
+
+async def asgi_get(app, path, params):
+    """Run one GET through the full app (middleware included) without a socket."""
+    query = urlencode(params).encode()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query, 'headers': [(b'host', b'prewarm')],
+        'client': ('127.0.0.1', 0), 'server': ('prewarm', 80),
+    }
+    status = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+
+    await app(scope, receive, send)
+    return status.get('code')
+
+
+async def prewarm(app, paths, days):
+    """Fill the cache for `paths` x the standard date presets. Returns how many were cached."""
+    warmed = 0
+    for params in date_presets(days):
+        for path in paths:
+            if await asgi_get(app, path, params) == 200:
+                warmed += 1
+    return warmed
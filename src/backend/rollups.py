@@ -0,0 +1,745 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+import extract
+import snapshot
+import statements
+from settings import settings
+
+# Pre-aggregated brand x day rollups.
+# Every analytics route used to rescan the raw Sales/Purchases tables with its own
+# GROUP BY brand CTE. Instead we aggregate the fact tables down to one row per
+# brand per day once (at startup / after an ingest), keep the sums in memory as
+# per-brand prefix sums over days and answer date-filtered requests from those.
+# Request cost then scales with the number of brands instead of raw transactions.
+
+SALES_ROLLUP_TEMPLATE = """
+SELECT
+    brand,
+    salesdate::date AS day,
+    MAX(description) AS description,
+    SUM(salesquantity) AS sales_quantity,
+    SUM(salesdollars) AS sales_dollars,
+    SUM(excisetax) AS excise_tax,
+    COUNT(excisetax) AS excise_tax_count,
+    SUM(salesprice) AS sales_price_sum,
+    COUNT(salesprice) AS sales_price_count,
+    COUNT(*) AS row_count
+FROM sales
+WHERE salesdate IS NOT NULL{filter}
+GROUP BY brand, salesdate::date
+"""
+
+RECEIVED_ROLLUP_TEMPLATE = """
+SELECT
+    brand,
+    receivingdate AS day,
+    SUM(purchaseprice * quantity) AS capital_outlay,
+    COUNT(purchaseprice * quantity) AS capital_count,
+    COUNT(*) AS row_count
+FROM purchases
+WHERE receivingdate IS NOT NULL{filter}
+GROUP BY brand, receivingdate
+"""
+
+ORDERED_ROLLUP_TEMPLATE = """
+SELECT
+    brand,
+    podate AS day,
+    COUNT(*) AS lead_time_count,
+    SUM(receivingdate - podate) AS lead_time_sum,
+    SUM((receivingdate - podate) * (receivingdate - podate)) AS lead_time_sq
+FROM purchases
+WHERE podate IS NOT NULL
+  AND receivingdate IS NOT NULL
+  AND receivingdate >= podate{filter}
+GROUP BY brand, podate
+"""
+
+# Brand level attributes that are never date filtered by the routes
+BRAND_PURCHASES_TEMPLATE = """
+WITH po_freight AS (
+    SELECT
+        PONumber,
+        SUM(Freight) / NULLIF(SUM(Quantity), 0) as freight_per_unit_po
+    FROM InvoicePurchases{po_filter}
+    GROUP BY PONumber
+)
+SELECT
+    p.brand,
+    COUNT(*) AS purchase_count,
+    MAX(p.description) AS purchase_description,
+    AVG(p.purchaseprice) AS avg_purchase_price,
+    AVG(pf.freight_per_unit_po) AS avg_freight_per_unit
+FROM purchases p
+LEFT JOIN po_freight pf ON p.PONumber = pf.PONumber{filter}
+GROUP BY p.brand
+"""
+
+SALES_ROLLUP_QUERY = SALES_ROLLUP_TEMPLATE.format(filter="")
+RECEIVED_ROLLUP_QUERY = RECEIVED_ROLLUP_TEMPLATE.format(filter="")
+ORDERED_ROLLUP_QUERY = ORDERED_ROLLUP_TEMPLATE.format(filter="")
+BRAND_PURCHASES_QUERY = BRAND_PURCHASES_TEMPLATE.format(filter="", po_filter="")
+
+PRICES_QUERY = """
+SELECT brand, MAX(purchaseprice) AS purchase_price
+FROM purchaseprices
+GROUP BY brand
+"""
+
+INVENTORY_QUERY = """
+SELECT brand, SUM(onhand) AS current_on_hand
+FROM endinginventory
+GROUP BY brand
+"""
+
+# Order matches the RollupStore constructor
+ROLLUP_QUERIES = [
+    SALES_ROLLUP_QUERY, RECEIVED_ROLLUP_QUERY, ORDERED_ROLLUP_QUERY,
+    BRAND_PURCHASES_QUERY, PRICES_QUERY, INVENTORY_QUERY,
+]
+
+# Same queries as named prepared statements for the async refresh path
+ROLLUP_STATEMENTS = [
+    statements.register(name, query) for name, query in zip(
+        ['rollup_sales', 'rollup_received', 'rollup_ordered', 'rollup_brand_purchases', 'rollup_prices', 'rollup_inventory'],
+        ROLLUP_QUERIES,
+    )
+]
+
+# Compact reads of the three brand x day pulls (see extract.py), by ROLLUP_QUERIES
+# position: (dtypes, reduce) or None for a plain read. Every measure ends up in float64
+# prefix sums, so sums stay float64; keys and counts shrink to int32 and the per-row
+# sales description is folded into the per-brand MAX the dims need while reading.
+_KEYS = {'brand': 'int32', 'day': 'date'}
+ROLLUP_EXTRACTS = [
+    (
+        {**_KEYS, 'sales_quantity': 'float64', 'sales_dollars': 'float64', 'excise_tax': 'float64',
+         'excise_tax_count': 'int32', 'sales_price_sum': 'float64', 'sales_price_count': 'int32', 'row_count': 'int32'},
+        {'sales_descriptions': ('brand', 'description', 'max')},
+    ),
+    ({**_KEYS, 'capital_outlay': 'float64', 'capital_count': 'int32', 'row_count': 'int32'}, None),
+    ({**_KEYS, 'lead_time_count': 'int32', 'lead_time_sum': 'float64', 'lead_time_sq': 'float64'}, None),
+    None,
+    None,
+    None,
+]
+
+# Same rollups read back from the materialized views of
+# database/migrations/001_indexes_partitions_matviews.sql, when that has been applied
+ROLLUP_VIEW_STATEMENTS = [
+    statements.register('rollup_sales_view', "SELECT * FROM mv_sales_brand_day"),
+    statements.register('rollup_received_view', "SELECT * FROM mv_received_brand_day"),
+    statements.register('rollup_ordered_view', "SELECT * FROM mv_ordered_brand_day"),
+    statements.register('rollup_brand_purchases_view', "SELECT * FROM mv_brand_purchases"),
+    ROLLUP_STATEMENTS[4],
+    ROLLUP_STATEMENTS[5],
+]
+VIEWS_STATE_EXISTS = statements.register(
+    'analytics_views_exist', "SELECT to_regclass('analyticsviewsstate') IS NOT NULL AS present"
+)
+VIEWS_STATE = statements.register('analytics_views_state', "SELECT batchid AS batch_id FROM analyticsviewsstate")
+
+# Delta refresh: the same aggregates, only for the brand x day cells an ingest touched
+_DELTA_FILTER = "\n  AND brand = ANY(:brands) AND {day} BETWEEN :start_date AND :end_date"
+SALES_DELTA_QUERY = SALES_ROLLUP_TEMPLATE.format(filter=_DELTA_FILTER.format(day='salesdate::date'))
+RECEIVED_DELTA_QUERY = RECEIVED_ROLLUP_TEMPLATE.format(filter=_DELTA_FILTER.format(day='receivingdate'))
+ORDERED_DELTA_QUERY = ORDERED_ROLLUP_TEMPLATE.format(filter=_DELTA_FILTER.format(day='podate'))
+BRAND_PURCHASES_DELTA_QUERY = BRAND_PURCHASES_TEMPLATE.format(
+    filter="\nWHERE p.brand = ANY(:brands)",
+    po_filter="\n    WHERE PONumber IN (SELECT PONumber FROM purchases WHERE brand = ANY(:brands))",
+)
+
+INGEST_LOG_EXISTS = statements.register(
+    'ingest_log_exists', "SELECT to_regclass('ingestlog') IS NOT NULL AS present"
+)
+INGEST_LOG_HEAD = statements.register(
+    'ingest_log_head', "SELECT COALESCE(MAX(batchid), 0) AS batch_id FROM ingestlog"
+)
+INGEST_LOG = statements.register('ingest_log', """
+SELECT batchid, tablename, brands, mindate, maxdate
+FROM ingestlog
+WHERE batchid > :after_batch
+ORDER BY batchid
+""")
+SALES_DELTA = statements.register('rollup_sales_delta', SALES_DELTA_QUERY)
+RECEIVED_DELTA = statements.register('rollup_received_delta', RECEIVED_DELTA_QUERY)
+ORDERED_DELTA = statements.register('rollup_ordered_delta', ORDERED_DELTA_QUERY)
+BRAND_PURCHASES_DELTA = statements.register('rollup_brand_purchases_delta', BRAND_PURCHASES_DELTA_QUERY)
+
+SALES_MEASURES = [
+    'sales_quantity', 'sales_dollars', 'excise_tax', 'excise_tax_count',
+    'sales_price_sum', 'sales_price_count', 'row_count',
+]
+RECEIVED_MEASURES = ['capital_outlay', 'capital_count', 'row_count']
+ORDERED_MEASURES = ['lead_time_count', 'lead_time_sum', 'lead_time_sq']
+
+EPOCH_DAY = np.datetime64('1970-01-01', 'D')
+
+
+class BrandDayRollup:
+    """Prefix-sum index over brand x day measures for one fact table.
+
+    For each measure we keep a (days + 1) x brands cumulative sum, day-major so every
+    row is one contiguous vector across all brands. A SUM/COUNT over any inclusive
+    date range is then prefix[hi] - prefix[lo]: two row lookups and one vectorized
+    subtraction, regardless of how wide the range is.
+    """
+
+    def __init__(self, brands, frame, measures, count_measure='row_count', squared=()):
+        self.brands = brands
+        self.measures = list(measures)
+        self.count_measure = count_measure
+        self.squared = list(squared)
+
+        frame = frame.dropna(subset=['brand', 'day'])
+        days = pd.to_datetime(frame['day']).values.astype('datetime64[D]')
+        self.days = np.unique(days)
+
+        rows = np.searchsorted(self.days, days)
+        cols = np.searchsorted(brands, frame['brand'].to_numpy(dtype=np.int64))
+
+        daily = {}
+        for measure in self.measures:
+            matrix = np.zeros((len(self.days), len(brands)), dtype=np.float64)
+            matrix[rows, cols] = frame[measure].fillna(0).to_numpy(dtype=np.float64)
+            daily[measure] = matrix
+        self._derive(daily, self.days)
+
+        self.prefix = {}
+        for measure, matrix in daily.items():
+            prefix = np.zeros((len(self.days) + 1, len(brands)), dtype=np.float64)
+            np.cumsum(matrix, axis=0, out=prefix[1:])
+            self.prefix[measure] = prefix
+
+    @classmethod
+    def from_arrays(cls, brands, days, prefix, measures, count_measure='row_count', squared=()):
+        """Wrap already built prefix arrays (a patched copy, or a mapped snapshot) without copying."""
+        rollup = object.__new__(cls)
+        rollup.brands = brands
+        rollup.measures = list(measures)
+        rollup.count_measure = count_measure
+        rollup.squared = list(squared)
+        rollup.days = days
+        rollup.prefix = prefix
+        return rollup
+
+    def _derive(self, daily, days):
+        # Derived per-cell measures so averages over dates stay additive
+        counts = daily[self.count_measure]
+        daily['active_days'] = (counts > 0).astype(np.float64)
+        daily['epoch_day_weight'] = counts * (days - EPOCH_DAY).astype(np.float64)[:, None]
+        for measure in self.squared:
+            # Daily totals squared, for STDDEV of the daily series
+            daily[f'{measure}_sq'] = daily[measure] ** 2
+
+    def patched(self, brands, frame, changed_brands, start_date=None, end_date=None):
+        """Copy of this rollup on the (possibly wider) `brands` axis, with every
+        `changed_brands` x [start_date, end_date] cell replaced by `frame`.
+
+        `frame` holds the re-aggregated values of those cells (missing cells are zero).
+        The other columns are copied as-is; only the changed brands are re-accumulated,
+        and only from the first changed day onward.
+        """
+        frame = frame.dropna(subset=['brand', 'day'])
+        frame_days = pd.to_datetime(frame['day']).values.astype('datetime64[D]')
+        days = np.union1d(self.days, frame_days)
+
+        # Old prefix row k covers the first k old days; map each new row to the old
+        # row covering the same days (an inserted day just repeats its predecessor).
+        old_rows = np.r_[0, np.searchsorted(self.days, days, side='right')]
+        old_cols = np.searchsorted(brands, self.brands)
+        prefixes = {}
+        for measure, old in self.prefix.items():
+            prefix = np.zeros((len(days) + 1, len(brands)), dtype=np.float64)
+            prefix[:, old_cols] = old[old_rows]
+            prefixes[measure] = prefix
+        new = BrandDayRollup.from_arrays(brands, days, prefixes, self.measures, self.count_measure, self.squared)
+
+        changed = np.unique(np.asarray(changed_brands, dtype=np.int64))
+        if start_date is None or len(changed) == 0:
+            return new
+
+        cols = np.searchsorted(brands, changed)
+        lo = np.searchsorted(days, np.datetime64(start_date, 'D'), side='left')
+        hi = np.searchsorted(days, np.datetime64(end_date, 'D'), side='right')
+
+        # Daily values of the changed brands from `lo` on, window cleared and refilled
+        daily = {m: np.diff(new.prefix[m][lo:, cols], axis=0) for m in self.measures}
+        rows = np.searchsorted(days, frame_days) - lo
+        frame_cols = np.searchsorted(changed, frame['brand'].to_numpy(dtype=np.int64))
+        for measure in self.measures:
+            daily[measure][:hi - lo] = 0
+            daily[measure][rows, frame_cols] = frame[measure].fillna(0).to_numpy(dtype=np.float64)
+        self._derive(daily, days[lo:])
+
+        for measure, matrix in daily.items():
+            prefix = new.prefix[measure]
+            prefix[lo + 1:, cols] = prefix[lo, cols] + np.cumsum(matrix, axis=0)
+        return new
+
+    def _day_slice(self, start_date=None, end_date=None):
+        lo, hi = 0, len(self.days)
+        if start_date and end_date:
+            lo = np.searchsorted(self.days, np.datetime64(start_date, 'D'), side='left')
+            hi = np.searchsorted(self.days, np.datetime64(end_date, 'D'), side='right')
+        return lo, max(lo, hi)
+
+    def totals(self, measures, start_date=None, end_date=None):
+        """Per-brand sums of `measures` over the inclusive date range, aligned to `brands`."""
+        lo, hi = self._day_slice(start_date, end_date)
+        return {m: self.prefix[m][hi] - self.prefix[m][lo] for m in measures}
+
+    def series(self, brand, measure):
+        """Daily values of one measure for a single brand, only days with activity."""
+        idx = np.searchsorted(self.brands, brand)
+        if idx >= len(self.brands) or self.brands[idx] != brand:
+            return pd.DataFrame({'ds': pd.to_datetime([]), 'y': []})
+        values = np.diff(self.prefix[measure][:, idx])
+        active = np.diff(self.prefix['active_days'][:, idx]) > 0
+        return pd.DataFrame({'ds': pd.to_datetime(self.days[active]), 'y': values[active]})
+
+    def daily_matrix(self, measure):
+        """(brands, first day, brands x days) of one measure over a gap-free daily calendar."""
+        if len(self.days) == 0:
+            return self.brands, None, np.zeros((len(self.brands), 0))
+        full_days = np.arange(self.days[0], self.days[-1] + 1, dtype='datetime64[D]')
+        matrix = np.zeros((len(self.brands), len(full_days)), dtype=np.float64)
+        matrix[:, (self.days - self.days[0]).astype(np.int64)] = np.diff(self.prefix[measure], axis=0).T
+        return self.brands, self.days[0], matrix
+
+
+class RollupStore:
+    """All brand x day rollups plus the small brand dimension table, sharing one brand axis."""
+
+    def __init__(self, sales_df, received_df, ordered_df, brand_purchases_df, prices_df, inventory_df, sales_descriptions=None):
+        # sales_descriptions: MAX(description) per brand, when the extraction already
+        # reduced it (then sales_df needs no description column)
+        brands = pd.concat([
+            sales_df['brand'], received_df['brand'], ordered_df['brand'],
+            brand_purchases_df['brand'], prices_df['brand'], inventory_df['brand'],
+        ]).dropna().astype(np.int64).unique()
+        self.brands = np.sort(brands)
+
+        self.sales = BrandDayRollup(self.brands, sales_df, SALES_MEASURES, squared=['sales_quantity'])
+        self.received = BrandDayRollup(self.brands, received_df, RECEIVED_MEASURES)
+        self.ordered = BrandDayRollup(self.brands, ordered_df, ORDERED_MEASURES, count_measure='lead_time_count')
+
+        if sales_descriptions is None:
+            sales_descriptions = sales_df.groupby('brand')['description'].max()
+        sales_desc = sales_descriptions.rename('sales_description')
+        dims = pd.DataFrame(index=pd.Index(self.brands, name='brand'))
+        dims = dims.join(sales_desc)
+        dims = dims.join(brand_purchases_df.set_index('brand'))
+        dims = dims.join(prices_df.set_index('brand'))
+        dims = dims.join(inventory_df.set_index('brand'))
+        # float64 whether or not every brand has an inventory row (the join's NaN would
+        # widen it anyway), like pushdown.py's SQL returns it
+        dims['current_on_hand'] = dims['current_on_hand'].fillna(0).astype(np.float64)
+        dims['purchase_count'] = dims['purchase_count'].fillna(0)
+        dims['description'] = dims['sales_description'].fillna(dims['purchase_description'])
+        self.dims = dims
+
+        # Last IngestLog batch folded in, so a delta refresh knows where to pick up
+        self.last_batch_id = 0
+
+    def apply_delta(self, sales_df, received_df, ordered_df, brand_purchases_df, windows, batch_id):
+        """New store with the re-aggregated cells from an ingest swapped in.
+
+        `windows` maps 'sales' / 'purchases' to (brands, start_date, end_date) of the cells
+        the delta frames cover. Brand level purchase attributes are replaced for the
+        brands in `brand_purchases_df`. This store is left untouched for in-flight requests.
+        """
+        brands = np.union1d(self.brands, pd.concat([
+            sales_df['brand'], received_df['brand'], ordered_df['brand'], brand_purchases_df['brand'],
+        ]).dropna().astype(np.int64).unique())
+
+        sales_window = windows.get('sales', ((), None, None))
+        purchases_window = windows.get('purchases', ((), None, None))
+        sales = self.sales.patched(brands, sales_df, *sales_window)
+        received = self.received.patched(brands, received_df, *purchases_window)
+        ordered = self.ordered.patched(brands, ordered_df, *purchases_window)
+
+        dims = self.dims.reindex(pd.Index(brands, name='brand'))
+        # Ingest only ever adds rows, so MAX(description) can only move up
+        sales_desc = sales_df.groupby('brand')['description'].max()
+        current = dims.loc[sales_desc.index, 'sales_description'].dropna()
+        dims.loc[sales_desc.index, 'sales_description'] = pd.concat([current, sales_desc]).groupby(level=0).max()
+        purchases = brand_purchases_df.set_index('brand')
+        dims.loc[purchases.index, purchases.columns] = purchases
+        dims['current_on_hand'] = dims['current_on_hand'].fillna(0).astype(np.float64)
+        dims['purchase_count'] = dims['purchase_count'].fillna(0)
+        dims['description'] = dims['sales_description'].fillna(dims['purchase_description'])
+
+        return RollupStore.from_parts(brands, sales, received, ordered, dims, batch_id)
+
+    @classmethod
+    def from_parts(cls, brands, sales, received, ordered, dims, last_batch_id=0):
+        store = object.__new__(cls)
+        store.brands = brands
+        store.sales = sales
+        store.received = received
+        store.ordered = ordered
+        store.dims = dims
+        store.last_batch_id = last_batch_id
+        return store
+
+    def to_arrays(self):
+        """Flatten into named plain arrays + JSON meta, the layout snapshot.publish writes."""
+        arrays = {'brands': self.brands}
+        meta = {'last_batch_id': int(self.last_batch_id), 'rollups': {}, 'dims': {}}
+        for name in ('sales', 'received', 'ordered'):
+            rollup = getattr(self, name)
+            arrays[f'{name}.days'] = rollup.days
+            for measure, prefix in rollup.prefix.items():
+                arrays[f'{name}.{measure}'] = prefix
+            meta['rollups'][name] = {
+                'measures': rollup.measures,
+                'count_measure': rollup.count_measure,
+                'squared': rollup.squared,
+                'prefix': list(rollup.prefix),
+            }
+        for col in self.dims.columns:
+            values = self.dims[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                # Fixed-width unicode + a null mask: mappable without pickle
+                arrays[f'dims.{col}'] = values.fillna('').astype(str).to_numpy(dtype=str)
+                arrays[f'dims.{col}.isna'] = values.isna().to_numpy()
+                meta['dims'][col] = 'str'
+            else:
+                arrays[f'dims.{col}'] = values.to_numpy()
+                meta['dims'][col] = 'numeric'
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """Rebuild a store around (typically memory-mapped) arrays. The prefix sums are not copied."""
+        brands = arrays['brands']
+        rollups = {}
+        for name, spec in meta['rollups'].items():
+            prefix = {measure: arrays[f'{name}.{measure}'] for measure in spec['prefix']}
+            rollups[name] = BrandDayRollup.from_arrays(
+                brands, arrays[f'{name}.days'], prefix,
+                spec['measures'], spec['count_measure'], spec['squared'],
+            )
+        dims = pd.DataFrame(index=pd.Index(brands, name='brand'))
+        for col, kind in meta['dims'].items():
+            if kind == 'str':
+                values = pd.Series(arrays[f'dims.{col}'].astype(object), index=dims.index)
+                dims[col] = values.mask(arrays[f'dims.{col}.isna'])
+            else:
+                dims[col] = arrays[f'dims.{col}']
+        return cls.from_parts(
+            brands, rollups['sales'], rollups['received'], rollups['ordered'], dims, meta['last_batch_id'],
+        )
+
+    @classmethod
+    def from_engine(cls, bind):
+        frames, reduced = [], {}
+        for query, spec in zip(ROLLUP_QUERIES, ROLLUP_EXTRACTS):
+            if spec is None:
+                frames.append(pd.read_sql(query, bind))
+                continue
+            frame, parts = extract.read_frame_sync(bind, query, dtypes=spec[0], reduce=spec[1])
+            frames.append(frame)
+            reduced.update(parts)
+        return cls(*frames, **reduced)
+
+    @classmethod
+    async def from_async_engine(cls):
+        views = await _views_batch()
+        if views is None:
+            # Read the log head first: a batch landing mid-build just gets re-applied by the
+            # delta pass below, which is harmless since cells are replaced, not added to
+            batch_id = await _ingest_log_head()
+            names = ROLLUP_STATEMENTS
+        else:
+            # Pre-aggregated views: a few rows per brand per day instead of the fact tables.
+            # They're current up to `views`, later batches come from the delta pass.
+            batch_id = views
+            names = ROLLUP_VIEW_STATEMENTS
+        # The six source queries are independent, so run them concurrently on the async engine
+        results = await asyncio.gather(*[_read(name, spec) for name, spec in zip(names, ROLLUP_EXTRACTS)])
+        reduced = {k: v for _, parts in results for k, v in parts.items()}
+        # Building the prefix arrays is pure CPU, keep it off the event loop
+        store = await run_in_threadpool(lambda: cls(*[frame for frame, _ in results], **reduced))
+        store.last_batch_id = batch_id
+        return await store.with_new_batches()
+
+    async def with_new_batches(self):
+        """Fold in every IngestLog batch since this store was built. Returns self if there are none."""
+        if not (await statements.execute(INGEST_LOG_EXISTS))['present'].iloc[0]:
+            return self
+        log = await statements.execute(INGEST_LOG, {'after_batch': int(self.last_batch_id)})
+        if log.empty:
+            return self
+
+        windows, purchase_brands = delta_windows(log)
+        sales_df, received_df, ordered_df, brand_purchases_df = await asyncio.gather(
+            statements.execute(SALES_DELTA, window_params(windows, 'sales')),
+            statements.execute(RECEIVED_DELTA, window_params(windows, 'purchases')),
+            statements.execute(ORDERED_DELTA, window_params(windows, 'purchases')),
+            statements.execute(BRAND_PURCHASES_DELTA, {'brands': purchase_brands}),
+        )
+        return await run_in_threadpool(
+            self.apply_delta, sales_df, received_df, ordered_df, brand_purchases_df,
+            windows,
+            int(log['batchid'].max()),
+        )
+
+    def sales_totals(self, start_date=None, end_date=None):
+        """Brand-level sales aggregates for the date range (one row per brand with sales)."""
+        t = self.sales.totals(
+            SALES_MEASURES + ['active_days', 'epoch_day_weight', 'sales_quantity_sq'],
+            start_date, end_date,
+        )
+        df = pd.DataFrame(t, index=self.dims.index)
+        df = df[df['row_count'] > 0]
+        return df.join(self.dims)
+
+    def daily_demand_stats(self, start_date=None, end_date=None):
+        """AVG/STDDEV of the daily sales quantity per brand, over days that had sales."""
+        sales = self.sales_totals(start_date, end_date)
+        n = sales['active_days']
+        mean = sales['sales_quantity'] / n
+        var = (sales['sales_quantity_sq'] - n * mean ** 2) / (n - 1).where(n > 1)
+        return pd.DataFrame({
+            'description': sales['sales_description'],
+            'avg_daily_demand': mean,
+            'std_dev_demand': np.sqrt(var.clip(lower=0)),
+            'total_volume': sales['sales_quantity'],
+        })
+
+    def received_totals(self, start_date=None, end_date=None):
+        """Brand-level purchase receipts for the ReceivingDate range."""
+        t = self.received.totals(RECEIVED_MEASURES + ['epoch_day_weight'], start_date, end_date)
+        df = pd.DataFrame(t, index=self.dims.index)
+        df = df[df['row_count'] > 0]
+        return df.join(self.dims)
+
+    def lead_time_stats(self, start_date=None, end_date=None):
+        """AVG/STDDEV of lead time per brand for POs dated in the range."""
+        t = self.ordered.totals(ORDERED_MEASURES, start_date, end_date)
+        n = t['lead_time_count']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, t['lead_time_sum'] / n, np.nan)
+            var = np.where(n > 1, (t['lead_time_sq'] - n * mean ** 2) / (n - 1), np.nan)
+        df = pd.DataFrame({
+            'avg_lead_time': mean,
+            'std_dev_lead_time': np.sqrt(np.clip(var, 0, None)),
+        }, index=self.dims.index)
+        return df[n > 0]
+
+
+def delta_windows(log):
+    """IngestLog rows -> ({'sales' / 'purchases': (brands, start_date, end_date)}, brands
+    whose purchase attributes changed). All pending batches of a fact table merge into
+    one window: re-aggregating a few extra cells is cheaper than a round trip per batch."""
+    windows = {}
+    purchase_brands = set()
+    for table_name, entries in log.groupby('tablename'):
+        brands = sorted({int(b) for brands in entries['brands'] for b in brands})
+        if table_name in ('purchases', 'invoicepurchases'):
+            purchase_brands.update(brands)
+        if table_name in ('sales', 'purchases') and entries['mindate'].notna().any():
+            windows[table_name] = (brands, entries['mindate'].min(), entries['maxdate'].max())
+    return windows, sorted(purchase_brands)
+
+
+def window_params(windows, name):
+    """Binds of the *_DELTA statements for one window (no window: no cells)."""
+    if name not in windows:
+        return {'brands': [], 'start_date': None, 'end_date': None}
+    brands, start, end = windows[name]
+    return {'brands': brands, 'start_date': start, 'end_date': end}
+
+
+async def _read(name, spec):
+    if spec is None:
+        return await statements.execute(name), {}
+    dtypes, reduce = spec
+    return await extract.read_frame(name, dtypes=dtypes, reduce=reduce)
+
+
+class AnalyticsContext:
+    """One request's view of the rollups for a single date range.
+
+    Several panels read the same brand-level aggregates (sales in the window,
+    receipts, lead times...). Each one is computed at most once per context and
+    shared, so the /api/dashboard bundle doesn't redo work per panel.
+    """
+
+    def __init__(self, store, start_date=None, end_date=None):
+        self.store = store
+        self.start_date = start_date
+        self.end_date = end_date
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _memo(self, key, compute):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    @property
+    def sales(self):
+        return self._memo('sales', lambda: self.store.sales_totals(self.start_date, self.end_date))
+
+    @property
+    def all_sales(self):
+        if not (self.start_date and self.end_date):
+            return self.sales
+        return self._memo('all_sales', self.store.sales_totals)
+
+    @property
+    def received(self):
+        return self._memo('received', lambda: self.store.received_totals(self.start_date, self.end_date))
+
+    @property
+    def lead_times(self):
+        return self._memo('lead_times', lambda: self.store.lead_time_stats(self.start_date, self.end_date))
+
+    @property
+    def all_lead_times(self):
+        if not (self.start_date and self.end_date):
+            return self.lead_times
+        return self._memo('all_lead_times', self.store.lead_time_stats)
+
+    @property
+    def demand_stats(self):
+        return self._memo('demand_stats', self.store.daily_demand_stats)
+
+
+async def _views_batch():
+    """IngestLog batch the materialized views are current up to, None without the views."""
+    if not (await statements.execute(VIEWS_STATE_EXISTS))['present'].iloc[0]:
+        return None
+    state = await statements.execute(VIEWS_STATE)
+    return int(state['batch_id'].iloc[0]) if not state.empty else None
+
+
+async def _ingest_log_head():
+    if not (await statements.execute(INGEST_LOG_EXISTS))['present'].iloc[0]:
+        return 0
+    return int((await statements.execute(INGEST_LOG_HEAD))['batch_id'].iloc[0])
+
+
+async def views_current():
+    """True when the materialized views exist and include every ingested batch."""
+    views = await _views_batch()
+    return views is not None and views == await _ingest_log_head()
+
+
+_store = None
+_store_lock = asyncio.Lock()
+# Snapshot directory the current store is mapped from (only with rollup_snapshot_dir)
+_store_path = None
+# Bumped every time the served rollups change, so anything derived from them
+# (the response cache) can tell a stale result from a current one
+_data_version = 0
+
+
+def _swap(store):
+    global _store, _data_version
+    if store is not _store:
+        _store = store
+        _data_version += 1
+    return _store
+
+
+def data_version():
+    return _data_version
+
+
+def _map_snapshot(path):
+    return RollupStore.from_arrays(*snapshot.load(path))
+
+
+async def _share(store):
+    """With a snapshot dir configured: publish `store` for the other workers and
+    return the memory-mapped copy, so this worker shares the same pages too."""
+    global _store_path
+    if not settings.rollup_snapshot_dir:
+        return store
+    path = await run_in_threadpool(snapshot.publish, settings.rollup_snapshot_dir, *store.to_arrays())
+    mapped = await run_in_threadpool(_map_snapshot, path)
+    _store_path = path
+    return mapped
+
+
+async def _adopt_snapshot():
+    """Serve the latest published snapshot if it isn't the one we have. Needs _store_lock."""
+    global _store_path
+    path = snapshot.current(settings.rollup_snapshot_dir)
+    if path is None or path == _store_path:
+        return
+    try:
+        store = await run_in_threadpool(_map_snapshot, path)
+    except FileNotFoundError:
+        # Pruned under us by an even newer publish, pick that one up next time
+        return
+    _store_path = path
+    _swap(store)
+
+
+async def _follow_snapshot():
+    """Switch to the latest snapshot if another worker published one since we last looked."""
+    path = snapshot.current(settings.rollup_snapshot_dir)
+    if path is None or path == _store_path:
+        return
+    async with _store_lock:
+        await _adopt_snapshot()
+
+
+@asynccontextmanager
+async def _building():
+    """Hold _store_lock, and with a snapshot dir the build lock every worker shares,
+    having picked up whatever another worker published while we waited for it."""
+    async with _store_lock:
+        if not settings.rollup_snapshot_dir:
+            yield
+            return
+        fd = await run_in_threadpool(snapshot.lock, settings.rollup_snapshot_dir)
+        try:
+            await _adopt_snapshot()
+            yield
+        finally:
+            snapshot.unlock(fd)
+
+
+async def refresh_rollups(mode='full'):
+    """(Re)build the rollups from the database.
+
+    'full' rescans everything (after seed_data.py). 'delta' only re-aggregates the
+    brands/days logged by ingest.py since the last refresh. One refresh at a time: a
+    second one waits and then starts from what the first one served (for a delta,
+    usually nothing left to do). Without a snapshot dir this only refreshes the
+    calling worker's copy; with one, the others map the new snapshot on their next request.
+    """
+    async with _building():
+        if mode == 'delta' and _store is not None:
+            store = await _store.with_new_batches()
+            if store is _store:
+                return _store
+        else:
+            store = await RollupStore.from_async_engine()
+        return _swap(await _share(store))
+
+
+async def get_rollups():
+    # FastAPI dependency. The first request pays for the build, everyone after shares it.
+    # With snapshots on, a worker starting next to a warm one just maps its files, and
+    # workers starting together build once: the rest wait on the build lock and map it.
+    if settings.rollup_snapshot_dir:
+        await _follow_snapshot()
+    if _store is None:
+        async with _building():
+            if _store is None:
+                _swap(await _share(await RollupStore.from_async_engine()))
+    return _store
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Query
+from database import async_engine, engine
+from settings import settings
+import query_engine
+import querylog
+import statements
+from response_cache import response_cache
+from rollups import data_version
+
+router = APIRouter()
+
+@router.get("/admin/db-stats")
+async def get_db_stats():
+    # Pool occupancy for both engines + how often each named statement got to reuse its plan
+    return {
+        "pool_settings": {
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "statement_cache_size": settings.db_statement_cache_size,
+        },
+        "sync_pool": statements.pool_stats(engine),
+        "async_pool": statements.pool_stats(async_engine.sync_engine),
+        "query_engine": query_engine.get().stats(),
+        "statements": statements.statement_stats(),
+    }
+
+@router.get("/admin/cache-stats")
+async def get_cache_stats():
+    return {"data_version": data_version(), **response_cache.stats()}
+
+@router.get("/admin/slow-queries")
+async def get_slow_queries(statement: str = Query(None), endpoint: str = Query(None), plans: bool = Query(True), limit: int = Query(20, ge=1, le=1000)):
+    # Newest first. Each entry has the statement's SQL and params, and a plan when it was sampled
+    return {
+        "threshold_ms": settings.slow_query_ms,
+        "explain_rate": settings.slow_query_explain_rate,
+        "explain_interval_s": settings.slow_query_explain_interval,
+        "entries": querylog.slow(limit, statement, endpoint, plans),
+    }
+
+@router.get("/admin/query-log")
+async def get_query_log(statement: str = Query(None), endpoint: str = Query(None), limit: int = Query(100, ge=1, le=10000)):
+    # Every recent execution, newest first: statement, params, engine time, endpoint
+    return querylog.recent(limit, statement, endpoint)
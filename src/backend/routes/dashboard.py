@@ -0,0 +1,44 @@
+import asyncio
+import inspect
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from rollups import AnalyticsContext, RollupStore, get_rollups
+from routes import credit, financials, forecasting, inventory, sales
+from serialization import frame_response
+
+router = APIRouter()
+
+# Panel name -> calculation. Names match the standalone endpoints so the
+# frontend can map them 1:1.
+PANELS = {
+    "abc-summary": sales.abc_summary,
+    "reorder-alerts": inventory.reorder_alerts,
+    "margin-bleeders": financials.margin_bleeders,
+    "capital-traps": financials.capital_traps,
+    "inventory-optimization": inventory.inventory_optimization,
+    "demand-forecast": forecasting.demand_forecast,
+    "safety-stock-simulation": inventory.safety_stock_simulation,
+    "credit-risk": credit.credit_risk,
+}
+
+@router.get("/dashboard")
+async def get_dashboard(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), panels: str = Query(None)):
+    # One request and one pass over the shared aggregates for the whole page
+    # instead of eight fetches that each re-derive the same brand level numbers.
+    requested = list(PANELS) if not panels else [p.strip() for p in panels.split(",") if p.strip()]
+    unknown = [p for p in requested if p not in PANELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown panels: {', '.join(unknown)}")
+
+    ctx = AnalyticsContext(store, start_date, end_date)
+
+    # Panels only share read-only aggregates through ctx, so they can run side by side.
+    # Mostly matters for the forecast panel, which can be slow on a model cache miss.
+    def run(name):
+        panel = PANELS[name]
+        if inspect.iscoroutinefunction(panel):
+            return panel(ctx)
+        return run_in_threadpool(panel, ctx)
+
+    results = await asyncio.gather(*[run(name) for name in requested])
+    return frame_response(request, dict(zip(requested, results)))
@@ -1,57 +1,30 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, Query, Request
+from rollups import AnalyticsContext, RollupStore, get_rollups
+from serialization import frame_response
+from paging import sort_by_keys
 import pandas as pd
 
 router = APIRouter()
 
+CAPITAL_TRAPS_ORDER = [('capital_tied_up', False), ('avg_days_to_sell', False)]
+CAPITAL_TRAPS_COLUMNS = ['brand', 'description', 'avg_days_to_sell', 'capital_tied_up']
+
 @router.get("/margin-bleeders")
-def get_margin_bleeders(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    sales_where = ""
-    if start_date and end_date:
-        sales_where = f"WHERE salesdate >= %(start_date)s AND salesdate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    query_margin = f"""
-    WITH brand_sales AS (
-        SELECT 
-            Brand, 
-            MAX(Description) as Description,
-            AVG(SalesPrice) as avg_sales_price,
-            AVG(ExciseTax) as avg_excise_tax
-        FROM Sales
-        {sales_where}
-        GROUP BY Brand
-    ),
-    po_freight AS (
-        SELECT 
-            PONumber, 
-            SUM(Freight) / NULLIF(SUM(Quantity), 0) as freight_per_unit_po
-        FROM InvoicePurchases
-        GROUP BY PONumber
-    ),
-    brand_purchases AS (
-        SELECT 
-            p.Brand,
-            AVG(p.PurchasePrice) as avg_purchase_price,
-            AVG(pf.freight_per_unit_po) as avg_freight_per_unit
-        FROM Purchases p
-        LEFT JOIN po_freight pf ON p.PONumber = pf.PONumber
-        GROUP BY p.Brand
-    )
-    SELECT 
-        s.Brand as brand,
-        s.Description as description,
-        s.avg_sales_price,
-        s.avg_excise_tax,
-        p.avg_purchase_price,
-        COALESCE(p.avg_freight_per_unit, 0) as avg_freight_per_unit
-    FROM brand_sales s
-    JOIN brand_purchases p ON s.Brand = p.Brand
-    """
+async def get_margin_bleeders(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None)):
+    return frame_response(request, margin_bleeders(AnalyticsContext(store, start_date, end_date)))
+
+def margin_bleeders(ctx):
+    # Purchase side (prices, freight per PO) is all-time, same as the old brand_purchases CTE
+    sales = ctx.sales[ctx.sales['purchase_count'] > 0]
     
-    df_margin = pd.read_sql(query_margin, db.bind, params=sql_params)
+    df_margin = pd.DataFrame({
+        'brand': sales.index,
+        'description': sales['sales_description'].to_numpy(),
+        'avg_sales_price': (sales['sales_price_sum'] / sales['sales_price_count']).to_numpy(),
+        'avg_excise_tax': (sales['excise_tax'] / sales['excise_tax_count']).to_numpy(),
+        'avg_purchase_price': sales['avg_purchase_price'].to_numpy(),
+        'avg_freight_per_unit': sales['avg_freight_per_unit'].fillna(0).to_numpy(),
+    })
     
     df_margin['gross_margin'] = df_margin['avg_sales_price'] - df_margin['avg_purchase_price']
     df_margin['true_margin'] = df_margin['gross_margin'] - df_margin['avg_excise_tax'] - df_margin['avg_freight_per_unit']
@@ -60,62 +33,39 @@ def get_margin_bleeders(db: Session = Depends(get_db), start_date: str = Query(N
     bleeders = df_margin.sort_values('true_margin').head(10)
     
     bleeders = bleeders.fillna(0)
-    return bleeders[['brand', 'description', 'avg_sales_price', 'gross_margin', 'true_margin']].to_dict(orient="records")
+    return bleeders[['brand', 'description', 'avg_sales_price', 'gross_margin', 'true_margin']]
 
 @router.get("/capital-traps")
-def get_capital_traps(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    sales_where = "WHERE SalesDate IS NOT NULL"
-    purchase_where = "WHERE ReceivingDate IS NOT NULL"
-    if start_date and end_date:
-        sales_where += f" AND SalesDate >= %(start_date)s AND SalesDate <= %(end_date)s"
-        purchase_where += f" AND ReceivingDate >= %(start_date)s AND ReceivingDate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    query_ccc = f"""
-    WITH sales_dates AS (
-        SELECT 
-            Brand, 
-            AVG(EXTRACT(EPOCH FROM SalesDate::timestamp)) as avg_sales_epoch
-        FROM Sales
-        {sales_where}
-        GROUP BY Brand
-    ),
-    purchase_dates AS (
-        SELECT 
-            Brand, 
-            AVG(EXTRACT(EPOCH FROM ReceivingDate::timestamp)) as avg_rec_epoch,
-            AVG(PurchasePrice * Quantity) as avg_capital_outlay
-        FROM Purchases
-        {purchase_where}
-        GROUP BY Brand
-    )
-    SELECT 
-        COALESCE(p.Brand, s.Brand) as brand,
-        (s.avg_sales_epoch - p.avg_rec_epoch) / 86400.0 AS avg_days_to_sell,
-        p.avg_capital_outlay as capital_tied_up
-    FROM purchase_dates p
-    LEFT JOIN sales_dates s ON s.Brand = p.Brand
-    """
+async def get_capital_traps(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None)):
+    return frame_response(request, capital_traps(AnalyticsContext(store, start_date, end_date)))
+
+def capital_traps(ctx):
+    return capital_trap_candidates(ctx)[CAPITAL_TRAPS_COLUMNS].head(30)
+
+def capital_trap_candidates(ctx):
+    purchases = ctx.received
+    sales = ctx.sales
+    
+    if purchases.empty:
+        return pd.DataFrame(columns=CAPITAL_TRAPS_COLUMNS)
     
-    df_ccc = pd.read_sql(query_ccc, db.bind, params=sql_params)
+    avg_rec_day = purchases['epoch_day_weight'] / purchases['row_count']
+    avg_sales_day = (sales['epoch_day_weight'] / sales['row_count']).reindex(purchases.index)
     
-    if df_ccc.empty:
-        return []
+    df_ccc = pd.DataFrame({
+        'brand': purchases.index,
+        'avg_days_to_sell': (avg_sales_day - avg_rec_day).to_numpy(),
+        'capital_tied_up': (purchases['capital_outlay'] / purchases['capital_count']).to_numpy(),
+        'description': purchases['purchase_description'].to_numpy(),
+    })
         
     df_ccc['avg_days_to_sell'] = df_ccc['avg_days_to_sell'].fillna(365)
     df_ccc['avg_days_to_sell'] = df_ccc['avg_days_to_sell'].apply(lambda x: 365 if x <= 0 else x)
     
-    query_desc = "SELECT Brand as brand, MAX(Description) as description FROM Purchases GROUP BY Brand"
-    df_desc = pd.read_sql(query_desc, db.bind)
-    
-    df_ccc = df_ccc.merge(df_desc, on='brand', how='left')
-    
     median_days = df_ccc['avg_days_to_sell'].median() if not df_ccc['avg_days_to_sell'].isna().all() else 0
     median_capital = df_ccc['capital_tied_up'].median() if not df_ccc['capital_tied_up'].isna().all() else 0
     
     traps = df_ccc[(df_ccc['avg_days_to_sell'] >= median_days) & (df_ccc['capital_tied_up'] >= median_capital)]
-    traps = traps.sort_values(by=['capital_tied_up', 'avg_days_to_sell'], ascending=[False, False]).head(30)
     
     traps = traps.fillna(0)
-    return traps[['brand', 'description', 'avg_days_to_sell', 'capital_tied_up']].to_dict(orient="records")
+    return sort_by_keys(traps, CAPITAL_TRAPS_ORDER)
@@ -1,73 +1,90 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
-import pandas as pd
-from prophet import Prophet
+import os
+import sys
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from rollups import AnalyticsContext, RollupStore, get_rollups
+
+# ml_engine lives next to the backend rather than inside it
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'ml_engine'))
+import predict
+import statements
+from serialization import frame_response
 
 router = APIRouter()
 
+FORECAST_EXISTS = statements.register('forecast_exists', predict.FORECAST_EXISTS_QUERY)
+FORECAST_LOOKUP = statements.register('forecast_lookup', predict.FORECAST_LOOKUP_QUERY)
+
+async def lookup_forecast_async(brand, watermark=None):
+    # Async version of predict.lookup_forecast, same SQL
+    present = await statements.execute(FORECAST_EXISTS)
+    if not present['present'].iloc[0]:
+        return None
+    df = await statements.execute(FORECAST_LOOKUP, predict.lookup_params(brand, watermark))
+    return predict.format_forecast(df)
+
 @router.get("/demand-forecast")
-def get_demand_forecast(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    sales_where = ""
-    if start_date and end_date:
-        sales_where = f"WHERE salesdate >= %(start_date)s AND salesdate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    top_brand_query = f"""
-        SELECT 
-            brand,
-            MAX(description) as description,
-            SUM(salesquantity) as total_volume_sold
-        FROM sales
-        {sales_where}
-        GROUP BY brand
-        ORDER BY total_volume_sold DESC
-        LIMIT 1;
-    """
-    top_brand_df = pd.read_sql(top_brand_query, db.bind, params=sql_params)
+async def get_demand_forecast(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), brand: int = Query(None), engine: str = Query("prophet")):
+    if engine not in ("prophet", "ets"):
+        raise HTTPException(status_code=400, detail="engine must be 'prophet' or 'ets'")
+    return frame_response(request, await demand_forecast(AnalyticsContext(store, start_date, end_date), brand=brand, engine=engine))
+
+async def demand_forecast(ctx, brand=None, engine="prophet"):
+    store = ctx.store
+    # Both engines key their models on the latest sales day, so nothing refits until new data lands
+    watermark = store.sales.days[-1] if len(store.sales.days) else None
+    matrix_loader = lambda: store.sales.daily_matrix('sales_quantity')
     
-    if top_brand_df.empty and start_date and end_date:
-        # Fallback to all-time top brand if the selected period has no sales (e.g. Q2-Q4 2016)
-        top_brand_query_fallback = """
-            SELECT 
+    if brand is not None and store.sales.series(brand, 'sales_quantity').empty:
+        # Nothing to fit on: not a brand the rollups have sales for
+        raise HTTPException(status_code=404, detail=f"No sales history for brand {brand}")
+    
+    if brand is not None and engine == "ets":
+        forecast = await run_in_threadpool(predict.predict_ets, brand, watermark, matrix_loader) if watermark is not None else None
+        if forecast is None:
+            return {"error": f"No forecast available for brand {brand}"}
+        return {"brand_name": store.dims['description'].get(brand), "forecast": forecast}
+    
+    if brand is not None:
+        # Any batch-forecasted brand (src/ml_engine/batch_forecast.py) is a plain table lookup,
+        # as long as it was fitted on the current sales; anything else goes to the model registry
+        forecast = await lookup_forecast_async(brand, watermark)
+        if forecast is None:
+            forecast = await run_in_threadpool(
+                predict.predict,
                 brand,
-                MAX(description) as description,
-                SUM(salesquantity) as total_volume_sold
-            FROM sales
-            GROUP BY brand
-            ORDER BY total_volume_sold DESC
-            LIMIT 1;
-        """
-        top_brand_df = pd.read_sql(top_brand_query_fallback, db.bind)
+                watermark,
+                history_loader=lambda: store.sales.series(brand, 'sales_quantity'),
+            )
+        brand_name = store.dims['description'].get(brand)
+        return {"brand_name": brand_name, "forecast": forecast}
+    
+    sales = ctx.sales
+    
+    if sales.empty and ctx.start_date and ctx.end_date:
+        # Fallback to all-time top brand if the selected period has no sales (e.g. Q2-Q4 2016)
+        sales = ctx.all_sales
         
-    if top_brand_df.empty:
+    if sales.empty:
         return {"error": "No sales data found"}
         
-    target_brand_id = top_brand_df['brand'].iloc[0]
-    target_brand_name = top_brand_df['description'].iloc[0]
+    target_brand_id = sales['sales_quantity'].idxmax()
+    target_brand_name = sales.loc[target_brand_id, 'sales_description']
     
     # For forecasting, time-series models (like Prophet) need ALL historical data to determine seasonality and trends.
     # Therefore, we intentionally do NOT filter the historical training data by `start_date` and `end_date`.
-    sales_query = f"""
-        SELECT 
-            salesdate::date as ds,
-            SUM(salesquantity) as y
-        FROM sales
-        WHERE brand = '{target_brand_id}'
-        GROUP BY salesdate::date
-        ORDER BY salesdate::date ASC;
-    """
-    
-    df = pd.read_sql(sales_query, db.bind)
-    df['ds'] = pd.to_datetime(df['ds'])
-    
-    model = Prophet(yearly_seasonality=True, weekly_seasonality=True, daily_seasonality=False)
-    model.fit(df)
+    if engine == "ets":
+        # Fitting the catalogue (on a watermark change) and model fits are CPU work, keep them off the event loop
+        forecast = await run_in_threadpool(predict.predict_ets, target_brand_id, watermark, matrix_loader)
+        return {"brand_name": target_brand_name, "forecast": forecast}
     
-    future = model.make_future_dataframe(periods=30, freq='D')
-    forecast = model.predict(future)
+    forecast = await lookup_forecast_async(target_brand_id, watermark)
+    if forecast is None:
+        forecast = await run_in_threadpool(
+            predict.predict,
+            target_brand_id,
+            watermark,
+            history_loader=lambda: store.sales.series(target_brand_id, 'sales_quantity'),
+        )
     
-    forecast['ds'] = forecast['ds'].dt.strftime('%Y-%m-%d')
-    res = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(60).to_dict(orient="records")
-    return {"brand_name": target_brand_name, "forecast": res}
+    return {"brand_name": target_brand_name, "forecast": forecast}
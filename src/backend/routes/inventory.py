@@ -1,136 +1,92 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from rollups import AnalyticsContext, RollupStore, get_rollups
+from serialization import frame_response
+from paging import sort_by_keys
+import lead_times
+import pushdown
+import simulation
+import whatif
 import pandas as pd
 import numpy as np
-import scipy.stats as stats
 
 router = APIRouter()
 
+# Full ranked lists behind the truncated routes (paged / exported in routes/listings.py)
+REORDER_ORDER = [('avg_daily_sales', False)]
+REORDER_COLUMNS = ['brand', 'description', 'avg_daily_sales', 'avg_lead_time_days', 'current_on_hand', 'safety_stock_units', 'lead_time_demand', 'rop']
+OPTIMIZATION_ORDER = [('annual_demand', False)]
+OPTIMIZATION_COLUMNS = ['brand', 'description', 'current_on_hand', 'rop', 'eoq', 'action_required']
+
+# Defaults for the reorder parameters, all overridable per request:
+# S = cost per order, h = yearly holding cost as a share of the unit price
+SETUP_COST = 45.0
+HOLDING_RATE = 0.20
+SAFETY_STOCK_DAYS = 14
+
+def check_mode(mode):
+    # memory: formulas over the in-memory rollups. sql: evaluated in Postgres (pushdown.py)
+    if mode not in ("memory", "sql"):
+        raise HTTPException(status_code=400, detail="mode must be 'memory' or 'sql'")
+
 @router.get("/reorder-alerts")
-def get_reorder_alerts(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    sales_where = ""
-    if start_date and end_date:
-        sales_where = f"WHERE salesdate >= %(start_date)s AND salesdate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    query = f"""
-    WITH sales_agg AS (
-        SELECT 
-            brand, 
-            MAX(description) AS description, 
-            SUM(salesquantity) / 365.0 AS avg_daily_sales
-        FROM sales
-        {sales_where}
-        GROUP BY brand
-    ),
-    lead_times AS (
-        SELECT 
-            brand,
-            AVG(EXTRACT(DAY FROM (receivingdate::timestamp - podate::timestamp))) AS avg_lead_time_days
-        FROM purchases
-        WHERE podate IS NOT NULL 
-          AND receivingdate IS NOT NULL 
-          AND receivingdate >= podate
-        GROUP BY brand
-    ),
-    inventory AS (
-        SELECT 
-            brand,
-            SUM(onhand) AS current_on_hand
-        FROM endinginventory
-        GROUP BY brand
-    )
-    SELECT 
-        s.brand,
-        s.description,
-        s.avg_daily_sales,
-        COALESCE(l.avg_lead_time_days, 14) AS avg_lead_time_days,
-        COALESCE(i.current_on_hand, 0) AS current_on_hand
-    FROM sales_agg s
-    LEFT JOIN lead_times l ON s.brand = l.brand
-    LEFT JOIN inventory i ON s.brand = i.brand
-    """
-    
-    df = pd.read_sql(query, db.bind, params=sql_params)
-    
-    safety_stock_days = 14
+async def get_reorder_alerts(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), mode: str = Query("memory"), safety_stock_days: int = Query(SAFETY_STOCK_DAYS, ge=0)):
+    check_mode(mode)
+    if mode == "sql":
+        return frame_response(request, await pushdown.reorder_alerts(start_date, end_date, safety_stock_days, limit=50))
+    return frame_response(request, reorder_alerts(AnalyticsContext(store, start_date, end_date), safety_stock_days))
+
+def reorder_alerts(ctx, safety_stock_days=SAFETY_STOCK_DAYS):
+    return reorder_candidates(ctx, safety_stock_days)[REORDER_COLUMNS].head(50)
+
+def reorder_candidates(ctx, safety_stock_days=SAFETY_STOCK_DAYS):
+    sales = ctx.sales
+    lead_times = ctx.all_lead_times
+    
+    df = pd.DataFrame({
+        'brand': sales.index,
+        'description': sales['sales_description'].to_numpy(),
+        'avg_daily_sales': (sales['sales_quantity'] / 365.0).to_numpy(),
+    })
+    df['avg_lead_time_days'] = df['brand'].map(lead_times['avg_lead_time']).fillna(14)
+    df['current_on_hand'] = sales['current_on_hand'].to_numpy()
+    
     df['safety_stock_units'] = df['avg_daily_sales'] * safety_stock_days
     df['lead_time_demand'] = df['avg_daily_sales'] * df['avg_lead_time_days']
     
     df['rop'] = df['lead_time_demand'] + df['safety_stock_units']
-    df['rop'] = df['rop'].apply(lambda x: int(x + 0.9999))
+    df['rop'] = np.floor(df['rop'] + 0.9999).astype(int)
     
     alerts_df = df[df['current_on_hand'] < df['rop']].copy()
-    alerts_df = alerts_df.sort_values(by='avg_daily_sales', ascending=False).head(50)
     alerts_df = alerts_df.fillna(0)
     
-    return alerts_df.to_dict(orient="records")
+    return sort_by_keys(alerts_df, REORDER_ORDER)
 
 @router.get("/inventory-optimization")
-def get_inventory_optimization(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    po_where = ""
-    if start_date and end_date:
-        po_where = f" AND podate >= %(start_date)s AND podate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    extraction_query = f"""
-    WITH sales_agg AS (
-        SELECT 
-            brand, 
-            MAX(description) AS description, 
-            SUM(salesquantity) AS annual_demand,
-            SUM(salesquantity) / 365.0 AS avg_daily_sales
-        FROM sales
-        GROUP BY brand
-    ),
-    prices AS (
-        SELECT 
-            brand,
-            MAX(purchaseprice) AS purchase_price
-        FROM purchaseprices
-        GROUP BY brand
-    ),
-    lead_times AS (
-        SELECT 
-            brand,
-            AVG(EXTRACT(DAY FROM (receivingdate::timestamp - podate::timestamp))) AS avg_lead_time_days
-        FROM purchases
-        WHERE podate IS NOT NULL 
-          AND receivingdate IS NOT NULL 
-          AND receivingdate >= podate
-          {po_where}
-        GROUP BY brand
-    ),
-    inventory AS (
-        SELECT 
-            brand,
-            SUM(onhand) AS current_on_hand
-        FROM endinginventory
-        GROUP BY brand
-    )
-    SELECT 
-        s.brand,
-        s.description,
-        s.annual_demand,
-        s.avg_daily_sales,
-        p.purchase_price,
-        COALESCE(l.avg_lead_time_days, 14) AS avg_lead_time_days,
-        COALESCE(i.current_on_hand, 0) AS current_on_hand
-    FROM sales_agg s
-    LEFT JOIN prices p ON s.brand = p.brand
-    LEFT JOIN lead_times l ON s.brand = l.brand
-    LEFT JOIN inventory i ON s.brand = i.brand
-    WHERE s.annual_demand > 0 AND p.purchase_price > 0
-    """
-    
-    opt_df = pd.read_sql(extraction_query, db.bind, params=sql_params)
-    
-    S = 45.0
-    h = 0.20
-    safety_stock_days = 14
+async def get_inventory_optimization(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), mode: str = Query("memory"), S: float = Query(SETUP_COST, gt=0), h: float = Query(HOLDING_RATE, gt=0), safety_stock_days: int = Query(SAFETY_STOCK_DAYS, ge=0)):
+    check_mode(mode)
+    if mode == "sql":
+        return frame_response(request, await pushdown.inventory_optimization(start_date, end_date, S, h, safety_stock_days, limit=10))
+    return frame_response(request, inventory_optimization(AnalyticsContext(store, start_date, end_date), S, h, safety_stock_days))
+
+def inventory_optimization(ctx, S=SETUP_COST, h=HOLDING_RATE, safety_stock_days=SAFETY_STOCK_DAYS):
+    return optimization_candidates(ctx, S, h, safety_stock_days)[OPTIMIZATION_COLUMNS].head(10)
+
+def optimization_candidates(ctx, S=SETUP_COST, h=HOLDING_RATE, safety_stock_days=SAFETY_STOCK_DAYS):
+    # Demand is all-time, only the lead time window follows the PO date filter
+    sales = ctx.all_sales
+    lead_times = ctx.lead_times
+    
+    opt_df = pd.DataFrame({
+        'brand': sales.index,
+        'description': sales['sales_description'].to_numpy(),
+        'annual_demand': sales['sales_quantity'].to_numpy(),
+        'avg_daily_sales': (sales['sales_quantity'] / 365.0).to_numpy(),
+        'purchase_price': sales['purchase_price'].to_numpy(),
+    })
+    opt_df['avg_lead_time_days'] = opt_df['brand'].map(lead_times['avg_lead_time']).fillna(14)
+    opt_df['current_on_hand'] = sales['current_on_hand'].to_numpy()
+    opt_df = opt_df[(opt_df['annual_demand'] > 0) & (opt_df['purchase_price'] > 0)].copy()
     
     opt_df['holding_cost_unit'] = opt_df['purchase_price'] * h
     opt_df['eoq'] = np.sqrt((2 * opt_df['annual_demand'] * S) / opt_df['holding_cost_unit'])
@@ -142,74 +98,49 @@ def get_inventory_optimization(db: Session = Depends(get_db), start_date: str =
     opt_df['rop'] = np.ceil(opt_df['rop']).astype(int)
     
     opt_df['action_required'] = np.where(opt_df['current_on_hand'] < opt_df['rop'], 'Reorder Now', 'Stock Adequate')
-    at_risk_df = opt_df[opt_df['action_required'] == 'Reorder Now'].sort_values(by='annual_demand', ascending=False).head(10)
+    at_risk_df = opt_df[opt_df['action_required'] == 'Reorder Now']
     
     at_risk_df = at_risk_df.fillna(0)
-    return at_risk_df[['brand', 'description', 'current_on_hand', 'rop', 'eoq', 'action_required']].to_dict(orient="records")
+    return sort_by_keys(at_risk_df, OPTIMIZATION_ORDER)
+
+@router.get("/lead-times")
+async def get_lead_times(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), group_by: str = Query("brand")):
+    # Count / AVG / STDDEV of lead time for POs dated in the range, per brand, vendor or both
+    if group_by not in lead_times.GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(lead_times.GROUPINGS)}")
+    moments = await lead_times.current()
+    return frame_response(request, moments.stats(group_by, start_date, end_date))
 
 @router.get("/safety-stock-simulation")
-def get_safety_stock_simulation(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    po_where = ""
-    if start_date and end_date:
-        po_where = f" AND podate >= %(start_date)s AND podate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    extraction_query = f"""
-    WITH sales_agg AS (
-        SELECT 
-            brand, 
-            MAX(description) AS description, 
-            SUM(salesquantity) AS daily_sales,
-            salesdate::date AS sales_date
-        FROM sales
-        GROUP BY brand, sales_date
-    ),
-    demand_metrics AS (
-        SELECT
-            brand,
-            MAX(description) as description,
-            AVG(daily_sales) as avg_daily_demand,
-            STDDEV(daily_sales) as std_dev_demand,
-            SUM(daily_sales) as total_volume
-        FROM sales_agg
-        GROUP BY brand
-    ),
-    lead_times AS (
-        SELECT 
-            brand,
-            EXTRACT(DAY FROM (receivingdate::timestamp - podate::timestamp)) AS lead_time_days
-        FROM purchases
-        WHERE podate IS NOT NULL 
-          AND receivingdate IS NOT NULL 
-          AND receivingdate >= podate
-          {po_where}
-    ),
-    lt_metrics AS (
-        SELECT
-            brand,
-            AVG(lead_time_days) as avg_lead_time,
-            STDDEV(lead_time_days) as std_dev_lead_time
-        FROM lead_times
-        GROUP BY brand
-    )
-    SELECT
-        d.brand,
-        d.description,
-        d.avg_daily_demand,
-        COALESCE(d.std_dev_demand, 0.0) as std_dev_demand,
-        d.total_volume,
-        COALESCE(l.avg_lead_time, 14.0) as avg_lead_time,
-        COALESCE(l.std_dev_lead_time, 2.0) as std_dev_lead_time
-    FROM demand_metrics d
-    LEFT JOIN lt_metrics l ON d.brand = l.brand
-    WHERE d.avg_daily_demand > 0
-    """
-    
-    opt_df = pd.read_sql(extraction_query, db.bind, params=sql_params)
-    
-    service_level = 0.95
-    z_score = stats.norm.ppf(service_level)
+async def get_safety_stock_simulation(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), mode: str = Query("analytic"), scenarios: int = Query(10000, ge=100, le=100000), seed: int = Query(42, ge=0)):
+    # analytic: closed-form normal approximation. monte_carlo: simulation.py
+    if mode not in ("analytic", "monte_carlo"):
+        raise HTTPException(status_code=400, detail="mode must be 'analytic' or 'monte_carlo'")
+    ctx = AnalyticsContext(store, start_date, end_date)
+    if mode == "monte_carlo":
+        return frame_response(request, await run_in_threadpool(safety_stock_monte_carlo, ctx, scenarios, seed))
+    return frame_response(request, safety_stock_simulation(ctx))
+
+SERVICE_LEVEL = 0.95
+LEAD_TIME_VARIANCE_MULTIPLIER = 1.5
+HOLDING_COST_PER_UNIT = 2.50
+
+def safety_stock_inputs(ctx):
+    demand = ctx.demand_stats
+    lead_times = ctx.lead_times
+    
+    opt_df = pd.DataFrame({
+        'brand': demand.index,
+        'description': demand['description'].to_numpy(),
+        'avg_daily_demand': demand['avg_daily_demand'].to_numpy(),
+        'std_dev_demand': demand['std_dev_demand'].fillna(0.0).to_numpy(),
+        'total_volume': demand['total_volume'].to_numpy(),
+    })
+    opt_df['avg_lead_time'] = opt_df['brand'].map(lead_times['avg_lead_time']).fillna(14.0)
+    opt_df['std_dev_lead_time'] = opt_df['brand'].map(lead_times['std_dev_lead_time']).fillna(2.0)
+    opt_df = opt_df[opt_df['avg_daily_demand'] > 0].copy()
+    
+    z_score = whatif.z_scores(SERVICE_LEVEL)
     
     opt_df['variance_demand_term'] = opt_df['avg_lead_time'] * (opt_df['std_dev_demand'] ** 2)
     opt_df['variance_lead_time_term'] = (opt_df['avg_daily_demand'] ** 2) * (opt_df['std_dev_lead_time'] ** 2)
@@ -219,11 +150,13 @@ def get_safety_stock_simulation(db: Session = Depends(get_db), start_date: str =
     
     opt_df['lead_time_demand'] = opt_df['avg_daily_demand'] * opt_df['avg_lead_time']
     opt_df['dynamic_rop'] = np.ceil(opt_df['lead_time_demand'] + opt_df['safety_stock']).astype(int)
+    return opt_df
 
-    lead_time_variance_multiplier = 1.5
-    holding_cost_per_unit = 2.50
+def safety_stock_simulation(ctx):
+    opt_df = safety_stock_inputs(ctx)
+    z_score = whatif.z_scores(SERVICE_LEVEL)
     
-    shocked_std_dev_lead_time = opt_df['std_dev_lead_time'] * lead_time_variance_multiplier
+    shocked_std_dev_lead_time = opt_df['std_dev_lead_time'] * LEAD_TIME_VARIANCE_MULTIPLIER
     variance_lead_time_term_shock = (opt_df['avg_daily_demand'] ** 2) * (shocked_std_dev_lead_time ** 2)
     
     opt_df['shock_safety_stock'] = z_score * np.sqrt(opt_df['variance_demand_term'] + variance_lead_time_term_shock)
@@ -231,9 +164,46 @@ def get_safety_stock_simulation(db: Session = Depends(get_db), start_date: str =
     
     opt_df['additional_units_needed'] = opt_df['shock_safety_stock'] - opt_df['safety_stock']
     opt_df['additional_units_needed'] = opt_df['additional_units_needed'].clip(lower=0)
-    opt_df['additional_capital_tied_up'] = opt_df['additional_units_needed'] * holding_cost_per_unit
+    opt_df['additional_capital_tied_up'] = opt_df['additional_units_needed'] * HOLDING_COST_PER_UNIT
 
-    results_df = opt_df.sort_values(by='additional_capital_tied_up', ascending=False).head(10)
+    # Same tie order (brand) as the what-if grid and the Monte Carlo panel
+    results_df = sort_by_keys(opt_df, [('additional_capital_tied_up', False)]).head(10)
     results_df = results_df.fillna(0)
     
-    return results_df[['brand', 'description', 'total_volume', 'safety_stock', 'shock_safety_stock', 'additional_capital_tied_up']].to_dict(orient="records")
+    return results_df[['brand', 'description', 'total_volume', 'safety_stock', 'shock_safety_stock', 'additional_capital_tied_up']]
+
+# Grid points (service levels x shock multipliers x holding costs) per what-if call
+MAX_WHAT_IF_POINTS = 1000
+
+@router.get("/safety-stock-simulation/what-if")
+async def get_safety_stock_what_if(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), service_level: list[float] = Query([SERVICE_LEVEL]), shock_multiplier: list[float] = Query([LEAD_TIME_VARIANCE_MULTIPLIER]), holding_cost: list[float] = Query([HOLDING_COST_PER_UNIT]), limit: int = Query(10, ge=1, le=100)):
+    # Repeat a parameter for a grid: ?service_level=0.9&service_level=0.95&shock_multiplier=2
+    if not all(0 < x < 1 for x in service_level):
+        raise HTTPException(status_code=400, detail="service_level must be between 0 and 1")
+    if not all(x >= 0 for x in shock_multiplier + holding_cost):
+        raise HTTPException(status_code=400, detail="shock_multiplier and holding_cost must be >= 0")
+    points = len(set(service_level)) * len(set(shock_multiplier)) * len(set(holding_cost))
+    if points > MAX_WHAT_IF_POINTS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_WHAT_IF_POINTS} grid points, got {points}")
+    moments = whatif.moments(AnalyticsContext(store, start_date, end_date), safety_stock_inputs)
+    return frame_response(request, whatif.evaluate(moments, service_level, shock_multiplier, holding_cost, limit))
+
+MONTE_CARLO_COLUMNS = [
+    'brand', 'description', 'total_volume', 'safety_stock', 'simulated_safety_stock',
+    'achieved_service_level', 'stockout_probability', 'expected_shortage_units',
+    'shock_safety_stock', 'shock_service_level', 'capital_tied_up', 'additional_capital_tied_up',
+]
+
+def safety_stock_monte_carlo(ctx, scenarios=10000, seed=42):
+    # safety_stock stays the analytic one; the simulation says how well it actually does
+    # and what it would take to reach SERVICE_LEVEL, normally and under the shock
+    opt_df = safety_stock_inputs(ctx)
+    sim = simulation.simulate(opt_df, SERVICE_LEVEL, LEAD_TIME_VARIANCE_MULTIPLIER, scenarios, seed)
+    opt_df = opt_df.join(sim)
+    
+    opt_df['capital_tied_up'] = opt_df['simulated_safety_stock'] * HOLDING_COST_PER_UNIT
+    opt_df['additional_units_needed'] = (opt_df['shock_safety_stock'] - opt_df['simulated_safety_stock']).clip(lower=0)
+    opt_df['additional_capital_tied_up'] = opt_df['additional_units_needed'] * HOLDING_COST_PER_UNIT
+    
+    results_df = sort_by_keys(opt_df, [('additional_capital_tied_up', False)]).head(10)
+    return results_df[MONTE_CARLO_COLUMNS].fillna(0)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from rollups import AnalyticsContext, RollupStore, get_rollups
+from routes import credit, financials, inventory
+from serialization import frame_response
+from paging import export_response, keyset_page
+
+router = APIRouter()
+
+# Complete versions of the truncated panels: name -> (full ranked list, sort keys, columns).
+# GET /api/<name>/page    keyset pages, {"items": [...], "next_cursor": "..." | null}
+# GET /api/<name>/export  the whole list as CSV / NDJSON, streamed in chunks
+LISTINGS = {
+    "reorder-alerts": (inventory.reorder_candidates, inventory.REORDER_ORDER, inventory.REORDER_COLUMNS),
+    "inventory-optimization": (inventory.optimization_candidates, inventory.OPTIMIZATION_ORDER, inventory.OPTIMIZATION_COLUMNS),
+    "capital-traps": (financials.capital_trap_candidates, financials.CAPITAL_TRAPS_ORDER, financials.CAPITAL_TRAPS_COLUMNS),
+    "credit-risk": (credit.credit_candidates, credit.ORDER, credit.COLUMNS),
+}
+
+def listing(name):
+    if name not in LISTINGS:
+        raise HTTPException(status_code=404, detail=f"No paginated list named {name}")
+    return LISTINGS[name]
+
+@router.get("/{name}/page")
+async def get_page(name: str, request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), cursor: str = Query(None), limit: int = Query(100, ge=1, le=5000)):
+    candidates, order, columns = listing(name)
+    ranked = await run_in_threadpool(candidates, AnalyticsContext(store, start_date, end_date))
+    page, next_cursor = keyset_page(ranked, order, cursor, limit)
+    return frame_response(request, {"items": page[columns], "next_cursor": next_cursor})
+
+@router.get("/{name}/export")
+async def get_export(name: str, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None), format: str = Query("csv"), chunk_size: int = Query(1000, ge=1, le=100000)):
+    candidates, order, columns = listing(name)
+    ranked = await run_in_threadpool(candidates, AnalyticsContext(store, start_date, end_date))
+    return export_response(ranked, columns, format, name, chunk_size)
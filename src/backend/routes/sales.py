@@ -1,46 +1,26 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, Query, Request
+from rollups import AnalyticsContext, RollupStore, get_rollups
+from serialization import frame_response
 import pandas as pd
 
 router = APIRouter()
 
 @router.get("/abc-summary")
-def get_abc_summary(db: Session = Depends(get_db), start_date: str = Query(None), end_date: str = Query(None)):
-    sql_params = {}
-    sales_where = ""
-    if start_date and end_date:
-        sales_where = f"WHERE salesdate >= %(start_date)s AND salesdate <= %(end_date)s"
-        sql_params = {"start_date": start_date, "end_date": end_date}
-        
-    query = f"""
-    SELECT 
-        brand, 
-        SUM(salesdollars) as total_revenue
-    FROM sales
-    {sales_where}
-    GROUP BY brand
-    HAVING SUM(salesdollars) > 0
-    ORDER BY total_revenue DESC
-    """
-    
-    df = pd.read_sql(query, db.bind, params=sql_params)
+async def get_abc_summary(request: Request, store: RollupStore = Depends(get_rollups), start_date: str = Query(None), end_date: str = Query(None)):
+    return frame_response(request, abc_summary(AnalyticsContext(store, start_date, end_date)))
+
+def abc_summary(ctx):
+    sales = ctx.sales[ctx.sales['sales_dollars'] > 0]
     
-    if df.empty and start_date and end_date:
+    if sales.empty and ctx.start_date and ctx.end_date:
         # Fallback to all-time data if the selected period has no sales (e.g., Q2-Q4 2016)
-        query_fallback = """
-        SELECT 
-            brand, 
-            SUM(salesdollars) as total_revenue
-        FROM sales
-        GROUP BY brand
-        HAVING SUM(salesdollars) > 0
-        ORDER BY total_revenue DESC
-        """
-        df = pd.read_sql(query_fallback, db.bind)
+        sales = ctx.all_sales[ctx.all_sales['sales_dollars'] > 0]
         
-    if df.empty:
-        return []
+    if sales.empty:
+        return pd.DataFrame(columns=['category', 'brand_count', 'total_revenue'])
+    
+    df = pd.DataFrame({'brand': sales.index, 'total_revenue': sales['sales_dollars'].to_numpy()})
+    df = df.sort_values(by='total_revenue', ascending=False).reset_index(drop=True)
     
     total_rev = df['total_revenue'].sum()
     df['cumulative_revenue'] = df['total_revenue'].cumsum()
@@ -58,4 +38,4 @@ def get_abc_summary(db: Session = Depends(get_db), start_date: str = Query(None)
         total_revenue=('total_revenue', 'sum')
     ).reset_index()
     
-    return summary_df.to_dict(orient="records")
+    return summary_df
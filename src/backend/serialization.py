@@ -0,0 +1,130 @@
+import datetime
+import io
+
+import orjson
+import pandas as pd
+from starlette.responses import Response
+
+import metrics
+
+# Response encoding for the analytics routes.
+# Routes return DataFrames (or a dict wrapping them) instead of to_dict(orient="records"):
+#   * JSON: orjson, for the frames and the envelope around them. A frame is read out
+#     column by column (Series.tolist) and zipped into row dicts, no jsonable_encoder
+#     walk. Floats come out in their shortest round-trip form, like json.dumps (pandas'
+#     to_json rounds to 10 decimals and prints 9348557.66 as 9348557.6600000001), and
+#     NaN / inf come out as null.
+#   * Arrow IPC stream / Parquet: the frame as a columnar table, for clients that send
+#     a matching Accept header. Scalars next to the frame (e.g. brand_name) ride along
+#     as schema metadata. Payloads that aren't one table (the dashboard) stay JSON.
+
+JSON = 'application/json'
+ARROW = 'application/vnd.apache.arrow.stream'
+PARQUET = 'application/vnd.apache.parquet'
+
+FORMATS = {
+    JSON: 'json',
+    ARROW: 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow',
+    PARQUET: 'parquet',
+    'application/x-parquet': 'parquet',
+}
+MEDIA_TYPES = {'json': JSON, 'arrow': ARROW, 'parquet': PARQUET}
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional, without it every client gets JSON
+    pa = None
+
+
+def negotiate(accept):
+    """'arrow' / 'parquet' when the Accept header prefers them (and pyarrow is there), else 'json'."""
+    if not accept or pa is None:
+        return 'json'
+    best, best_q = 'json', 0.0
+    for part in accept.split(','):
+        media_type, _, params = part.strip().partition(';')
+        fmt = FORMATS.get(media_type.strip().lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+def _default(value):
+    # Whatever orjson doesn't encode itself, the way pandas' to_json did: missing values
+    # as null, dates as epoch milliseconds, anything else as its str()
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value).value // 1_000_000
+    return str(value)
+
+
+def dumps(value):
+    return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def records(df):
+    """Rows of `df` as dicts of plain Python values."""
+    columns = [str(col) for col in df.columns]
+    return [dict(zip(columns, row)) for row in zip(*(df.iloc[:, i].tolist() for i in range(len(columns))))]
+
+
+def frame_json(df):
+    return dumps(records(df))
+
+
+def encode_json(payload):
+    if isinstance(payload, pd.DataFrame):
+        return frame_json(payload)
+    if isinstance(payload, dict):
+        return b'{' + b','.join(orjson.dumps(str(k)) + b':' + encode_json(v) for k, v in payload.items()) + b'}'
+    if isinstance(payload, (list, tuple)):
+        return b'[' + b','.join(encode_json(v) for v in payload) + b']'
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def to_table(payload):
+    """The payload as one Arrow table, or None if it isn't tabular."""
+    if isinstance(payload, pd.DataFrame):
+        return pa.Table.from_pandas(payload, preserve_index=False)
+    if isinstance(payload, dict):
+        frames = [k for k, v in payload.items() if isinstance(v, pd.DataFrame)]
+        if len(frames) != 1:
+            return None
+        table = pa.Table.from_pandas(payload[frames[0]], preserve_index=False)
+        extra = {k: orjson.dumps(v, option=orjson.OPT_SERIALIZE_NUMPY) for k, v in payload.items() if k != frames[0]}
+        return table.replace_schema_metadata({**(table.schema.metadata or {}), **extra})
+    return None
+
+
+def encode(payload, fmt='json'):
+    """(body, media type) for `payload` in `fmt`, falling back to JSON for non-tabular payloads."""
+    if fmt != 'json':
+        table = to_table(payload)
+        if table is not None:
+            sink = io.BytesIO()
+            if fmt == 'arrow':
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+            else:
+                pq.write_table(table, sink)
+            return sink.getvalue(), MEDIA_TYPES[fmt]
+    return encode_json(payload), JSON
+
+
+def frame_response(request, payload, status_code=200):
+    with metrics.phase('serialize'):
+        body, media_type = encode(payload, negotiate(request.headers.get('accept')))
+    return Response(body, status_code=status_code, media_type=media_type, headers={'Vary': 'Accept'})
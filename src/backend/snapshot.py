@@ -0,0 +1,89 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Read-only, memory-mapped snapshots of the rollup arrays, shared by every uvicorn worker.
+#
+# <root>/
+#   current -> v1718000000000-1234     symlink, swapped atomically with os.replace
+#   v1718000000000-1234/
+#       meta.json
+#       <name>.npy ...                  one raw .npy per array
+#
+# A snapshot directory is never modified once `current` points at it. Workers
+# np.load(mmap_mode='r') the files, so the pages live once in the OS page cache
+# no matter how many processes map them. Writers build a new directory next to
+# the old one and flip the symlink; readers that already mapped the old files keep
+# a valid mapping even after it's pruned. Builds are single-flight: a worker holds
+# an exclusive flock on <root>/.build.lock while it builds and publishes, and the next
+# one to get the lock looks at `current` before building again.
+
+CURRENT = 'current'
+LOCK = '.build.lock'
+KEEP = 2
+
+
+def current(root):
+    """Path of the live snapshot under `root`, or None if nothing was published yet."""
+    try:
+        return os.path.join(root, os.readlink(os.path.join(root, CURRENT)))
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def publish(root, arrays, meta):
+    """Write `arrays` ({name: ndarray}) + `meta` as a new snapshot and make it current."""
+    os.makedirs(root, exist_ok=True)
+    name = f"v{time.time_ns() // 1_000_000}-{os.getpid()}"
+    staging = os.path.join(root, f".{name}.tmp")
+    os.makedirs(staging)
+    for key, array in arrays.items():
+        np.save(os.path.join(staging, f"{key}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump({**meta, 'arrays': sorted(arrays)}, f)
+    os.rename(staging, os.path.join(root, name))
+
+    link = os.path.join(root, f".{CURRENT}.{os.getpid()}.tmp")
+    os.symlink(name, link)
+    os.replace(link, os.path.join(root, CURRENT))
+    _prune(root, keep=name)
+    return os.path.join(root, name)
+
+
+def lock(root):
+    """Block until this process holds the build lock of `root`. Returns the fd for unlock."""
+    os.makedirs(root, exist_ok=True)
+    fd = os.open(os.path.join(root, LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def unlock(fd):
+    # Closing the descriptor releases the flock (it also goes if the process dies)
+    os.close(fd)
+
+
+def load(path):
+    """Map a published snapshot read-only. Returns ({name: memmapped ndarray}, meta)."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    arrays = {
+        key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r', allow_pickle=False)
+        for key in meta['arrays']
+    }
+    return arrays, meta
+
+
+def _prune(root, keep):
+    # Keep the new snapshot and the one before it (a worker may be mid-load of it)
+    versions = sorted(d for d in os.listdir(root) if d.startswith('v') and d != keep)
+    for old in versions[:max(0, len(versions) - (KEEP - 1))]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
@@ -0,0 +1,99 @@
+import re
+import threading
+
+import query_engine
+
+# Named, parameterized statements.
+# Every query the API runs at request/refresh time is registered here once under a
+# fixed name and run by the deployment's query engine (query_engine.py). On Postgres,
+# each pooled asyncpg connection PREPAREs a statement the first time it's used and
+# keeps the prepared handle in the connection's info dict, so Postgres parses/plans it
+# once per connection instead of on every call.
+
+_BIND_RE = re.compile(r"(?<!:):(\w+)")
+
+
+class NamedStatement:
+    """One registered statement plus its execution counters."""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        # :name binds -> $1..$n, in order of first appearance
+        self.param_names = []
+        self.pg_sql = _BIND_RE.sub(self._positional, sql)
+        # One line, for logs (querylog.py)
+        self.normalized = ' '.join(sql.split())
+
+        self.executions = 0
+        self.prepares = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _positional(self, match):
+        name = match.group(1)
+        if name not in self.param_names:
+            self.param_names.append(name)
+        return f"${self.param_names.index(name) + 1}"
+
+    def args(self, params):
+        params = params or {}
+        missing = [p for p in self.param_names if p not in params]
+        if missing:
+            raise ValueError(f"Statement {self.name} is missing params: {', '.join(missing)}")
+        return [params[p] for p in self.param_names]
+
+    def record(self, seconds, prepared):
+        with self._lock:
+            self.executions += 1
+            self.prepares += int(prepared)
+            self.total_seconds += seconds
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "executions": self.executions,
+            "prepares": self.prepares,
+            "reuse_ratio": round(1 - self.prepares / self.executions, 4) if self.executions else None,
+            "avg_ms": round(self.total_seconds / self.executions * 1000, 3) if self.executions else None,
+        }
+
+
+STATEMENTS = {}
+
+
+def register(name, sql):
+    """Register `sql` (SQLAlchemy :name bind style) under `name`. Returns the name."""
+    if name in STATEMENTS and STATEMENTS[name].sql != sql:
+        raise ValueError(f"Statement {name} is already registered with different SQL")
+    STATEMENTS[name] = NamedStatement(name, sql)
+    return name
+
+
+async def execute(name, params=None):
+    """Run a registered statement on the deployment's query engine and return a DataFrame."""
+    statement = STATEMENTS[name]
+    return await query_engine.get().fetch(statement, statement.args(params))
+
+
+async def execute_chunks(name, params=None, chunk_size=50_000):
+    """Run a registered statement through a cursor, yielding DataFrames of at most
+    `chunk_size` rows, so only one chunk of raw records is alive at a time."""
+    statement = STATEMENTS[name]
+    async for chunk in query_engine.get().fetch_chunks(statement, statement.args(params), chunk_size):
+        yield chunk
+
+
+def statement_stats():
+    return [s.stats() for s in STATEMENTS.values()]
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "status": pool.status(),
+    }
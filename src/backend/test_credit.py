@@ -1,116 +1,58 @@
+import numpy as np
 import pandas as pd
-from database import SessionLocal
 
-db = SessionLocal()
-
-start_date = None
-end_date = None
-sql_params = {}
-sales_where_alias = "WHERE s.SalesDate IS NOT NULL"
-purchase_where = "WHERE ReceivingDate IS NOT NULL"
-
-if start_date and end_date:
-    sales_where_alias += f" AND s.SalesDate >= %(start_date)s AND s.SalesDate <= %(end_date)s"
-    purchase_where += f" AND ReceivingDate >= %(start_date)s AND ReceivingDate <= %(end_date)s"
-    sql_params = {"start_date": start_date, "end_date": end_date}
-    
-query = f"""
-    WITH brand_sales AS (
-        SELECT 
-            s.Brand, 
-            MAX(s.Description) AS Description,
-            SUM(s.SalesDollars) AS total_revenue,
-            SUM(s.SalesDollars - (s.SalesQuantity * p.PurchasePrice)) AS gross_profit,
-            AVG(EXTRACT(EPOCH FROM s.SalesDate::timestamp)) AS avg_sales_epoch
-        FROM Sales s
-        LEFT JOIN PurchasePrices p ON s.Brand = p.Brand
-        {sales_where_alias}
-        GROUP BY s.Brand
-    ),
-brand_purchases AS (
-    SELECT 
-        Brand,
-        MAX(Description) AS Description,
-        SUM(PurchasePrice * Quantity) AS total_capital_outlay,
-        AVG(EXTRACT(EPOCH FROM ReceivingDate::timestamp)) AS avg_rec_epoch
-    FROM Purchases
-    {purchase_where}
-    GROUP BY Brand
-)
-SELECT
-    COALESCE(s.Brand, p.Brand) as brand,
-    COALESCE(s.Description, p.Description) as description,
-    COALESCE(s.total_revenue, 0) as total_revenue,
-    COALESCE(s.gross_profit, 0) as gross_profit,
-    COALESCE(p.total_capital_outlay, 0) as total_capital_outlay,
-    (s.avg_sales_epoch - p.avg_rec_epoch) / 86400.0 AS avg_days_to_sell
-FROM brand_sales s
-FULL OUTER JOIN brand_purchases p ON s.Brand = p.Brand
-"""
-
-try:
-    df = pd.read_sql(query, db.bind, params=sql_params)
-    print("SQL execution succeeded!")
-except Exception as e:
-    print(f"SQL Error: {e}")
-    exit(1)
-
-if df.empty:
-    print("DataFrame empty")
-    exit()
-    
-# Clean up days to sell
-df['avg_days_to_sell'] = df['avg_days_to_sell'].fillna(180) # default bad
-df['avg_days_to_sell'] = df['avg_days_to_sell'].apply(lambda x: 180 if x <= 0 else x)
-
-# Normalize inputs
-df['profit_margin'] = df['gross_profit'] / df['total_revenue'].replace(0, 1) # avoid div by zero
-
-# Score for Margin (0 to 200) maxes at 30% margin
-score_margin = (df['profit_margin'] / 0.30).clip(upper=1) * 200
-
-# Score for Days to Sell (0 to 150) maxes at <10 days, 0 at >90 days
-score_days = ((90 - df['avg_days_to_sell']) / 80).clip(lower=0, upper=1) * 150
-
-# Score for scale/revenue (0 to 200) maxes at $10k+ revenue
-score_revenue = (df['total_revenue'] / 10000).clip(upper=1) * 200
-
-try:
-    df['credit_score'] = (300 + score_margin + score_days + score_revenue).fillna(300).astype(int)
-except Exception as e:
-    print(f"Credit Score Calculation Error: {e}")
-    print(score_margin.head())
-    print(score_days.head())
-    print(score_revenue.head())
-    exit()
-    
-# Add a randomizer based on brand ID to make it look "real" but deterministic
-try:
-    df['credit_score'] = df.apply(lambda row: min(850, max(300, row['credit_score'] + (int(str(row['brand'])) % 100) - 50)), axis=1)
-except Exception as e:
-    print(f"Credit Score Randomization Error: {e}")
-    exit()
-    
-# Assess Risk Category
-def get_risk(score):
-    if score >= 700: return "Low Risk"
-    if score >= 600: return "Moderate Risk"
-    return "High Risk"
-
-df['risk_level'] = df['credit_score'].apply(get_risk)
-
-# Suggested Loan Amount: 20% of capital outlay
-df['suggested_loan_amount'] = (df['total_capital_outlay'] * 0.20).clip(lower=500, upper=500000)
-
-# Proposed APR: Scales inversely with score. 850 = 5%, 300 = 24%
-df['proposed_apr'] = 24.0 - ((df['credit_score'] - 300) / 550.0) * 19.0
-
-# Format APR to 1 decimal point
-df['proposed_apr'] = df['proposed_apr'].round(1)
-
-# Select candidates that actually have data
-result = df[df['total_capital_outlay'] > 0].sort_values(by='total_revenue', ascending=False).head(50)
-
-result = result.fillna(0)
-print(result[['brand', 'description', 'total_revenue', 'total_capital_outlay', 'avg_days_to_sell', 'credit_score', 'risk_level', 'suggested_loan_amount', 'proposed_apr']].head(2))
-print("SUCCESS!")
+from credit_scoring import CreditPolicy, score
+
+# Regression check for credit_scoring.py. The expected values were produced by the
+# original row-by-row scoring in routes/credit.py (apply + int(str(brand)) % 100 jitter)
+# and pin today's scores: a rule change has to update them on purpose.
+#
+#   python test_credit.py   (or pytest test_credit.py)
+
+BRANDS = pd.DataFrame({
+    'brand':                [58, 1004, 2389, 3877, 4561, 7150, 9999, 12345, 17, 90631],
+    'description':          ['Wine'] * 10,
+    'total_revenue':        [0.0, 152.4, 9800.0, 25000.0, 1200.0, 48000.0, 5600.5, 310.0, 10000.0, 731.2],
+    'gross_profit':         [0.0, -40.1, 2900.0, 9000.0, 120.0, 1500.0, 1680.15, 310.0, 2999.99, -800.0],
+    'total_capital_outlay': [1800.0, 90.0, 7000.0, 3100000.0, 2600.0, 41000.0, 4000.0, 0.0, 2499.99, 650.0],
+    'avg_days_to_sell':     [np.nan, -3.0, 10.0, 45.5, 90.0, 120.0, 0.0, 9.99, 25.0, 60.25],
+})
+
+EXPECTED = {
+    'avg_days_to_sell': [180.0, 180.0, 10.0, 45.5, 90.0, 120.0, 180.0, 9.99, 25.0, 60.25],
+    'credit_score': [308, 300, 850, 810, 401, 520, 661, 651, 788, 300],
+    'risk_level': ['High Risk', 'High Risk', 'Low Risk', 'Low Risk', 'High Risk',
+                   'High Risk', 'Moderate Risk', 'Moderate Risk', 'Low Risk', 'High Risk'],
+    'suggested_loan_amount': [500.0, 500.0, 1400.0, 500000.0, 520.0, 8200.0, 800.0, 500.0, 500.0, 500.0],
+    'proposed_apr': [23.7, 24.0, 5.0, 6.4, 20.5, 16.4, 11.5, 11.9, 7.1, 24.0],
+}
+
+
+def test_scores_are_pinned():
+    scored = score(BRANDS)
+    for col, expected in EXPECTED.items():
+        assert scored[col].tolist() == expected, f"{col}: {scored[col].tolist()} != {expected}"
+
+
+def test_batch_equals_one_at_a_time():
+    batch = score(BRANDS)
+    for i in range(len(BRANDS)):
+        single = score(BRANDS.iloc[[i]])
+        for col in EXPECTED:
+            assert single[col].iloc[0] == batch[col].iloc[i], (BRANDS['brand'].iloc[i], col)
+
+
+def test_policy_is_configurable():
+    policy = CreditPolicy(jitter_modulus=1, jitter_offset=0, risk_bands=[(800, "Prime")], default_risk="Other", loan_min=0)
+    scored = score(BRANDS, policy)
+    # No jitter: brand 3877 has capped margin and revenue points -> 300 + 200 + 83.4 + 200
+    assert scored['credit_score'].iloc[3] == 783
+    assert set(scored['risk_level']) <= {"Prime", "Other"}
+    assert scored['suggested_loan_amount'].iloc[1] == 18.0
+
+
+if __name__ == "__main__":
+    test_scores_are_pinned()
+    test_batch_equals_one_at_a_time()
+    test_policy_is_configurable()
+    print("SUCCESS!")
@@ -0,0 +1,94 @@
+import asyncio
+import re
+
+import httpx
+
+import main
+import metrics
+
+# Request timing and the Prometheus text at /metrics (metrics.py). Bucket counts are
+# cumulative with inclusive upper bounds (le), _sum/_count add up, and a request
+# through the app is counted once per phase, labelled by its route (unknown paths
+# fold into "unmatched"), with its body size in the bytes histogram. The registry is
+# process-wide, so the app checks look at what changed between two scrapes.
+#
+#   python test_metrics.py   (or pytest test_metrics.py)
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def parse(text):
+    """{(metric, frozenset of label pairs): value} of every sample."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name, labels, value = _SAMPLE.match(line).groups()
+        pairs = frozenset(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or ''))
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+def sample(samples, name, **labels):
+    return samples.get((name, frozenset(labels.items())), 0.0)
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = metrics.Histogram('t_seconds', 'Test.', ['route'], [0.01, 0.1, 1.0])
+    for value in [0.0, 0.01, 0.010001, 0.1, 0.5, 1.0, 7.0]:
+        histogram.observe(('/a',), value)
+    histogram.observe(('/b',), 0.05)
+    samples = parse('\n'.join(histogram.render()))
+
+    assert [sample(samples, 't_seconds_bucket', route='/a', le=le) for le in ['0.01', '0.1', '1.0', '+Inf']] == [2, 4, 6, 7]
+    assert sample(samples, 't_seconds_count', route='/a') == 7
+    assert abs(sample(samples, 't_seconds_sum', route='/a') - 8.620001) < 1e-9
+    assert [sample(samples, 't_seconds_bucket', route='/b', le=le) for le in ['0.01', '0.1', '1.0', '+Inf']] == [0, 1, 1, 1]
+
+
+def test_labels_are_escaped():
+    counter = metrics.Counter('t_total', 'Test.', ['route'])
+    counter.inc(('/a"b\\c\n',), 2)
+    assert counter.render()[-1] == 't_total{route="/a\\"b\\\\c\\n"} 2'
+
+
+def test_requests_land_in_the_route_histograms():
+    async def requests(client):
+        before = (await client.get('/metrics')).text
+        health = [await client.get('/') for _ in range(3)]
+        missing = await client.get('/no/such/path')
+        after = (await client.get('/metrics')).text
+        return before, health, missing, after
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+            return await requests(client)
+
+    before, health, missing, after = asyncio.run(go())
+    before, after = parse(before), parse(after)
+
+    def delta(name, **labels):
+        return sample(after, name, **labels) - sample(before, name, **labels)
+
+    assert delta('vinolytics_requests_total', route='/', method='GET', status='200', cache='') == 3
+    assert delta('vinolytics_requests_total', route='unmatched', method='GET', status='404', cache='') == 1
+    for phase in metrics.PHASES:
+        assert delta('vinolytics_request_phase_seconds_count', route='/', phase=phase) == 3
+        assert delta('vinolytics_request_phase_seconds_bucket', route='/', phase=phase, le='+Inf') == 3
+    # Nothing fetched: all three in the smallest rows bucket
+    assert delta('vinolytics_request_rows_fetched_bucket', route='/', le='1') == 3
+    # The health check body is well under 256 bytes
+    size = len(health[0].content)
+    assert size < 256
+    assert delta('vinolytics_response_bytes_bucket', route='/', le='256') == 3
+    assert delta('vinolytics_response_bytes_sum', route='/') == 3 * size
+    # Every response carries its own phases
+    assert re.search(r'(^|, )total;dur=\d+\.\d\d', health[0].headers['server-timing'])
+    assert 'server-timing' in missing.headers
+
+
+if __name__ == "__main__":
+    test_histogram_buckets_are_cumulative_and_inclusive()
+    test_labels_are_escaped()
+    test_requests_land_in_the_route_histograms()
+    print("SUCCESS!")
@@ -0,0 +1,72 @@
+import base64
+
+import orjson
+import pandas as pd
+from fastapi import HTTPException
+
+from paging import encode_cursor, keyset_page, sort_by_keys
+
+# Keyset pagination in paging.py: walking the pages visits every row once, in order,
+# and a cursor that does not fit the list is a 400, never a 500.
+#
+#   python test_paging.py   (or pytest test_paging.py)
+
+ORDER = [('total_revenue', False)]
+
+RANKED = sort_by_keys(pd.DataFrame({
+    'brand':         [58, 1004, 2389, 3877, 4561, 7150, 9999],
+    'description':   ['Wine'] * 7,
+    'total_revenue': [10.5, 300.0, 300.0, 0.0, 42.0, 300.0, 7.25],
+}), ORDER)
+
+
+def cursor_of(values):
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip('=')
+
+
+def invalid(cursor):
+    try:
+        keyset_page(RANKED, ORDER, cursor, 2)
+    except HTTPException as e:
+        return e.status_code == 400 and e.detail == "Invalid cursor"
+    return False
+
+
+def test_pages_cover_the_list_once():
+    seen, cursor = [], None
+    while True:
+        page, cursor = keyset_page(RANKED, ORDER, cursor, 2)
+        seen += page['brand'].tolist()
+        if cursor is None:
+            break
+    assert seen == RANKED['brand'].tolist() == [1004, 2389, 7150, 4561, 58, 9999, 3877]
+
+
+def test_cursor_resumes_after_a_tie():
+    page, _ = keyset_page(RANKED, ORDER, encode_cursor([300.0, 2389]), 10)
+    assert page['brand'].tolist() == [7150, 4561, 58, 9999, 3877]
+
+
+def test_malformed_cursor_is_400():
+    assert invalid('not a cursor!')
+    assert invalid(cursor_of({'total_revenue': 1}))
+    assert invalid(cursor_of([300.0]))
+    assert invalid(cursor_of([300.0, 2389, 1]))
+
+
+def test_mistyped_cursor_is_400():
+    # ["x", 1]: a string against the revenue column
+    assert cursor_of(['x', 1]) == 'WyJ4IiwxXQ'
+    assert invalid('WyJ4IiwxXQ')
+    assert invalid(cursor_of([300.0, '2389']))
+    assert invalid(cursor_of([None, 2389]))
+    assert invalid(cursor_of([True, 2389]))
+    assert not invalid(cursor_of([300, 2389]))
+
+
+if __name__ == "__main__":
+    test_pages_cover_the_list_once()
+    test_cursor_resumes_after_a_tie()
+    test_malformed_cursor_is_400()
+    test_mistyped_cursor_is_400()
+    print("SUCCESS!")
@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import datetime
+import random
+
+import querylog
+from settings import settings
+from statements import NamedStatement
+
+# The statement log in querylog.py: which executions count as slow, and which of those
+# get their plan captured. Capture is sampled (slow_query_explain_rate), at most one
+# per statement per slow_query_explain_interval and never two at once per statement.
+# The engine is a stand-in that counts EXPLAIN re-runs, no database needed.
+#
+#   python test_querylog.py   (or pytest test_querylog.py)
+
+PLAN = [{
+    'Plan': {
+        'Node Type': 'Hash Join', 'Plan Rows': 10, 'Actual Rows': 4000, 'Actual Loops': 1, 'Shared Hit Blocks': 7,
+        'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'sales', 'Plan Rows': 50000, 'Actual Rows': 60000, 'Actual Loops': 1},
+            {'Node Type': 'Index Scan', 'Relation Name': 'purchases', 'Plan Rows': 20, 'Actual Rows': 20, 'Actual Loops': 1},
+        ],
+    },
+    'Planning Time': 0.2,
+    'Execution Time': 812.5,
+}]
+
+
+class FakeEngine:
+    name = 'postgres'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.explains = 0
+
+    async def explain(self, statement, args):
+        self.explains += 1
+        await asyncio.sleep(self.delay)
+        return PLAN
+
+
+@contextlib.contextmanager
+def configured(**values):
+    old = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    querylog.clear()
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            setattr(settings, name, value)
+        querylog.clear()
+
+
+async def settle():
+    # Let the background captures finish
+    while querylog._tasks:
+        await asyncio.gather(*list(querylog._tasks))
+
+
+def statement(name):
+    return NamedStatement(name, "SELECT brand FROM sales WHERE salesdate >= :start_date AND brand = ANY(:brands)")
+
+
+ARGS = [datetime.date(2016, 1, 1), list(range(25))]
+
+
+def test_threshold_splits_recent_and_slow():
+    async def run():
+        engine, stmt = FakeEngine(), statement('t_threshold')
+        querylog.observe(engine, stmt, ARGS, 0.4999)
+        querylog.observe(engine, stmt, ARGS, 0.5)
+        querylog.observe(engine, stmt, ARGS, 2.0)
+        await settle()
+        return engine
+
+    with configured(slow_query_ms=500.0, slow_query_explain_rate=0.0):
+        engine = asyncio.run(run())
+        assert [r['duration_ms'] for r in querylog.recent()] == [2000.0, 500.0, 499.9]
+        slow = querylog.slow()
+        assert [r['duration_ms'] for r in slow] == [2000.0, 500.0]
+        assert all(r['plan_status'] == 'not sampled' for r in slow) and engine.explains == 0
+        params = slow[0]['params']
+        assert params['start_date'] == '2016-01-01'
+        assert params['brands'] == list(range(querylog.MAX_PARAM_ITEMS)) + ['... 5 more']
+
+
+def test_capture_is_rate_limited_per_statement():
+    async def run():
+        engine, stmt = FakeEngine(), statement('t_rate_limited')
+        for _ in range(3):
+            querylog.observe(engine, stmt, ARGS, 1.0)
+            await settle()
+        # Another statement has its own budget
+        querylog.observe(engine, statement('t_other'), ARGS, 1.0)
+        await settle()
+        return engine
+
+    with configured(slow_query_ms=500.0, slow_query_explain_rate=1.0, slow_query_explain_interval=3600.0):
+        engine = asyncio.run(run())
+        assert engine.explains == 2
+        statuses = [(r['statement'], r['plan_status']) for r in reversed(querylog.slow())]
+        assert statuses == [
+            ('t_rate_limited', 'captured'), ('t_rate_limited', 'not sampled'),
+            ('t_rate_limited', 'not sampled'), ('t_other', 'captured'),
+        ]
+        summary = querylog.slow(plans=False)[-1]
+        assert 'plan' not in summary
+        assert summary['plan_summary']['seq_scans'] == [{'relation': 'sales', 'rows': 60000}]
+        assert summary['plan_summary']['worst_estimate']['node'] == 'Hash Join'
+        assert summary['plan_summary']['execution_ms'] == 812.5
+
+
+def test_one_capture_at_a_time_per_statement():
+    async def run():
+        engine, stmt = FakeEngine(delay=0.05), statement('t_one_at_a_time')
+        # Both slow while the first plan is still running: only the first is re-run
+        querylog.observe(engine, stmt, ARGS, 1.0)
+        querylog.observe(engine, stmt, ARGS, 1.0)
+        await settle()
+        querylog.observe(engine, stmt, ARGS, 1.0)
+        await settle()
+        return engine
+
+    with configured(slow_query_ms=500.0, slow_query_explain_rate=1.0, slow_query_explain_interval=0.0):
+        engine = asyncio.run(run())
+        assert engine.explains == 2
+        assert [r['plan_status'] for r in reversed(querylog.slow())] == ['captured', 'not sampled', 'captured']
+
+
+def test_sampling_rate():
+    async def run():
+        engine, stmt = FakeEngine(), statement('t_sampled')
+        for _ in range(2000):
+            querylog.observe(engine, stmt, ARGS, 1.0)
+            await settle()
+        return engine
+
+    random.seed(5)
+    with configured(slow_query_ms=500.0, slow_query_explain_rate=0.1, slow_query_explain_interval=0.0):
+        engine = asyncio.run(run())
+        # Binomial(2000, 0.1): 200 +- 4.5 standard deviations
+        assert 140 <= engine.explains <= 260
+
+
+if __name__ == "__main__":
+    test_threshold_splits_recent_and_slow()
+    test_capture_is_rate_limited_per_statement()
+    test_one_capture_at_a_time_per_statement()
+    test_sampling_rate()
+    print("SUCCESS!")
@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+import pandas as pd
+
+import main
+import rollups
+from response_cache import response_cache
+from rollups import RollupStore
+
+# The response cache in main.py / response_cache.py, through the whole app: a repeat
+# GET is a HIT with the same ETag, If-None-Match revalidates to a 304, query param
+# order and the Accept format pick the entry, and swapping in new rollups (what
+# POST /api/refresh-rollups does) changes data_version so nothing older is served.
+# The rollups are built from small frames, no database needed.
+#
+#   python test_response_cache.py   (or pytest test_response_cache.py)
+
+ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def store_of(sales):
+    """A RollupStore over (brand, day, sales_dollars) rows, every other measure trivial."""
+    sales = pd.DataFrame(sales, columns=['brand', 'day', 'sales_dollars'])
+    sales = sales.assign(
+        description='Wine', sales_quantity=1, excise_tax=0.0, excise_tax_count=1,
+        sales_price_sum=sales['sales_dollars'], sales_price_count=1, row_count=1,
+    )
+    brands = sales[['brand']].drop_duplicates()
+    return RollupStore(
+        sales,
+        pd.DataFrame(columns=['brand', 'day', 'capital_outlay', 'capital_count', 'row_count']),
+        pd.DataFrame(columns=['brand', 'day', 'lead_time_count', 'lead_time_sum', 'lead_time_sq']),
+        brands.assign(purchase_count=1, purchase_description='Wine', avg_purchase_price=1.0, avg_freight_per_unit=0.0),
+        brands.assign(purchase_price=1.0),
+        brands.assign(current_on_hand=0.0),
+    )
+
+
+BEFORE = store_of([(100, '2016-01-01', 900.0), (200, '2016-01-01', 80.0), (300, '2016-01-02', 20.0)])
+AFTER = store_of([(100, '2016-01-01', 900.0), (200, '2016-01-01', 80.0), (300, '2016-01-02', 520.0)])
+
+
+def run(requests):
+    """Swap in BEFORE with an empty cache, then await `requests(client)`."""
+    async def go():
+        rollups._swap(BEFORE)
+        response_cache.clear()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+            return await requests(client)
+    return asyncio.run(go())
+
+
+def test_repeat_get_hits_and_revalidates():
+    async def requests(client):
+        first = await client.get('/api/abc-summary')
+        second = await client.get('/api/abc-summary')
+        revalidated = await client.get('/api/abc-summary', headers={'If-None-Match': first.headers['etag']})
+        weak = await client.get('/api/abc-summary', headers={'If-None-Match': f'"nope", W/{first.headers["etag"]}'})
+        stale = await client.get('/api/abc-summary', headers={'If-None-Match': '"nope"'})
+        return first, second, revalidated, weak, stale
+
+    first, second, revalidated, weak, stale = run(requests)
+    assert (first.status_code, first.headers['x-cache']) == (200, 'MISS')
+    assert (second.status_code, second.headers['x-cache']) == (200, 'HIT')
+    assert second.headers['etag'] == first.headers['etag'] and second.content == first.content
+    assert revalidated.status_code == 304 and revalidated.content == b''
+    assert revalidated.headers['etag'] == first.headers['etag']
+    assert weak.status_code == 304
+    assert stale.status_code == 200 and stale.content == first.content
+
+
+def test_key_normalizes_params_and_splits_formats():
+    async def requests(client):
+        a = await client.get('/api/abc-summary?start_date=2016-01-01&end_date=2016-01-31')
+        b = await client.get('/api/abc-summary?end_date=2016-01-31&start_date=2016-01-01&brand=')
+        arrow = await client.get('/api/abc-summary?start_date=2016-01-01&end_date=2016-01-31', headers={'Accept': ARROW})
+        arrow_again = await client.get('/api/abc-summary?start_date=2016-01-01&end_date=2016-01-31', headers={'Accept': ARROW})
+        return a, b, arrow, arrow_again
+
+    a, b, arrow, arrow_again = run(requests)
+    assert (a.headers['x-cache'], b.headers['x-cache']) == ('MISS', 'HIT')
+    assert (arrow.headers['x-cache'], arrow_again.headers['x-cache']) == ('MISS', 'HIT')
+    assert arrow.headers['content-type'] == ARROW and a.headers['content-type'] == 'application/json'
+    assert arrow.headers['etag'] != a.headers['etag']
+    assert 'Accept' in a.headers['vary'] and 'Accept' in arrow.headers['vary']
+
+
+def test_new_data_version_invalidates():
+    async def requests(client):
+        first = await client.get('/api/abc-summary')
+        version = rollups.data_version()
+        rollups._swap(AFTER)
+        after = await client.get('/api/abc-summary', headers={'If-None-Match': first.headers['etag']})
+        again = await client.get('/api/abc-summary', headers={'If-None-Match': after.headers['etag']})
+        return first, version, after, again
+
+    first, version, after, again = run(requests)
+    assert rollups.data_version() == version + 1
+    # The old ETag no longer matches: a full 200 with the new numbers, cached afresh
+    assert (after.status_code, after.headers['x-cache']) == (200, 'MISS')
+    assert after.headers['etag'] != first.headers['etag']
+    assert after.json() != first.json()
+    assert (again.status_code, again.headers['x-cache']) == (304, 'HIT')
+
+
+if __name__ == "__main__":
+    test_repeat_get_hits_and_revalidates()
+    test_key_normalizes_params_and_splits_formats()
+    test_new_data_version_invalidates()
+    print("SUCCESS!")
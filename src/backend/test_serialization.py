@@ -0,0 +1,96 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from starlette.requests import Request
+
+import paging
+import serialization
+
+# Response encoding in serialization.py. JSON has to carry every float exactly as
+# json.dumps would (shortest round-trip form, nothing rounded or padded), with NaN / inf
+# as null. Arrow and Parquet, picked from the Accept header, have to decode back to the
+# frame the route returned, with the scalars next to it in the schema metadata.
+#
+#   python test_serialization.py   (or pytest test_serialization.py)
+
+FRAME = pd.DataFrame({
+    'brand':         [58, 1004, 2389, 3877],
+    'description':   ['Wine', None, 'Wine "Reserve"', 'Vin rosé'],
+    'total_revenue': [9348557.66, 0.1 + 0.2, 1 / 3, 123456789.123456],
+    'margin_pct':    [np.nan, np.inf, 1e-12, -2.5e20],
+})
+
+EXPECTED = [
+    {'brand': 58, 'description': 'Wine', 'total_revenue': 9348557.66, 'margin_pct': None},
+    {'brand': 1004, 'description': None, 'total_revenue': 0.30000000000000004, 'margin_pct': None},
+    {'brand': 2389, 'description': 'Wine "Reserve"', 'total_revenue': 1 / 3, 'margin_pct': 1e-12},
+    {'brand': 3877, 'description': 'Vin rosé', 'total_revenue': 123456789.123456, 'margin_pct': -2.5e20},
+]
+
+
+def test_floats_round_trip_exactly():
+    body = serialization.frame_json(FRAME)
+    assert b'9348557.66,' in body and b'0.30000000000000004' in body
+    assert json.loads(body) == EXPECTED
+
+
+def test_envelope_and_export_use_the_same_encoding():
+    body = serialization.encode_json({'items': FRAME, 'next_cursor': None})
+    assert json.loads(body) == {'items': EXPECTED, 'next_cursor': None}
+    lines = paging.encode_chunk(FRAME, 'ndjson', True).decode().splitlines()
+    assert [json.loads(line) for line in lines] == EXPECTED
+
+
+def test_accept_header_picks_the_format():
+    assert serialization.negotiate(None) == 'json'
+    assert serialization.negotiate('*/*') == 'json'
+    assert serialization.negotiate('application/vnd.apache.arrow.stream') == 'arrow'
+    assert serialization.negotiate('application/vnd.apache.arrow.file') == 'arrow'
+    assert serialization.negotiate('application/x-parquet') == 'parquet'
+    assert serialization.negotiate('application/json;q=0.9, application/vnd.apache.parquet') == 'parquet'
+    assert serialization.negotiate('application/vnd.apache.parquet;q=0.5, application/json') == 'json'
+    assert serialization.negotiate('application/vnd.apache.arrow.stream;q=oops, application/json;q=0.1') == 'json'
+
+
+def test_arrow_round_trip():
+    body, media_type = serialization.encode({'brand_name': 'Wine', 'forecast': FRAME}, 'arrow')
+    assert media_type == serialization.ARROW
+    table = pa.ipc.open_stream(body).read_all()
+    pd.testing.assert_frame_equal(table.to_pandas(), FRAME, check_dtype=False)
+    assert json.loads(table.schema.metadata[b'brand_name']) == 'Wine'
+
+
+def test_parquet_round_trip():
+    body, media_type = serialization.encode(FRAME, 'parquet')
+    assert media_type == serialization.PARQUET
+    pd.testing.assert_frame_equal(pq.read_table(io.BytesIO(body)).to_pandas(), FRAME, check_dtype=False)
+
+
+def test_response_carries_the_negotiated_type():
+    request = Request({'type': 'http', 'headers': [(b'accept', b'application/vnd.apache.arrow.stream')]})
+    response = serialization.frame_response(request, FRAME)
+    assert response.headers['content-type'] == serialization.ARROW
+    assert response.headers['vary'] == 'Accept'
+    pd.testing.assert_frame_equal(pa.ipc.open_stream(response.body).read_all().to_pandas(), FRAME, check_dtype=False)
+
+
+def test_non_tabular_payloads_stay_json():
+    # Two frames (the dashboard) are not one table
+    body, media_type = serialization.encode({'a': FRAME, 'b': FRAME}, 'arrow')
+    assert media_type == serialization.JSON
+    assert json.loads(body) == {'a': EXPECTED, 'b': EXPECTED}
+
+
+if __name__ == "__main__":
+    test_floats_round_trip_exactly()
+    test_envelope_and_export_use_the_same_encoding()
+    test_accept_header_picks_the_format()
+    test_arrow_round_trip()
+    test_parquet_round_trip()
+    test_response_carries_the_negotiated_type()
+    test_non_tabular_payloads_stay_json()
+    print("SUCCESS!")
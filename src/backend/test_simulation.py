@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+import simulation
+
+# Monte Carlo safety stock in simulation.py. With a fixed lead time L the demand over it
+# is exactly N(mu_d * L, sd_d^2 * L), so the simulation has to land on the closed-form
+# normal answer; and the draws only depend on the seed and the chunk size, never on how
+# many threads run the chunks.
+#
+#   python test_simulation.py   (or pytest test_simulation.py)
+
+BRANDS = pd.DataFrame({
+    'avg_daily_demand':  [4.0, 0.5, 12.0, 2.0, 0.0],
+    'std_dev_demand':    [2.0, 0.7, 3.0, 0.0, 0.0],
+    'avg_lead_time':     [9.0, 14.0, 4.0, 10.0, 7.0],
+    'std_dev_lead_time': [0.0, 0.0, 0.0, 0.0, 0.0],
+}, index=[58, 1004, 2389, 3877, 4561])
+
+Z = ndtri(0.95)
+
+
+def closed_form(df):
+    """Safety stock at 95% for a fixed lead time, in the units the simulation reports."""
+    return np.ceil(Z * df['std_dev_demand'] * np.sqrt(df['avg_lead_time'])).astype(int)
+
+
+def test_fixed_lead_time_matches_the_normal_answer():
+    df = BRANDS.assign(safety_stock=closed_form(BRANDS))
+    sim = simulation.simulate(df, scenarios=40000, seed=7)
+    assert list(sim.columns) == simulation.OUTPUTS and sim.index.equals(df.index)
+    # Off by at most the one unit a ceil of a sampled quantile can add or drop
+    assert (np.abs(sim['simulated_safety_stock'] - df['safety_stock']) <= 1).all()
+    uncertain = df['std_dev_demand'] > 0
+    # The whole-unit reorder point overshoots 95% a little: P(D <= rop) exactly
+    rop = np.ceil(df['avg_daily_demand'] * df['avg_lead_time'] + df['safety_stock'])
+    spread = df['std_dev_demand'] * np.sqrt(df['avg_lead_time'])
+    expected = ndtr((rop - df['avg_daily_demand'] * df['avg_lead_time']) / spread)
+    np.testing.assert_allclose(sim['achieved_service_level'][uncertain], expected[uncertain], atol=0.005)
+    # No demand spread: the reorder point always covers the cycle
+    assert (sim['achieved_service_level'][~uncertain] == 1.0).all()
+    assert (sim['expected_shortage_units'][~uncertain] == 0.0).all()
+    np.testing.assert_allclose(sim['stockout_probability'], 1 - sim['achieved_service_level'])
+    # Without lead-time spread a lead-time shock changes nothing
+    assert sim['shock_safety_stock'].tolist() == sim['simulated_safety_stock'].tolist()
+
+
+def test_lead_time_shock_needs_more_stock():
+    df = BRANDS.assign(std_dev_lead_time=3.0, safety_stock=5)
+    sim = simulation.simulate(df, shock=2.0, scenarios=20000, seed=7)
+    moving = df['avg_daily_demand'] > 0
+    assert (sim['shock_safety_stock'][moving] > sim['simulated_safety_stock'][moving]).all()
+    assert (sim['shock_service_level'][moving] < sim['achieved_service_level'][moving]).all()
+
+
+def test_results_depend_on_seed_and_chunks_only():
+    df = BRANDS.assign(std_dev_lead_time=2.0, safety_stock=closed_form(BRANDS))
+    one = simulation.simulate(df, scenarios=5000, seed=3, workers=1, max_cells=10000)
+    many = simulation.simulate(df, scenarios=5000, seed=3, workers=4, max_cells=10000)
+    pd.testing.assert_frame_equal(one, many)
+    other_seed = simulation.simulate(df, scenarios=5000, seed=4, workers=1, max_cells=10000)
+    assert not one.equals(other_seed)
+
+
+def test_no_brands():
+    sim = simulation.simulate(BRANDS.iloc[:0].assign(safety_stock=0))
+    assert sim.empty and list(sim.columns) == simulation.OUTPUTS
+
+
+if __name__ == "__main__":
+    test_fixed_lead_time_matches_the_normal_answer()
+    test_lead_time_shock_needs_more_stock()
+    test_results_depend_on_seed_and_chunks_only()
+    test_no_brands()
+    print("SUCCESS!")
@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+import rollups
+from rollups import RollupStore
+from settings import settings
+from test_whatif import random_store
+
+# Rollup builds with and without ROLLUP_SNAPSHOT_DIR (rollups.py, snapshot.py). Workers
+# starting together on an empty snapshot dir build once: the rest wait on the build
+# lock and map what the first one published. Refreshes in one worker run one at a
+# time. The database build is replaced by a slow one over seeded random frames, and
+# the workers are forked processes.
+#
+#   python test_snapshot.py   (or pytest test_snapshot.py)
+
+BUILD_SECONDS = 0.3
+
+
+@contextlib.contextmanager
+def slow_builds(snapshot_dir, log_path):
+    """Every RollupStore build sleeps, then appends 'start end' to `log_path`."""
+    async def build(cls):
+        started = time.monotonic()
+        await asyncio.sleep(BUILD_SECONDS)
+        with open(log_path, 'a') as f:
+            f.write(f"{started} {time.monotonic()}\n")
+        return random_store()
+
+    old_build, old_dir = RollupStore.__dict__['from_async_engine'], settings.rollup_snapshot_dir
+    RollupStore.from_async_engine = classmethod(build)
+    settings.rollup_snapshot_dir = snapshot_dir
+    rollups._store, rollups._store_path, rollups._store_lock = None, None, asyncio.Lock()
+    try:
+        yield
+    finally:
+        RollupStore.from_async_engine = old_build
+        settings.rollup_snapshot_dir = old_dir
+        rollups._store, rollups._store_path = None, None
+
+
+def builds(log_path):
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        return [tuple(map(float, line.split())) for line in f]
+
+
+def worker(snapshot_dir, log_path, barrier, results):
+    with slow_builds(snapshot_dir, log_path):
+        barrier.wait()
+        store = asyncio.run(rollups.get_rollups())
+        results.put((rollups._store_path, int(len(store.brands))))
+
+
+def test_workers_starting_together_build_once():
+    root = tempfile.mkdtemp(prefix='vinolytics_snapshot_')
+    snapshot_dir, log_path = os.path.join(root, 'rollups'), os.path.join(root, 'builds.log')
+    context = multiprocessing.get_context('fork')
+    barrier, results = context.Barrier(4), context.Queue()
+    processes = [context.Process(target=worker, args=(snapshot_dir, log_path, barrier, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    mapped = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    assert len(builds(log_path)) == 1
+    # Everyone serves the one published snapshot
+    assert {path for path, _ in mapped} == {rollups.snapshot.current(snapshot_dir)}
+    assert {brands for _, brands in mapped} == {len(random_store().brands)}
+
+
+def test_refreshes_run_one_at_a_time():
+    log_path = os.path.join(tempfile.mkdtemp(prefix='vinolytics_snapshot_'), 'builds.log')
+
+    async def run():
+        return await asyncio.gather(*[rollups.refresh_rollups('full') for _ in range(3)])
+
+    with slow_builds(None, log_path):
+        version = rollups.data_version()
+        stores = asyncio.run(run())
+        assert rollups.data_version() == version + 3
+        assert stores[-1] is rollups._store
+
+    spans = sorted(builds(log_path))
+    assert len(spans) == 3
+    # Each build starts after the previous one finished
+    assert all(start >= end for (_, end), (start, _) in zip(spans, spans[1:]))
+
+
+if __name__ == "__main__":
+    test_workers_starting_together_build_once()
+    test_refreshes_run_one_at_a_time()
+    print("SUCCESS!")
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+import whatif
+from paging import sort_by_keys
+from rollups import AnalyticsContext, RollupStore
+from routes.inventory import safety_stock_inputs, safety_stock_simulation
+
+# The what-if grid in whatif.py against the analytic safety stock panel
+# (routes/inventory.py). At the panel's own point (0.95, 1.5, 2.50) the grid has to
+# return the panel's rows; every other grid point has to equal the same formulas run
+# for that point alone, with ties broken by brand. The rollups are built from seeded
+# random frames, no database needed.
+#
+#   python test_whatif.py   (or pytest test_whatif.py)
+
+PANEL_COLUMNS = ['brand', 'description', 'total_volume', 'safety_stock', 'shock_safety_stock', 'additional_capital_tied_up']
+
+SERVICE_LEVELS = [0.99, 0.8, 0.95]
+SHOCKS = [2.0, 1.0, 1.5, 0.0]
+HOLDING_COSTS = [2.5, 0.75]
+
+
+def random_store(seed=11, n_brands=60, n_days=90):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2016-01-01', periods=n_days).date
+    cells = pd.MultiIndex.from_product([np.arange(1, n_brands + 1) * 10, days], names=['brand', 'day'])
+    sales = pd.DataFrame(index=cells).reset_index().sample(frac=0.4, random_state=seed)
+    sales['sales_quantity'] = rng.integers(1, 40, len(sales)).astype(float)
+    # Brands 30 and 40 sell exactly alike (and have no lead times), so they tie everywhere
+    twin = sales[sales['brand'] == 30].assign(brand=40)
+    sales = pd.concat([sales[sales['brand'] != 40], twin], ignore_index=True)
+    sales = sales.assign(
+        description='Wine ' + sales['brand'].astype(str), sales_dollars=sales['sales_quantity'] * 12.0,
+        excise_tax=0.0, excise_tax_count=1, sales_price_sum=12.0, sales_price_count=1, row_count=1,
+    )
+
+    ordered = pd.DataFrame(index=cells).reset_index().sample(frac=0.05, random_state=seed + 1)
+    ordered = ordered[~ordered['brand'].isin([30, 40, 70])]
+    lead_times = rng.integers(2, 30, (len(ordered), 3)).astype(float)
+    ordered['lead_time_count'] = 3
+    ordered['lead_time_sum'] = lead_times.sum(axis=1)
+    ordered['lead_time_sq'] = (lead_times ** 2).sum(axis=1)
+
+    brands = pd.DataFrame({'brand': np.arange(1, n_brands + 1) * 10})
+    return RollupStore(
+        sales,
+        pd.DataFrame(columns=['brand', 'day', 'capital_outlay', 'capital_count', 'row_count']),
+        ordered,
+        brands.assign(purchase_count=1, purchase_description='Wine', avg_purchase_price=10.0, avg_freight_per_unit=0.0),
+        brands.assign(purchase_price=10.0),
+        brands.assign(current_on_hand=0.0),
+    )
+
+
+def single_point(ctx, service_level, shock, holding_cost, limit=10):
+    """The panel's formulas for one (service level, shock, holding cost)."""
+    df = safety_stock_inputs(ctx)
+    z = whatif.z_scores(service_level)
+    variance_lead_time = df['avg_daily_demand'] ** 2 * df['std_dev_lead_time'] ** 2
+    df['safety_stock'] = np.ceil((z * np.sqrt(df['variance_demand_term'] + variance_lead_time)).fillna(0)).astype(int)
+    shocked = df['avg_daily_demand'] ** 2 * (df['std_dev_lead_time'] * shock) ** 2
+    df['shock_safety_stock'] = np.ceil((z * np.sqrt(df['variance_demand_term'] + shocked)).fillna(0)).astype(int)
+    df['additional_capital_tied_up'] = (df['shock_safety_stock'] - df['safety_stock']).clip(lower=0) * holding_cost
+    total = df['additional_capital_tied_up'].sum()
+    return sort_by_keys(df, [('additional_capital_tied_up', False)]).head(limit)[PANEL_COLUMNS], total
+
+
+def test_panel_point_matches_the_panel():
+    ctx = AnalyticsContext(random_store())
+    panel = safety_stock_simulation(ctx).reset_index(drop=True)
+    grid = whatif.evaluate(whatif.Moments(safety_stock_inputs(ctx)), [0.95], [1.5], [2.5])
+    pd.testing.assert_frame_equal(grid[PANEL_COLUMNS], panel, check_dtype=False)
+    # 110, 280 and 410 tie on additional capital and come out in brand order
+    assert panel['brand'].tolist()[4:7] == [110, 280, 410]
+    assert panel['additional_capital_tied_up'].iloc[4] == panel['additional_capital_tied_up'].iloc[6]
+
+
+def test_grid_matches_each_point_alone():
+    for start_date, end_date in [(None, None), ('2016-02-01', '2016-02-29')]:
+        ctx = AnalyticsContext(random_store(), start_date, end_date)
+        moments = whatif.Moments(safety_stock_inputs(ctx))
+        grid = whatif.evaluate(moments, SERVICE_LEVELS, SHOCKS, HOLDING_COSTS, limit=15)
+        points = grid.groupby(['service_level', 'shock_multiplier', 'holding_cost'], sort=False)
+        assert points.ngroups == len(SERVICE_LEVELS) * len(SHOCKS) * len(HOLDING_COSTS)
+        # Grid values come back sorted ascending
+        assert grid['service_level'].is_monotonic_increasing
+        for (service_level, shock, holding_cost), rows in points:
+            expected, total = single_point(ctx, service_level, shock, holding_cost, limit=15)
+            assert rows['rank'].tolist() == list(range(1, len(expected) + 1))
+            pd.testing.assert_frame_equal(
+                rows[PANEL_COLUMNS].reset_index(drop=True), expected.reset_index(drop=True),
+                check_dtype=False, obj=f"{service_level} x {shock} x {holding_cost}",
+            )
+            np.testing.assert_allclose(rows['total_additional_capital_tied_up'], total)
+            alone = whatif.evaluate(moments, [service_level], [shock], [holding_cost], limit=15)
+            pd.testing.assert_frame_equal(alone.reset_index(drop=True), rows.reset_index(drop=True))
+
+
+def test_moments_are_kept_per_store_and_range():
+    store = random_store()
+    calls = []
+
+    def prepare(ctx):
+        calls.append((ctx.start_date, ctx.end_date))
+        return safety_stock_inputs(ctx)
+
+    first = whatif.moments(AnalyticsContext(store), prepare)
+    assert whatif.moments(AnalyticsContext(store), prepare) is first
+    whatif.moments(AnalyticsContext(store, '2016-02-01', '2016-02-29'), prepare)
+    # New rollups: everything is prepared again
+    assert whatif.moments(AnalyticsContext(random_store()), prepare) is not first
+    assert calls == [(None, None), ('2016-02-01', '2016-02-29'), (None, None)]
+
+
+if __name__ == "__main__":
+    test_panel_point_matches_the_panel()
+    test_grid_matches_each_point_alone()
+    test_moments_are_kept_per_store_and_range()
+    print("SUCCESS!")
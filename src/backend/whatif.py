@@ -0,0 +1,111 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# What-if re-evaluation of the safety stock panel (/api/safety-stock-simulation/what-if).
+# The per-brand demand and lead-time moments only depend on the rollups and the date
+# range, so they are prepared once per (rollups, range) and kept. Every call after that
+# is array arithmetic over them for a grid of service levels x shock multipliers x
+# holding costs: safety stock is (levels, brands), the shocked one (levels, shocks,
+# brands), and the holding cost only scales capital, so it never widens the arrays.
+
+COLUMNS = [
+    'service_level', 'shock_multiplier', 'holding_cost', 'rank',
+    'brand', 'description', 'total_volume', 'safety_stock', 'shock_safety_stock',
+    'additional_capital_tied_up', 'total_additional_capital_tied_up',
+]
+
+
+def z_scores(service_levels):
+    """Standard normal quantiles, the exact values of scipy.stats.norm.ppf. Imported on
+    first use: scipy.stats alone was a third of the API's import time."""
+    from scipy.special import ndtri
+
+    return ndtri(service_levels)
+
+
+class Moments:
+    """Per-brand inputs of the safety stock formulas, as plain arrays."""
+
+    def __init__(self, inputs):
+        self.brand = inputs['brand'].to_numpy()
+        self.description = inputs['description'].to_numpy()
+        self.total_volume = inputs['total_volume'].to_numpy()
+        # NaN inputs would give NaN stock, which the panel reports as 0
+        self.variance_demand_term = np.nan_to_num(inputs['variance_demand_term'].to_numpy(dtype=np.float64))
+        self.avg_daily_demand_sq = np.nan_to_num(inputs['avg_daily_demand'].to_numpy(dtype=np.float64) ** 2)
+        self.std_dev_lead_time = np.nan_to_num(inputs['std_dev_lead_time'].to_numpy(dtype=np.float64))
+        # n-1 for the lowest brand number down to 0 for the highest
+        self.tiebreak = len(self.brand) - 1 - np.argsort(np.argsort(self.brand, kind='stable'))
+
+
+_cache = {}
+_cache_store = None
+_cache_lock = threading.Lock()
+
+
+def moments(ctx, prepare):
+    """Moments for ctx's rollups and date range; `prepare(ctx)` builds the input frame
+    on a miss. Entries for older rollups are dropped when the store changes."""
+    global _cache_store
+    key = (ctx.start_date, ctx.end_date)
+    with _cache_lock:
+        if _cache_store is not ctx.store:
+            _cache.clear()
+            _cache_store = ctx.store
+        if key not in _cache:
+            _cache[key] = Moments(prepare(ctx))
+        return _cache[key]
+
+
+def evaluate(m, service_levels, shocks, holding_costs, limit=10):
+    """Top `limit` brands by additional capital for every grid point, one row per
+    (grid point, brand), grid values sorted ascending. Same numbers as the analytic
+    panel at (0.95, 1.5, 2.50)."""
+    service_levels = np.unique(np.asarray(service_levels, dtype=np.float64))
+    shocks = np.unique(np.asarray(shocks, dtype=np.float64))
+    holding_costs = np.unique(np.asarray(holding_costs, dtype=np.float64))
+    n = len(m.brand)
+    k = min(limit, n)
+    if k == 0:
+        return pd.DataFrame(columns=COLUMNS)
+
+    # Whole units, kept in float64 (exact far beyond any stock level) to skip int casts
+    z = z_scores(service_levels)[:, None]
+    safety_stock = np.ceil(z * np.sqrt(m.variance_demand_term + m.avg_daily_demand_sq * m.std_dev_lead_time ** 2))
+    shocked_term = m.avg_daily_demand_sq * (m.std_dev_lead_time * shocks[:, None]) ** 2
+    shock_safety_stock = np.sqrt(m.variance_demand_term + shocked_term) * z[:, :, None]
+    np.ceil(shock_safety_stock, out=shock_safety_stock)
+    additional_units = shock_safety_stock - safety_stock[:, None, :]
+    np.maximum(additional_units, 0, out=additional_units)
+
+    # Rank by units (the holding cost is a common factor), ties by brand: one unique
+    # key per brand, so a partial sort finds the top k and only those get sorted
+    key = additional_units * n
+    key += m.tiebreak
+    order = np.argpartition(key, n - k, axis=-1)[..., n - k:] if k < n else np.broadcast_to(np.arange(n), key.shape)
+    order = np.take_along_axis(order, np.argsort(-np.take_along_axis(key, order, axis=-1), axis=-1), axis=-1)
+    grid = (len(service_levels), len(shocks), len(holding_costs), k)
+
+    def top(values):
+        # (levels, shocks, brands) -> the top k, repeated over the holding costs
+        return np.broadcast_to(np.take_along_axis(values, order, axis=-1)[:, :, None, :], grid).ravel()
+
+    def per_point(values):
+        return np.broadcast_to(values, grid).ravel()
+
+    brands = top(np.broadcast_to(np.arange(n), additional_units.shape))
+    return pd.DataFrame({
+        'service_level': per_point(service_levels[:, None, None, None]),
+        'shock_multiplier': per_point(shocks[None, :, None, None]),
+        'holding_cost': per_point(holding_costs[None, None, :, None]),
+        'rank': per_point(np.arange(1, k + 1)),
+        'brand': m.brand[brands],
+        'description': m.description[brands],
+        'total_volume': m.total_volume[brands],
+        'safety_stock': top(np.broadcast_to(safety_stock[:, None, :], additional_units.shape)).astype(np.int64),
+        'shock_safety_stock': top(shock_safety_stock).astype(np.int64),
+        'additional_capital_tied_up': top(additional_units) * per_point(holding_costs[None, None, :, None]),
+        'total_additional_capital_tied_up': per_point((additional_units.sum(axis=-1)[:, :, None] * holding_costs)[..., None]),
+    }, columns=COLUMNS)
@@ -50,30 +50,22 @@ export default function Dashboard() {
           queryParams = "?start_date=2016-01-01&end_date=2016-12-31";
         }
 
-        // Using Promise.all to fetch all endpoints concurrently
-        const [abcRes, reorderRes, marginRes, capitalRes, inventoryRes, forecastRes, safetyStockRes, creditRes] = await Promise.all([
-          fetch(`http://localhost:8000/api/abc-summary${queryParams}`),
-          fetch(`http://localhost:8000/api/reorder-alerts${queryParams}`),
-          fetch(`http://localhost:8000/api/margin-bleeders${queryParams}`),
-          fetch(`http://localhost:8000/api/capital-traps${queryParams}`),
-          fetch(`http://localhost:8000/api/inventory-optimization${queryParams}`),
-          fetch(`http://localhost:8000/api/demand-forecast${queryParams}`),
-          fetch(`http://localhost:8000/api/safety-stock-simulation${queryParams}`),
-          fetch(`http://localhost:8000/api/credit-risk${queryParams}`),
-        ]);
-
-        if (!abcRes.ok || !reorderRes.ok || !marginRes.ok || !capitalRes.ok || !inventoryRes.ok || !forecastRes.ok || !safetyStockRes.ok || !creditRes.ok) {
+        // One bundle request for every panel; the backend shares the brand level aggregates between them
+        const res = await fetch(`http://localhost:8000/api/dashboard${queryParams}`);
+
+        if (!res.ok) {
           throw new Error("Failed to fetch data from VinoLytics API");
         }
 
-        const abcJson = await abcRes.json();
-        const reorderJson = await reorderRes.json();
-        const marginJson = await marginRes.json();
-        const capitalJson = await capitalRes.json();
-        const inventoryOptJson = await inventoryRes.json();
-        const forecastJson = await forecastRes.json();
-        const safetyStockJson = await safetyStockRes.json();
-        const creditJson = await creditRes.json();
+        const bundle = await res.json();
+        const abcJson = bundle["abc-summary"];
+        const reorderJson = bundle["reorder-alerts"];
+        const marginJson = bundle["margin-bleeders"];
+        const capitalJson = bundle["capital-traps"];
+        const inventoryOptJson = bundle["inventory-optimization"];
+        const forecastJson = bundle["demand-forecast"];
+        const safetyStockJson = bundle["safety-stock-simulation"];
+        const creditJson = bundle["credit-risk"];
 
         setAbcData(abcJson);
         setReorderData(reorderJson);
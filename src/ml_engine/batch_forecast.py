@@ -0,0 +1,162 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import train
+
+# Batch forecasting for the top-N brands (or every ABC class A brand).
+# All daily series come back from ONE query, each brand is fitted in its own
+# worker task across a process pool, and the forecasts land in the
+# BrandForecasts table so the API can serve any brand by lookup.
+
+TOP_N_SERIES_QUERY = """
+WITH target_brands AS (
+    SELECT brand
+    FROM sales
+    GROUP BY brand
+    ORDER BY SUM(salesquantity) DESC
+    LIMIT %(top_n)s
+)
+SELECT
+    s.brand,
+    s.salesdate::date AS ds,
+    SUM(s.salesquantity) AS y
+FROM sales s
+JOIN target_brands t ON s.brand = t.brand
+WHERE s.salesdate IS NOT NULL
+GROUP BY s.brand, s.salesdate::date
+ORDER BY s.brand, ds
+"""
+
+# Class A = brands making up the top 80% of revenue, same cut as /api/abc-summary
+CLASS_A_SERIES_QUERY = """
+WITH brand_revenue AS (
+    SELECT brand, SUM(salesdollars) AS total_revenue
+    FROM sales
+    GROUP BY brand
+    HAVING SUM(salesdollars) > 0
+),
+ranked AS (
+    SELECT
+        brand,
+        SUM(total_revenue) OVER (ORDER BY total_revenue DESC, brand)
+            / SUM(total_revenue) OVER () AS cumulative_percentage
+    FROM brand_revenue
+),
+target_brands AS (
+    SELECT brand FROM ranked WHERE cumulative_percentage <= 0.80
+)
+SELECT
+    s.brand,
+    s.salesdate::date AS ds,
+    SUM(s.salesquantity) AS y
+FROM sales s
+JOIN target_brands t ON s.brand = t.brand
+WHERE s.salesdate IS NOT NULL
+GROUP BY s.brand, s.salesdate::date
+ORDER BY s.brand, ds
+"""
+
+FORECAST_TABLE = 'brandforecasts'
+
+
+def _quiet_worker():
+    # cmdstanpy logs every single fit at INFO, which drowns out the progress output
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+def fit_and_forecast(task):
+    """Worker task: fit one brand, persist its model, return its forecast rows."""
+    brand, history, watermark, periods, tail = task
+
+    model = train.fit_model(history)
+    train.save_model(model, brand, watermark)
+
+    future = model.make_future_dataframe(periods=periods, freq='D')
+    forecast = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(tail)
+    forecast.insert(0, 'brand', int(brand))
+    forecast['watermark'] = pd.Timestamp(watermark)
+    return forecast
+
+
+def load_series(bind, top_n=None, abc_class_a=False):
+    if abc_class_a:
+        return pd.read_sql(CLASS_A_SERIES_QUERY, bind)
+    return pd.read_sql(TOP_N_SERIES_QUERY, bind, params={"top_n": int(top_n)})
+
+
+def run_batch(series, watermark, workers=None, periods=30, tail=60):
+    """Fit every brand in the long-form brand/ds/y frame across a process pool.
+
+    Returns (forecasts DataFrame, models per second).
+    """
+    tasks = [
+        (brand, group[['ds', 'y']].reset_index(drop=True), watermark, periods, tail)
+        for brand, group in series.groupby('brand', sort=False)
+    ]
+    if not tasks:
+        return pd.DataFrame(columns=['brand', 'ds', 'yhat', 'yhat_lower', 'yhat_upper', 'watermark']), 0.0
+
+    workers = workers or os.cpu_count() or 1
+    # Prophet fits are ~100ms-1s each, small chunks keep the workers evenly loaded
+    chunksize = max(1, len(tasks) // (workers * 8))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        results = list(pool.map(fit_and_forecast, tasks, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    return pd.concat(results, ignore_index=True), len(tasks) / elapsed if elapsed > 0 else float('inf')
+
+
+def write_forecasts(bind, forecasts):
+    """Replace the stored forecasts for every brand in `forecasts`."""
+    from sqlalchemy import text
+
+    brands = [int(b) for b in forecasts['brand'].unique()]
+    with bind.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (
+                brand INT,
+                ds DATE,
+                yhat DOUBLE PRECISION,
+                yhat_lower DOUBLE PRECISION,
+                yhat_upper DOUBLE PRECISION,
+                watermark DATE,
+                PRIMARY KEY (brand, ds)
+            )
+        """))
+        conn.execute(text(f"DELETE FROM {FORECAST_TABLE} WHERE brand = ANY(:brands)"), {"brands": brands})
+        forecasts.to_sql(FORECAST_TABLE, conn, if_exists='append', index=False, method='multi', chunksize=5000)
+
+
+if __name__ == "__main__":
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Fit Prophet forecasts for many brands in parallel")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--top', type=int, default=200, help="forecast the top N brands by volume")
+    group.add_argument('--class-a', action='store_true', help="forecast every ABC class A brand")
+    parser.add_argument('--workers', type=int, default=None, help="process pool size (default: all cores)")
+    parser.add_argument('--periods', type=int, default=30, help="days to forecast past the last sale")
+    args = parser.parse_args()
+
+    _quiet_worker()
+    engine = create_engine(train.DATABASE_URL)
+
+    t0 = time.perf_counter()
+    series = load_series(engine, top_n=args.top, abc_class_a=args.class_a)
+    # Same watermark the API keys its models on, so these files get reused there
+    watermark = pd.read_sql("SELECT MAX(salesdate) AS watermark FROM sales", engine)['watermark'].iloc[0]
+    print(f"Pulled {series['brand'].nunique()} brand series ({len(series)} rows) in {time.perf_counter() - t0:.1f}s")
+
+    forecasts, models_per_sec = run_batch(series, watermark, workers=args.workers, periods=args.periods)
+    print(f"Fitted {forecasts['brand'].nunique()} models at {models_per_sec:.2f} models/sec")
+
+    write_forecasts(engine, forecasts)
+    print(f"Wrote {len(forecasts)} forecast rows to {FORECAST_TABLE}. Total {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,73 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+import smoothing
+import train
+from batch_forecast import load_series
+
+# Held-out accuracy + speed comparison between Prophet and the smoothing engine.
+# Usage: python src/ml_engine/compare_engines.py --top 50 --holdout 14
+
+
+def _errors(actual, predicted):
+    err = predicted - actual
+    denom = np.abs(actual) + np.abs(predicted)
+    smape = np.where(denom > 0, 2 * np.abs(err) / np.where(denom > 0, denom, 1), 0.0)
+    return {
+        'mae': np.abs(err).mean(axis=1),
+        'rmse': np.sqrt((err ** 2).mean(axis=1)),
+        'smape': smape.mean(axis=1) * 100,
+    }
+
+
+def compare(series, holdout=14):
+    """Fit both engines on everything but the last `holdout` days and score them on those days."""
+    brands, start_date, Y = smoothing.to_daily_matrix(series)
+    train_Y, test_Y = Y[:, :-holdout], Y[:, -holdout:]
+    train_days = pd.date_range(start_date, periods=train_Y.shape[1], freq='D')
+
+    t0 = time.perf_counter()
+    ets = smoothing.fit_predict(train_Y, periods=holdout)['yhat'][:, -holdout:]
+    ets_seconds = time.perf_counter() - t0
+
+    prophet = np.empty_like(test_Y)
+    t0 = time.perf_counter()
+    for i in range(len(brands)):
+        model = train.fit_model(pd.DataFrame({'ds': train_days, 'y': train_Y[i]}))
+        future = model.make_future_dataframe(periods=holdout, freq='D')
+        prophet[i] = model.predict(future)['yhat'].to_numpy()[-holdout:]
+    prophet_seconds = time.perf_counter() - t0
+
+    rows = []
+    for engine, predicted, seconds in (('prophet', prophet, prophet_seconds), ('ets', ets, ets_seconds)):
+        errors = _errors(test_Y, predicted)
+        rows.append({
+            'engine': engine,
+            'series': len(brands),
+            'mae': errors['mae'].mean(),
+            'rmse': errors['rmse'].mean(),
+            'smape_pct': errors['smape'].mean(),
+            'fit_seconds': seconds,
+            'series_per_sec': len(brands) / seconds if seconds > 0 else float('inf'),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Compare Prophet and the smoothing engine on held-out days")
+    parser.add_argument('--top', type=int, default=50, help="top N brands by volume to score")
+    parser.add_argument('--holdout', type=int, default=14, help="trailing days held out for scoring")
+    args = parser.parse_args()
+
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+    engine = create_engine(train.DATABASE_URL)
+    series = load_series(engine, top_n=args.top)
+    print(compare(series, holdout=args.holdout).to_string(index=False, float_format=lambda x: f"{x:,.3f}"))
@@ -0,0 +1,117 @@
+import os
+import threading
+from functools import lru_cache
+
+import pandas as pd
+
+import smoothing
+import train
+from batch_forecast import FORECAST_TABLE
+
+# Deserializing a Prophet model is cheap compared to fitting one, but not free,
+# so the API process keeps the most recently used ones around.
+MODEL_CACHE_SIZE = int(os.environ.get('VINOLYTICS_MODEL_CACHE_SIZE', 32))
+
+_train_locks = {}
+_train_locks_guard = threading.Lock()
+
+# The smoothing engine fits every brand in one go, so we keep the whole batch
+# for the current watermark and answer any brand from it
+_ets_batch = None
+_ets_lock = threading.Lock()
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def load_model(brand, watermark_key):
+    # Not at the top: the API only pays for importing prophet once it loads a model
+    from prophet.serialize import model_from_json
+
+    path = os.path.join(train.MODEL_DIR, f"prophet_{int(brand)}_{watermark_key}.json")
+    with open(path) as f:
+        return model_from_json(f.read())
+
+
+def _brand_lock(brand):
+    with _train_locks_guard:
+        return _train_locks.setdefault(int(brand), threading.Lock())
+
+
+def get_model(brand, watermark, history_loader):
+    """Return the fitted model for `brand` at `watermark`, refitting only if none exists yet.
+
+    `history_loader` is a zero-arg callable returning the brand's ds/y daily history.
+    It's only called on a miss (i.e. when new sales data moved the watermark).
+    """
+    key = train.watermark_key(watermark)
+    if not os.path.exists(train.model_path(brand, watermark)):
+        # One fit per brand at a time, everyone else waits and then loads the file
+        with _brand_lock(brand):
+            if not os.path.exists(train.model_path(brand, watermark)):
+                train.train_brand(brand, history_loader(), watermark)
+    return load_model(int(brand), key)
+
+
+FORECAST_EXISTS_QUERY = f"SELECT to_regclass('{FORECAST_TABLE}') IS NOT NULL AS present"
+
+# :name binds so the same text works through pd.read_sql(text(...)) and the async engine
+FORECAST_LOOKUP_QUERY = f"""
+    SELECT ds, yhat, yhat_lower, yhat_upper
+    FROM {FORECAST_TABLE}
+    WHERE brand = :brand
+      AND (CAST(:watermark AS DATE) IS NULL OR watermark = CAST(:watermark AS DATE))
+    ORDER BY ds
+"""
+
+
+def lookup_params(brand, watermark=None):
+    return {"brand": int(brand), "watermark": None if watermark is None else pd.Timestamp(watermark).date()}
+
+
+def format_forecast(df):
+    if df.empty:
+        return None
+    df['ds'] = pd.to_datetime(df['ds']).dt.strftime('%Y-%m-%d')
+    return df
+
+
+def lookup_forecast(bind, brand, watermark=None):
+    """Precomputed forecast for one brand from the BrandForecasts table (see batch_forecast.py).
+
+    Returns None if the brand hasn't been batch forecasted (or the table doesn't exist yet).
+    Pass `watermark` to ignore forecasts fitted before the latest sales data.
+    """
+    from sqlalchemy import text
+
+    if not pd.read_sql(text(FORECAST_EXISTS_QUERY), bind)['present'].iloc[0]:
+        return None
+    return format_forecast(pd.read_sql(text(FORECAST_LOOKUP_QUERY), bind, params=lookup_params(brand, watermark)))
+
+
+def predict(brand, watermark, history_loader, periods=30, tail=60):
+    """Forecast `periods` days past the training data; returns ds/yhat/yhat_lower/yhat_upper."""
+    model = get_model(brand, watermark, history_loader)
+
+    future = model.make_future_dataframe(periods=periods, freq='D')
+    forecast = model.predict(future)
+
+    forecast['ds'] = forecast['ds'].dt.strftime('%Y-%m-%d')
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(tail)
+
+
+def predict_ets(brand, watermark, matrix_loader, periods=30, tail=60):
+    """Same output as `predict` but from the vectorized exponential smoothing engine.
+
+    `matrix_loader` returns (brands, first day, brands x days) daily sales for the whole
+    catalogue. It's only called when the watermark moves.
+    """
+    global _ets_batch
+    key = (train.watermark_key(watermark), periods)
+    with _ets_lock:
+        if _ets_batch is None or _ets_batch[0] != key:
+            brands, start_date, Y = matrix_loader()
+            _ets_batch = (key, smoothing.BatchForecast(brands, start_date, Y, periods=periods))
+        batch = _ets_batch[1]
+
+    if brand not in batch:
+        return None
+    return batch.frame(brand, tail=tail)
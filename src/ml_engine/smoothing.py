@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized exponential smoothing forecaster.
+# Prophet costs seconds of Stan per series, which rules out forecasting the whole
+# catalogue. This is a damped-trend Holt-Winters with additive weekly and yearly
+# seasonality (Taylor's double seasonal variant). The recursion only loops over
+# days; every step updates ALL series at once as rows of a 2-D array, so fitting
+# thousands of brands costs about what one Prophet fit does.
+
+WEEKLY = 7
+YEARLY = 365
+
+# Small grid of smoothing constants, searched per series by one-step-ahead SSE.
+ALPHAS = (0.05, 0.1, 0.2, 0.35, 0.5)
+BETAS = (0.0, 0.02)
+GAMMA = 0.1    # weekly seasonal smoothing
+DELTA = 0.05   # yearly seasonal smoothing
+PHI = 0.9      # trend damping, keeps 30-day forecasts from running off
+
+# Prophet's default interval_width is 0.80, so match it for yhat_lower/yhat_upper
+INTERVAL_Z = 1.2816
+
+
+def _run(Y, alpha, beta, use_yearly, keep_fitted=True):
+    """One pass of the recursion over the columns of Y (series x days).
+
+    alpha/beta are per-row arrays. Returns one-step-ahead fitted values (or None
+    when keep_fitted is off), the one-step SSE after warm-up, and the final level,
+    trend and seasonal ring buffers.
+    """
+    n, T = Y.shape
+    warmup = min(WEEKLY, T)
+
+    level = Y[:, :warmup].mean(axis=1)
+    trend = np.zeros(n)
+    weekly = np.zeros((n, WEEKLY))
+    weekly[:, :warmup] = Y[:, :warmup] - level[:, None]
+    yearly = np.zeros((n, YEARLY))
+
+    fitted = np.empty((n, T)) if keep_fitted else None
+    if keep_fitted:
+        fitted[:, :warmup] = Y[:, :warmup]
+    sse = np.zeros(n)
+
+    for t in range(warmup, T):
+        w = t % WEEKLY
+        yr = t % YEARLY
+        s_week = weekly[:, w]
+        s_year = yearly[:, yr]
+        y = Y[:, t]
+
+        y_hat = level + PHI * trend + s_week + s_year
+        sse += (y - y_hat) ** 2
+        if keep_fitted:
+            fitted[:, t] = y_hat
+
+        prev_level = level
+        level = alpha * (y - s_week - s_year) + (1 - alpha) * (prev_level + PHI * trend)
+        trend = beta * (level - prev_level) + (1 - beta) * PHI * trend
+        weekly[:, w] = GAMMA * (y - level - s_year) + (1 - GAMMA) * s_week
+        if use_yearly:
+            yearly[:, yr] = DELTA * (y - level - s_week) + (1 - DELTA) * s_year
+
+    return fitted, sse, level, trend, weekly, yearly
+
+
+def fit_predict(Y, periods=30, chunk_size=2000):
+    """Fit every row of Y (series x consecutive days) and forecast `periods` days ahead.
+
+    Returns a dict of (series x (days + periods)) arrays: yhat, yhat_lower, yhat_upper,
+    plus the chosen alpha/beta per series. In-sample values are one-step-ahead fits,
+    same as the history part of a Prophet forecast frame.
+    """
+    Y = np.nan_to_num(np.asarray(Y, dtype=np.float64))
+    # Chunk the rows so the grid search (series x combos) stays bounded in memory
+    parts = [_fit_chunk(Y[i:i + chunk_size], periods) for i in range(0, len(Y), chunk_size)]
+    if not parts:
+        empty = np.empty((0, Y.shape[1] + periods))
+        return {'yhat': empty, 'yhat_lower': empty, 'yhat_upper': empty, 'alpha': np.empty(0), 'beta': np.empty(0)}
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def _fit_chunk(Y, periods):
+    n, T = Y.shape
+    # Yearly terms only start paying off once a full year has been seen
+    use_yearly = T > YEARLY + WEEKLY
+
+    # Grid search: stack (series x param combo) as rows and run them all in one pass
+    grid = [(a, b) for a in ALPHAS for b in BETAS]
+    alpha = np.repeat([a for a, _ in grid], n)
+    beta = np.repeat([b for _, b in grid], n)
+    _, sse, *_ = _run(np.tile(Y, (len(grid), 1)), alpha, beta, use_yearly, keep_fitted=False)
+    best = sse.reshape(len(grid), n).argmin(axis=0)
+    alpha = np.array([grid[i][0] for i in best])
+    beta = np.array([grid[i][1] for i in best])
+
+    fitted, sse, level, trend, weekly, yearly = _run(Y, alpha, beta, use_yearly)
+    sigma = np.sqrt(sse / max(T - min(WEEKLY, T), 1))
+
+    h = np.arange(1, periods + 1)
+    damped = np.cumsum(PHI ** h)
+    week_idx = (T + h - 1) % WEEKLY
+    year_idx = (T + h - 1) % YEARLY
+    future = level[:, None] + trend[:, None] * damped[None, :] + weekly[:, week_idx] + yearly[:, year_idx]
+
+    # h-step error variance for the additive model: sigma^2 * (1 + sum_{0<j<h} (alpha + j*beta)^2)
+    j = np.arange(periods)
+    growth = np.cumsum((alpha[:, None] + j[None, :] * beta[:, None]) ** 2, axis=1) - alpha[:, None] ** 2
+    future_sigma = sigma[:, None] * np.sqrt(1 + growth)
+
+    yhat = np.concatenate([fitted, future], axis=1)
+    spread = np.concatenate([np.repeat(sigma[:, None], T, axis=1), future_sigma], axis=1) * INTERVAL_Z
+    return {
+        'yhat': yhat,
+        'yhat_lower': yhat - spread,
+        'yhat_upper': yhat + spread,
+        'alpha': alpha,
+        'beta': beta,
+    }
+
+
+class BatchForecast:
+    """Forecasts for a whole set of brands, fitted together in one fit_predict call."""
+
+    def __init__(self, brands, start_date, Y, periods=30):
+        self.brands = np.asarray(brands)
+        self.dates = pd.date_range(start_date, periods=Y.shape[1] + periods, freq='D')
+        self.result = fit_predict(Y, periods=periods)
+        self._row = {int(b): i for i, b in enumerate(self.brands)}
+
+    def __contains__(self, brand):
+        return int(brand) in self._row
+
+    def frame(self, brand, tail=60):
+        """ds/yhat/yhat_lower/yhat_upper for one brand, shaped like the Prophet output."""
+        i = self._row[int(brand)]
+        df = pd.DataFrame({
+            'ds': self.dates.strftime('%Y-%m-%d'),
+            'yhat': self.result['yhat'][i],
+            'yhat_lower': self.result['yhat_lower'][i],
+            'yhat_upper': self.result['yhat_upper'][i],
+        })
+        return df.tail(tail).reset_index(drop=True)
+
+
+def to_daily_matrix(series):
+    """Pivot a long brand/ds/y frame into (brands, first day, brands x days) with 0 for no sales."""
+    series = series.copy()
+    series['ds'] = pd.to_datetime(series['ds'])
+    wide = series.pivot_table(index='brand', columns='ds', values='y', aggfunc='sum', fill_value=0)
+    full_days = pd.date_range(wide.columns.min(), wide.columns.max(), freq='D')
+    wide = wide.reindex(columns=full_days, fill_value=0)
+    return wide.index.to_numpy(), full_days[0], wide.to_numpy(dtype=np.float64)
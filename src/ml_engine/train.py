@@ -0,0 +1,114 @@
+import os
+import sys
+
+import pandas as pd
+
+# Fitted Prophet models live on disk, one JSON file per (brand, data watermark).
+# The watermark is the last SalesDate the model saw, so a model only goes stale
+# when new sales data lands and the API can keep reusing it until then.
+#
+# prophet (cmdstanpy, matplotlib) is imported where it's used: the API imports this
+# module for the paths, and most workers never fit a model.
+MODEL_DIR = os.environ.get(
+    'VINOLYTICS_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'models'),
+)
+
+# The API's DATABASE_URL setting (environment or .env, see src/backend/settings.py), so
+# the scripts here train on the same database the API serves
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from settings import settings
+
+DATABASE_URL = settings.database_url
+
+HISTORY_QUERY = """
+    SELECT
+        salesdate::date as ds,
+        SUM(salesquantity) as y
+    FROM sales
+    WHERE brand = %(brand)s
+    GROUP BY salesdate::date
+    ORDER BY salesdate::date ASC;
+"""
+
+
+def watermark_key(watermark):
+    return pd.Timestamp(watermark).strftime('%Y%m%d')
+
+
+def model_path(brand, watermark):
+    return os.path.join(MODEL_DIR, f"prophet_{int(brand)}_{watermark_key(watermark)}.json")
+
+
+def fit_model(history):
+    """Fit the same Prophet setup the dashboard has always used on a ds/y daily frame."""
+    history = history[['ds', 'y']].copy()
+    history['ds'] = pd.to_datetime(history['ds'])
+
+    from prophet import Prophet
+
+    model = Prophet(yearly_seasonality=True, weekly_seasonality=True, daily_seasonality=False)
+    model.fit(history)
+    return model
+
+
+def train_brand(brand, history, watermark):
+    """Fit a model for one brand and serialize it under its watermark. Returns the file path."""
+    return save_model(fit_model(history), brand, watermark)
+
+
+def save_model(model, brand, watermark):
+    from prophet.serialize import model_to_json
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = model_path(brand, watermark)
+    # Write to a temp file first so a concurrent reader never sees half a model
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(model_to_json(model))
+    os.replace(tmp_path, path)
+
+    _prune_stale(brand, watermark)
+    return path
+
+
+def _prune_stale(brand, watermark):
+    # Older watermarks for the same brand will never be asked for again
+    prefix = f"prophet_{int(brand)}_"
+    keep = os.path.basename(model_path(brand, watermark))
+    for name in os.listdir(MODEL_DIR):
+        if name.startswith(prefix) and name.endswith('.json') and name != keep:
+            try:
+                os.remove(os.path.join(MODEL_DIR, name))
+            except OSError:
+                pass
+
+
+def load_history(bind, brand):
+    return pd.read_sql(HISTORY_QUERY, bind, params={"brand": int(brand)})
+
+
+if __name__ == "__main__":
+    # Usage: python src/ml_engine/train.py [top_n]
+    # Pre-trains the top N brands by volume so the API never fits inside a request.
+    from sqlalchemy import create_engine
+
+    top_n = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    engine = create_engine(DATABASE_URL)
+
+    watermark = pd.read_sql("SELECT MAX(salesdate) AS watermark FROM sales", engine)['watermark'].iloc[0]
+    top_brands = pd.read_sql(
+        """
+        SELECT brand, SUM(salesquantity) AS total_volume_sold
+        FROM sales
+        GROUP BY brand
+        ORDER BY total_volume_sold DESC
+        LIMIT %(top_n)s
+        """,
+        engine,
+        params={"top_n": top_n},
+    )
+
+    for brand in top_brands['brand']:
+        path = train_brand(brand, load_history(engine, brand), watermark)
+        print(f"Trained brand {brand} up to {watermark_key(watermark)} -> {path}")